@@ -0,0 +1,25 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   enrichment.py
+# Functionality :   agent endpoints for the background offer enrichment pipeline
+
+from fastapi import APIRouter
+from app.schemas.envelope import ResponseEnvelope
+from app.services.offer_enrichment_service import get_enrichment_service
+
+router = APIRouter()
+
+
+@router.get("/enrichment")
+async def enrichment_status():
+	# reports progress of the current or last enrichment run
+	return ResponseEnvelope.ok(get_enrichment_service().status())
+
+
+@router.post("/enrichment")
+async def start_enrichment():
+	# starts a background run that fills missing offer details
+	service = get_enrichment_service()
+	started = service.start()
+	payload = service.status()
+	payload["started"] = started
+	return ResponseEnvelope.ok(payload)
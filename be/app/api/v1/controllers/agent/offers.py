@@ -2,11 +2,14 @@
 # File:                   offers.py
 # Functionality :   api endpoints for agent offer management
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from sqlmodel import Session
 from typing import Optional
 from datetime import date
-from app.core.deps import get_db, get_session_id
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.conditional import list_etag_async, not_modified, with_etag
+from app.core.deps import get_async_db, get_db, get_session_id
+from app.models.data_version import CATALOG_SCOPE
 from app.schemas.envelope import ResponseEnvelope
 from app.schemas.agency_offer import CreateAgencyOfferBody, UpdateAgencyOfferBody, AgencyOfferDTO
 from app.services.agency_offer_service import AgencyOfferService
@@ -17,6 +20,7 @@ router = APIRouter()
 @router.get("/offers")
 async def list_offers(
 	# lists offers for the agent with filtering
+	request: Request,
 	origin: Optional[str] = Query(None),
 	destination: Optional[str] = Query(None),
 	capacity_min: Optional[int] = Query(None),
@@ -28,12 +32,16 @@ async def list_offers(
 	price_min: Optional[int] = Query(None),
 	price_max: Optional[int] = Query(None),
 	transport_mode: Optional[str] = Query(None),
-	db: Session = Depends(get_db),
+	db: AsyncSession = Depends(get_async_db),
 	agent_session_id: str = Depends(get_session_id),
 ):
+	etag = await list_etag_async(request, db, [CATALOG_SCOPE], agent_session_id)
+	cached = not_modified(request, etag)
+	if cached:
+		return cached
 	service = AgencyOfferService()
 	type_list = type_of_stay.split(",") if type_of_stay else None
-	offers = service.list_filtered(
+	offers = await service.list_filtered_async(
 		db,
 		agent_session_id,
 		origin=origin,
@@ -48,7 +56,7 @@ async def list_offers(
 		price_max=price_max,
 		transport_mode=transport_mode,
 	)
-	return ResponseEnvelope.ok([o.model_dump() for o in offers])
+	return with_etag(ResponseEnvelope.ok(offers), etag)
 
 
 @router.post("/offers")
@@ -60,7 +68,9 @@ async def create_offer(
 ):
 	service = AgencyOfferService()
 	offer = service.create(db, agent_session_id, body.model_dump(exclude_none=True))
-	return ResponseEnvelope.ok(offer.model_dump())
+	# the status may reload the offer, so it goes before the dump
+	image_status = service.image_status(db, offer)
+	return ResponseEnvelope.ok({**offer.model_dump(), "image_status": image_status})
 
 
 @router.get("/offers/{offer_id}")
@@ -74,7 +84,8 @@ async def get_offer(
 	offer = service.get_by_id(db, agent_session_id, offer_id)
 	if not offer:
 		return ResponseEnvelope.err("NOT_FOUND", "Offer not found")
-	return ResponseEnvelope.ok(offer.model_dump())
+	image_status = service.image_status(db, offer)
+	return ResponseEnvelope.ok({**offer.model_dump(), "image_status": image_status})
 
 
 @router.put("/offers/{offer_id}")
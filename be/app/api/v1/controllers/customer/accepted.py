@@ -2,10 +2,12 @@
 # File:                   accepted.py
 # Functionality :   api endpoints for managing accepted offers and creating orders
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
 from sqlmodel import Session
 from typing import Optional
+from app.core.conditional import list_etag, not_modified, with_etag
 from app.core.deps import get_db, get_session_id
+from app.models.data_version import CATALOG_SCOPE, session_scope
 from app.schemas.envelope import ResponseEnvelope
 from app.schemas.customer import CreateNoteBody, CreateOrderBody
 from app.services.customer_accepted_service import CustomerAcceptedService
@@ -16,14 +18,19 @@ router = APIRouter()
 @router.get("/accepted")
 async def list_accepted(
 	# lists all accepted offers with sorting
+	request: Request,
 	sort: Optional[str] = Query("price"),
 	order: Optional[str] = Query("asc"),
 	db: Session = Depends(get_db),
 	customer_session_id: str = Depends(get_session_id),
 ):
+	etag = list_etag(request, db, [CATALOG_SCOPE, session_scope(customer_session_id)], customer_session_id)
+	cached = not_modified(request, etag)
+	if cached:
+		return cached
 	service = CustomerAcceptedService()
 	offers = service.list_accepted(db, customer_session_id, sort or "price", order or "asc")
-	return ResponseEnvelope.ok([o.model_dump() for o in offers])
+	return with_etag(ResponseEnvelope.ok([o.model_dump() for o in offers]), etag)
 
 
 @router.get("/accepted/{offer_id}/expand")
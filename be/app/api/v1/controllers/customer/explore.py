@@ -21,7 +21,7 @@ async def explore(
 ):
 	service = ExplorationService()
 	try:
-		suggestions = service.generate_suggestions(filters.model_dump(exclude_none=True))
+		suggestions = await service.generate_suggestions(filters.model_dump(exclude_none=True))
 		return ResponseEnvelope.ok(suggestions)
 	except ValueError as e:
 		return ResponseEnvelope.err("VALIDATION_ERROR", str(e))
@@ -2,11 +2,14 @@
 # File:                   offers.py
 # Functionality :   api endpoints for customer offer browsing and status management
 
-from fastapi import APIRouter, Depends, Query
-from sqlmodel import Session
+from fastapi import APIRouter, Depends, Query, Request
 from typing import Optional, List
 from datetime import date
-from app.core.deps import get_db, get_session_id
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.conditional import list_etag_async, not_modified, with_etag
+from app.core.deps import get_async_db, get_session_id
+from app.models.customer_response import ResponseStatus
+from app.models.data_version import CATALOG_SCOPE, session_scope
 from app.schemas.envelope import ResponseEnvelope
 from app.schemas.customer import AcceptOfferBody, RejectOfferBody, UpdateStatusBody
 from app.services.customer_offer_service import CustomerOfferService
@@ -17,6 +20,7 @@ router = APIRouter()
 @router.get("/offers")
 async def list_offers(
 	# lists available offers with filtering options
+	request: Request,
 	origin: Optional[str] = Query(None),
 	destination: Optional[str] = Query(None),
 	capacity_min: Optional[int] = Query(None),
@@ -28,12 +32,16 @@ async def list_offers(
 	price_min: Optional[int] = Query(None),
 	price_max: Optional[int] = Query(None),
 	transport_mode: Optional[str] = Query(None),
-	db: Session = Depends(get_db),
+	db: AsyncSession = Depends(get_async_db),
 	customer_session_id: str = Depends(get_session_id),
 ):
+	etag = await list_etag_async(request, db, [CATALOG_SCOPE, session_scope(customer_session_id)], customer_session_id)
+	cached = not_modified(request, etag)
+	if cached:
+		return cached
 	service = CustomerOfferService()
 	type_list = type_of_stay.split(",") if type_of_stay else None
-	offers = service.list_available(
+	offers = await service.list_available_async(
 		db,
 		customer_session_id,
 		origin=origin,
@@ -48,7 +56,7 @@ async def list_offers(
 		price_max=price_max,
 		transport_mode=transport_mode,
 	)
-	return ResponseEnvelope.ok([o.model_dump() for o in offers])
+	return with_etag(ResponseEnvelope.ok(offers), etag)
 
 
 @router.post("/offers/{offer_id}/accept")
@@ -56,11 +64,11 @@ async def accept_offer(
 	# accepts an offer and marks it as favorite
 	offer_id: str,
 	body: AcceptOfferBody,
-	db: Session = Depends(get_db),
+	db: AsyncSession = Depends(get_async_db),
 	customer_session_id: str = Depends(get_session_id),
 ):
 	service = CustomerOfferService()
-	response = service.accept(db, customer_session_id, offer_id)
+	response = await service.update_status_async(db, customer_session_id, offer_id, ResponseStatus.ACCEPTED)
 	return ResponseEnvelope.ok(response.model_dump())
 
 
@@ -69,17 +77,18 @@ async def reject_offer(
 	# rejects an offer
 	offer_id: str,
 	body: RejectOfferBody,
-	db: Session = Depends(get_db),
+	db: AsyncSession = Depends(get_async_db),
 	customer_session_id: str = Depends(get_session_id),
 ):
 	service = CustomerOfferService()
-	response = service.reject(db, customer_session_id, offer_id)
+	response = await service.update_status_async(db, customer_session_id, offer_id, ResponseStatus.REJECTED)
 	return ResponseEnvelope.ok(response.model_dump())
 
 
 @router.get("/offers/all")
 async def list_all_offers_with_status(
 	# lists all offers with their status for unified view
+	request: Request,
 	origin: Optional[str] = Query(None),
 	destination: Optional[str] = Query(None),
 	season: Optional[str] = Query(None),
@@ -89,12 +98,16 @@ async def list_all_offers_with_status(
 	status_filter: Optional[str] = Query(None),  # "accepted", "undecided", "rejected", or None for all
 	sort: Optional[str] = Query("status"),  # "status", "price", "date"
 	order: Optional[str] = Query("asc"),
-	db: Session = Depends(get_db),
+	db: AsyncSession = Depends(get_async_db),
 	customer_session_id: str = Depends(get_session_id),
 ):
+	etag = await list_etag_async(request, db, [CATALOG_SCOPE, session_scope(customer_session_id)], customer_session_id)
+	cached = not_modified(request, etag)
+	if cached:
+		return cached
 	service = CustomerOfferService()
 	type_list = type_of_stay.split(",") if type_of_stay else None
-	offers = service.list_all_with_status(
+	offers = await service.list_all_with_status_async(
 		db,
 		customer_session_id,
 		origin=origin,
@@ -107,7 +120,7 @@ async def list_all_offers_with_status(
 		sort=sort,
 		order=order,
 	)
-	return ResponseEnvelope.ok(offers)
+	return with_etag(ResponseEnvelope.ok(offers), etag)
 
 
 @router.put("/offers/{offer_id}/status")
@@ -115,15 +128,14 @@ async def update_offer_status(
 	# updates the status of an offer
 	offer_id: str,
 	body: UpdateStatusBody,
-	db: Session = Depends(get_db),
+	db: AsyncSession = Depends(get_async_db),
 	customer_session_id: str = Depends(get_session_id),
 ):
-	from app.models.customer_response import ResponseStatus
 	# Validate status
 	if body.status not in [ResponseStatus.ACCEPTED, ResponseStatus.UNDECIDED, ResponseStatus.REJECTED]:
 		return ResponseEnvelope.err("INVALID_STATUS", f"Status must be one of: ACCEPTED, UNDECIDED, REJECTED")
 	
 	service = CustomerOfferService()
-	response = service.update_status(db, customer_session_id, offer_id, body.status)
+	response = await service.update_status_async(db, customer_session_id, offer_id, body.status)
 	return ResponseEnvelope.ok(response.model_dump())
 
@@ -2,10 +2,12 @@
 # File:                   orders.py
 # Functionality :   api endpoints for customer order management
 
+import logging
 from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import Optional
-from app.core.deps import get_db, get_session_id
+from app.core.deps import get_async_db, get_db, get_session_id
 from app.schemas.envelope import ResponseEnvelope
 from app.schemas.customer import UpdateOrderBody
 from app.services.customer_order_service import CustomerOrderService
@@ -20,6 +22,7 @@ from uuid import uuid4
 
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 order_service = CustomerOrderService()
 
 
@@ -27,12 +30,12 @@ order_service = CustomerOrderService()
 async def list_orders(
 	# lists all orders for the current customer session
     status: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     customer_session_id: str = Depends(get_session_id),
 ):
     service = CustomerOrderService()
     try:
-        orders = service.list_orders(db, customer_session_id, status)
+        orders = await service.list_orders_async(db, customer_session_id, status)
         orders_list = []
         for o in orders:
             # `o` is already a dict
@@ -44,8 +47,7 @@ async def list_orders(
             orders_list.append(order_dict)
         return ResponseEnvelope.ok(orders_list)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("listing orders failed")
         return ResponseEnvelope.err("SERVER_ERROR", str(e))
 
 
@@ -88,8 +90,7 @@ async def get_order(
             "note": note.note_text if note else ""
         })
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("loading order %s failed", order_id)
         return ResponseEnvelope.err("SERVER_ERROR", str(e))
 
 
@@ -128,8 +129,7 @@ async def update_order(
     except ValueError as e:
         return ResponseEnvelope.err("VALIDATION_ERROR", str(e))
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("updating order %s failed", order_id)
         return ResponseEnvelope.err("SERVER_ERROR", str(e))
 
 @router.put("/orders/{order_id}/note")
@@ -190,8 +190,7 @@ async def confirm_order(
     except ValueError as e:
         return ResponseEnvelope.err("VALIDATION_ERROR", str(e))
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("confirming order %s failed", order_id)
         return ResponseEnvelope.err("SERVER_ERROR", str(e))
 
 
@@ -216,8 +215,7 @@ async def cancel_order(
 
         return ResponseEnvelope.ok(order_dict)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("cancelling order %s failed", order_id)
         return ResponseEnvelope.err("SERVER_ERROR", str(e))
 
 @router.delete("/orders/trash")
@@ -231,6 +229,5 @@ async def empty_trash(
         deleted_count = service.delete_cancelled_orders(db, customer_session_id)
         return ResponseEnvelope.ok({"deleted_count": deleted_count})
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("emptying order trash failed")
         return ResponseEnvelope.err("SERVER_ERROR", str(e))
@@ -2,6 +2,7 @@
 # File:                   destinations.py
 # Functionality :   legacy api endpoints for destination management
 
+import asyncio
 from fastapi import APIRouter, Depends
 from sqlmodel import Session
 from typing import Optional
@@ -41,7 +42,8 @@ async def delete_destination(dest_id: str, db: Session = Depends(get_db), sessio
 @router.post("/destinations/{dest_id}/expand")
 async def expand(dest_id: str, body: ExpandBody, db: Session = Depends(get_db), session_id: str = Depends(get_session_id)):
 	service = DestinationService()
-	res = service.expand(db, session_id, dest_id, body.forceRefresh)
+	# llm calls can queue in the scheduler and retry, so they run in a worker thread, never on the event loop
+	res = await asyncio.to_thread(service.expand, db, session_id, dest_id, body.forceRefresh)
 	if not res:
 		return ResponseEnvelope.err("NOT_FOUND", "Destination not found")
 	return ResponseEnvelope.ok(res.model_dump())
@@ -50,7 +52,7 @@ async def expand(dest_id: str, body: ExpandBody, db: Session = Depends(get_db),
 @router.post("/destinations/{dest_id}/customize")
 async def customize(dest_id: str, body: CustomizeBody, db: Session = Depends(get_db), session_id: str = Depends(get_session_id)):
 	service = DestinationService()
-	res = service.customize(db, session_id, dest_id, body.prompt)
+	res = await asyncio.to_thread(service.customize, db, session_id, dest_id, body.prompt)
 	if not res:
 		return ResponseEnvelope.err("NOT_FOUND", "Destination not found")
 	return ResponseEnvelope.ok(res.model_dump())
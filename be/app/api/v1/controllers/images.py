@@ -2,8 +2,13 @@
 # File:                   images.py
 # Functionality :   api endpoint for image search
 
-from fastapi import APIRouter, Query
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import RedirectResponse
+from app.core.config import settings
+from app.core.file_response import ranged_file_response
 from app.schemas.envelope import ResponseEnvelope
+from app.services.image_proxy_service import ImageFetchError, ImageProxyService
 from app.services.image_service import ImageService
 
 router = APIRouter()
@@ -11,10 +16,27 @@ router = APIRouter()
 
 @router.get("/images/search")
 async def search_images(q: str = Query(...), limit: int = 3):
-	# searches for images using image service
+	# searches for up to limit distinct images with a single provider request
 	service = ImageService()
 	rows = []
-	for i in range(max(1, min(limit, 5))):
-		img = service.pick_image(q)
+	for img in await service.search_many(q, max(1, min(limit, 5))):
 		rows.append({"url": img.get("url"), "credit": {"source": img.get("source"), "author": img.get("author"), "link": img.get("link")}})
 	return ResponseEnvelope.ok(rows)
+
+
+@router.get("/images/proxy")
+async def proxy_image(request: Request, url: str = Query(...), w: Optional[int] = Query(None, ge=1, le=4096)):
+	# serves a provider image from the local store, resized to the next configured width. Hosts outside the
+	# allow list are refused, redirecting to them would make this an open redirect; an allow-listed image
+	# whose fetch failed redirects to the original url so the browser can still load it
+	if not url.startswith(("http://", "https://")):
+		raise HTTPException(status_code=400, detail="url must be an http(s) url")
+	service = ImageProxyService()
+	if not service.is_allowed(url):
+		raise HTTPException(status_code=400, detail="url host is not an allowed image host")
+	try:
+		image = await service.get(url, w)
+	except ImageFetchError:
+		return RedirectResponse(url, status_code=307)
+	cache_control = f"public, max-age={settings.IMAGE_PROXY_MAX_AGE_SECONDS}"
+	return ranged_file_response(request, image.path, image.content_type, image.etag, cache_control)
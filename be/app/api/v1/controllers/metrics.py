@@ -0,0 +1,53 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   metrics.py
+# Functionality :   endpoints exposing in-process request, llm and image provider metrics
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import Response
+from app.core.deps import get_session_id
+from app.clients.images_client import UnsplashClient
+from app.core import prometheus
+from app.core.metrics import image_metrics, llm_metrics, request_metrics
+from app.schemas.envelope import ResponseEnvelope
+from app.services.llm_service import LLMService
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def prometheus_metrics():
+	# request latency, database and upstream metrics of this worker in prometheus text format
+	return Response(prometheus.render(), media_type=prometheus.CONTENT_TYPE)
+
+
+@router.get("/metrics/requests")
+async def request_metrics_summary():
+	# per-route latency and database statistics plus the latest slow requests with their request ids
+	return ResponseEnvelope.ok(request_metrics.snapshot())
+
+
+@router.get("/metrics/llm")
+async def llm_metrics_summary(session_id: str = Depends(get_session_id)):
+	# token, latency, cache and queueing statistics for all llm calls plus totals for the calling session
+	payload = llm_metrics.snapshot()
+	payload["response_cache"] = LLMService.cache_stats()
+	payload["circuit_breaker"] = LLMService.breaker_state()
+	payload["scheduler"] = LLMService.scheduler_state()
+	payload["session"] = llm_metrics.session_totals(session_id)
+	return ResponseEnvelope.ok(payload)
+
+
+@router.get("/metrics/llm/sessions/{session_id}")
+async def llm_metrics_for_session(session_id: str, caller_session_id: str = Depends(get_session_id)):
+	# llm totals for the calling session only; the id is the session cookie, so other sessions read as missing
+	if session_id != caller_session_id:
+		return ResponseEnvelope.err("NOT_FOUND", "Session not found")
+	return ResponseEnvelope.ok(llm_metrics.session_totals(session_id))
+
+
+@router.get("/metrics/images")
+async def image_metrics_summary():
+	# per-provider lookup outcomes, latencies and race win rates, plus url verification cache stats
+	payload = image_metrics.snapshot()
+	payload["verify_cache"] = UnsplashClient.verify_cache_stats()
+	return ResponseEnvelope.ok(payload)
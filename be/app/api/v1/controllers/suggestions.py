@@ -2,6 +2,7 @@
 # File:                   suggestions.py
 # Functionality :   legacy api endpoints for suggestion system
 
+import asyncio
 from fastapi import APIRouter, Depends
 from sqlmodel import Session
 from app.core.deps import get_db, get_session_id
@@ -16,7 +17,8 @@ router = APIRouter()
 async def suggest(filters: SuggestFilters, db: Session = Depends(get_db), session_id: str = Depends(get_session_id)):
 	# generates suggestions using legacy service
 	service = SuggestionService()
-	proposals = service.generate(db, session_id, filters.model_dump(exclude_none=True))
+	# the llm call and image lookups block, so they run in a worker thread like /explore
+	proposals = await asyncio.to_thread(service.generate, db, session_id, filters.model_dump(exclude_none=True))
 	# Return list of dicts
 	payload = [p.model_dump() for p in proposals]
 	return ResponseEnvelope.ok(payload)
@@ -2,10 +2,13 @@
 # File:                   tags.py
 # Functionality :   api endpoints for tag management
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlmodel import Session
 from typing import List, Optional
-from app.core.deps import get_db
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.conditional import list_etag_async, not_modified, with_etag
+from app.core.deps import get_async_db, get_db
+from app.models.data_version import TAGS_SCOPE
 from app.schemas.envelope import ResponseEnvelope
 from app.repositories.tag_repo import TagRepository
 from app.models.tag import Tag
@@ -27,13 +30,19 @@ class UpdateTagBody(BaseModel):
 @router.get("/tags")
 async def list_tags(
 	# lists all tags optionally filtered by type
+    request: Request,
     tag_type: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """List all tags, optionally filtered by type"""
+    # tags are shared by every session
+    etag = await list_etag_async(request, db, [TAGS_SCOPE], "")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
     repo = TagRepository()
-    tags = repo.list_all(db, tag_type)
-    return ResponseEnvelope.ok([t.model_dump() for t in tags])
+    tags = await repo.list_all_async(db, tag_type)
+    return with_etag(ResponseEnvelope.ok([t.model_dump() for t in tags]), etag)
 
 
 @router.post("/tags")
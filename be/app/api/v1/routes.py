@@ -8,7 +8,9 @@ from app.api.v1.controllers import destinations as destinations_ctrl
 from app.api.v1.controllers import lists as lists_ctrl
 from app.api.v1.controllers import images as images_ctrl
 from app.api.v1.controllers import tags as tags_ctrl
+from app.api.v1.controllers import metrics as metrics_ctrl
 from app.api.v1.controllers.agent import offers as agent_offers_ctrl
+from app.api.v1.controllers.agent import enrichment as agent_enrichment_ctrl
 from app.api.v1.controllers.customer import offers as customer_offers_ctrl
 from app.api.v1.controllers.customer import accepted as customer_accepted_ctrl
 from app.api.v1.controllers.customer import orders as customer_orders_ctrl
@@ -25,8 +27,12 @@ router.include_router(images_ctrl.router)
 # Tags management
 router.include_router(tags_ctrl.router, tags=["tags"])
 
+# Metrics
+router.include_router(metrics_ctrl.router, tags=["metrics"])
+
 # New agent endpoints
 router.include_router(agent_offers_ctrl.router, prefix="/agent", tags=["agent"])
+router.include_router(agent_enrichment_ctrl.router, prefix="/agent", tags=["agent"])
 
 # New customer endpoints
 router.include_router(customer_offers_ctrl.router, prefix="/customer", tags=["customer"])
@@ -0,0 +1,70 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   http_pool.py
+# Functionality :   app-lifetime pooled http clients shared by upstream api clients
+
+import asyncio
+import threading
+import weakref
+from typing import Optional
+import httpx
+from app.core.config import settings
+
+try:
+	import h2  # noqa: F401
+	HTTP2_AVAILABLE = True
+except ImportError:
+	HTTP2_AVAILABLE = False
+
+_lock = threading.Lock()
+_client: Optional[httpx.Client] = None
+# async clients are bound to the loop they first ran on, so there is one per loop
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _options() -> dict:
+	return {
+		"http2": settings.HTTP_POOL_HTTP2 and HTTP2_AVAILABLE,
+		"limits": httpx.Limits(
+			max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+			max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+			keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_SECONDS,
+		),
+		"timeout": httpx.Timeout(10.0, connect=5.0),
+	}
+
+
+def get_client() -> httpx.Client:
+	# shared keep-alive client for sync callers, safe to use from several threads
+	global _client
+	with _lock:
+		if _client is None or _client.is_closed:
+			_client = httpx.Client(**_options())
+		return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+	# shared keep-alive client for the running event loop
+	loop = asyncio.get_running_loop()
+	with _lock:
+		client = _async_clients.get(loop)
+		if client is None or client.is_closed:
+			client = httpx.AsyncClient(**_options())
+			_async_clients[loop] = client
+		return client
+
+
+async def aclose() -> None:
+	# closes the pools, called on application shutdown
+	global _client
+	with _lock:
+		client, _client = _client, None
+		async_clients = list(_async_clients.values())
+		_async_clients.clear()
+	if client is not None:
+		client.close()
+	for async_client in async_clients:
+		try:
+			await async_client.aclose()
+		except RuntimeError:
+			# client belonged to a loop that is already closed
+			pass
@@ -1,6 +1,17 @@
-from typing import Dict
+import asyncio
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 import httpx
+from app.clients.http_pool import get_async_client, get_client
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.metrics import image_metrics
+
+# content-type check results per photo url; provider cdn urls are stable, so known ones are not re-verified
+_verified_urls = TTLCache(maxsize=settings.IMAGE_VERIFY_CACHE_SIZE, ttl=settings.IMAGE_VERIFY_TTL_SECONDS)
 
 
 class ImagesClientStub:
@@ -12,52 +23,146 @@ class ImagesClientStub:
 			"link": "https://picsum.photos",
 		}
 
+	async def search_first_async(self, query: str) -> Dict[str, str]:
+		return self.search_first(query)
 
-class UnsplashClient:
-	# client for unsplash image api
-	def __init__(self, access_key: str | None = None):
-		self.access_key = access_key or settings.UNSPLASH_KEY
-		if not self.access_key:
-			raise ValueError("UNSPLASH_KEY not configured")
-		self.base_url = "https://api.unsplash.com"
+	def find_first(self, query: str) -> Optional[Dict[str, str]]:
+		return self.search_first(query)
+
+	async def find_first_async(self, query: str) -> Optional[Dict[str, str]]:
+		return self.search_first(query)
+
+	async def find_many_async(self, query: str, n: int) -> List[Dict[str, str]]:
+		# distinct picsum seeds so multi-image results differ
+		slug = re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-") or "travel"
+		return [{**self.search_first(query), "url": f"https://picsum.photos/seed/{slug}-{i}/800/600"} for i in range(n)]
+
+
+class _ProviderClient:
+	# shared search flow for providers: one search request on the pooled client, then a HEAD check that the
+	# photo url serves an image; subclasses describe the request and how to read photos from the response
+	@staticmethod
+	def verify_cache_stats() -> Dict[str, Any]:
+		return _verified_urls.stats()
+
+	@staticmethod
+	def clear_verify_cache() -> None:
+		_verified_urls.clear()
+
+	def _search_request(self, query: str, per_page: int = 1) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+		raise NotImplementedError
+
+	def _photos(self, data: Dict[str, Any]) -> List[Dict[str, str]]:
+		raise NotImplementedError
+
+	def _first_photo(self, data: Dict[str, Any]) -> Optional[Dict[str, str]]:
+		photos = self._photos(data)
+		return photos[0] if photos else None
+
+	def _verify(self, client: httpx.Client, url: str) -> bool:
+		# True if the url serves an image; definite answers are cached per url, transport errors propagate
+		hit, ok = _verified_urls.get(url)
+		if hit:
+			return ok
+		verify_response = client.head(url, timeout=5.0)
+		ok = verify_response.headers.get("content-type", "").startswith("image/")
+		_verified_urls.set(url, ok)
+		return ok
+
+	async def _verify_async(self, client: httpx.AsyncClient, url: str) -> bool:
+		hit, ok = _verified_urls.get(url)
+		if hit:
+			return ok
+		verify_response = await client.head(url, timeout=5.0)
+		ok = verify_response.headers.get("content-type", "").startswith("image/")
+		_verified_urls.set(url, ok)
+		return ok
+
+	def find_first(self, query: str) -> Optional[Dict[str, str]]:
+		# first verified photo for the query, None when the provider has no usable result; transport
+		# and http errors propagate so callers can tell them apart from an empty answer
+		url, params, headers = self._search_request(query)
+		client = get_client()
+		response = client.get(url, params=params, headers=headers, timeout=10.0)
+		response.raise_for_status()
+		photo = self._first_photo(response.json())
+		if photo is None or not self._verify(client, photo["url"]):
+			return None
+		return photo
+
+	async def find_first_async(self, query: str) -> Optional[Dict[str, str]]:
+		# same as find_first without blocking the event loop
+		url, params, headers = self._search_request(query)
+		client = get_async_client()
+		response = await client.get(url, params=params, headers=headers, timeout=10.0)
+		response.raise_for_status()
+		photo = self._first_photo(response.json())
+		if photo is None or not await self._verify_async(client, photo["url"]):
+			return None
+		return photo
+
+	async def find_many_async(self, query: str, n: int) -> List[Dict[str, str]]:
+		# up to n distinct verified photos from a single search request; HEAD checks run concurrently
+		# and photos that fail them are dropped. Transport and http errors of the search propagate
+		url, params, headers = self._search_request(query, per_page=n)
+		client = get_async_client()
+		response = await client.get(url, params=params, headers=headers, timeout=10.0)
+		response.raise_for_status()
+		photos = list({p["url"]: p for p in self._photos(response.json())}.values())[:n]
+
+		async def verify(photo: Dict[str, str]) -> bool:
+			try:
+				return await self._verify_async(client, photo["url"])
+			except httpx.HTTPError:
+				return False
+
+		verified = await asyncio.gather(*(verify(p) for p in photos))
+		return [p for p, ok in zip(photos, verified) if ok]
 
 	def search_first(self, query: str) -> Dict[str, str]:
 		try:
-			with httpx.Client() as client:
-				response = client.get(
-					f"{self.base_url}/search/photos",
-					params={"query": query, "per_page": 1, "orientation": "landscape"},
-					headers={"Authorization": f"Client-ID {self.access_key}"},
-					timeout=10.0,
-				)
-				response.raise_for_status()
-				data = response.json()
-				
-				if not data.get("results") or len(data["results"]) == 0:
-					return self._fallback()
-				
-				photo = data["results"][0]
-				url = photo["urls"]["regular"]
-				
-				verify_response = client.head(url, timeout=5.0)
-				content_type = verify_response.headers.get("content-type", "")
-				if not content_type.startswith("image/"):
-					return self._fallback()
-				
-				return {
-					"url": url,
-					"source": "unsplash",
-					"author": photo["user"]["name"],
-					"link": photo["links"]["html"],
-				}
+			return self.find_first(query) or self._fallback()
 		except Exception:
 			return self._fallback()
-	
+
+	async def search_first_async(self, query: str) -> Dict[str, str]:
+		try:
+			return await self.find_first_async(query) or self._fallback()
+		except Exception:
+			return self._fallback()
+
 	def _fallback(self) -> Dict[str, str]:
 		return ImagesClientStub().search_first("travel")
 
 
-class PexelsClient:
+class UnsplashClient(_ProviderClient):
+	# client for unsplash image api
+	def __init__(self, access_key: str | None = None):
+		self.access_key = access_key or settings.UNSPLASH_KEY
+		if not self.access_key:
+			raise ValueError("UNSPLASH_KEY not configured")
+		self.base_url = "https://api.unsplash.com"
+
+	def _search_request(self, query: str, per_page: int = 1) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+		return (
+			f"{self.base_url}/search/photos",
+			{"query": query, "per_page": per_page, "orientation": "landscape"},
+			{"Authorization": f"Client-ID {self.access_key}"},
+		)
+
+	def _photos(self, data: Dict[str, Any]) -> List[Dict[str, str]]:
+		return [
+			{
+				"url": photo["urls"]["regular"],
+				"source": "unsplash",
+				"author": photo["user"]["name"],
+				"link": photo["links"]["html"],
+			}
+			for photo in data.get("results") or []
+		]
+
+
+class PexelsClient(_ProviderClient):
 	# client for pexels image api
 	def __init__(self, api_key: str | None = None):
 		self.api_key = api_key or settings.PEXELS_API_KEY
@@ -65,37 +170,138 @@ class PexelsClient:
 			raise ValueError("PEXELS_API_KEY not configured")
 		self.base_url = "https://api.pexels.com/v1"
 
+	def _search_request(self, query: str, per_page: int = 1) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+		return (
+			f"{self.base_url}/search",
+			{"query": query, "per_page": per_page, "orientation": "landscape"},
+			{"Authorization": self.api_key},
+		)
+
+	def _photos(self, data: Dict[str, Any]) -> List[Dict[str, str]]:
+		return [
+			{
+				"url": photo["src"]["large"],
+				"source": "pexels",
+				"author": photo["photographer"],
+				"link": photo["url"],
+			}
+			for photo in data.get("photos") or []
+		]
+
+
+# runs the sync race legs, stragglers finish in the background after a winner is returned
+_race_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="image-race")
+
+
+class _Race:
+	# bookkeeping for one race: the first accepted answer wins, later valid answers count as "lost"
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.winner: Optional[str] = None
+
+	def finish(self, provider: str, value: Any, started: float) -> bool:
+		# records a finished leg, returns True if it won
+		latency = time.perf_counter() - started
+		with self._lock:
+			won = bool(value) and self.winner is None
+			if won:
+				self.winner = provider
+		image_metrics.record_lookup(provider, "win" if won else ("lost" if value else "empty"), latency)
+		return won
+
+
+class RacingImagesClient:
+	# queries every configured provider at once and answers with the first verified result; slower
+	# lookups are cancelled (async) or left to finish unused (sync). Raises only if every provider failed
+	def __init__(self, providers: Dict[str, Any]):
+		if not providers:
+			raise ValueError("No image providers configured for racing")
+		self.providers = providers
+
+	async def _race_async(self, call: Callable[[Any], Awaitable[Any]], empty: Any) -> Any:
+		race = _Race()
+		errors: List[Exception] = []
+
+		async def leg(name: str, client: Any) -> Tuple[bool, Any]:
+			started = time.perf_counter()
+			try:
+				value = await call(client)
+			except asyncio.CancelledError:
+				image_metrics.record_lookup(name, "cancelled", time.perf_counter() - started)
+				raise
+			except Exception as e:
+				image_metrics.record_lookup(name, "error", time.perf_counter() - started)
+				errors.append(e)
+				return False, None
+			return race.finish(name, value, started), value
+
+		pending = {asyncio.ensure_future(leg(name, client)) for name, client in self.providers.items()}
+		result = None
+		try:
+			while pending and race.winner is None:
+				done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+				for task in done:
+					won, value = task.result()
+					if won:
+						result = value
+		finally:
+			for task in pending:
+				task.cancel()
+			if pending:
+				await asyncio.gather(*pending, return_exceptions=True)
+		image_metrics.record_race(race.winner)
+		if race.winner is None and len(errors) == len(self.providers):
+			raise errors[0]
+		return result if race.winner else empty
+
+	def _race_sync(self, call: Callable[[Any], Any], empty: Any) -> Any:
+		race = _Race()
+
+		def leg(name: str, client: Any) -> Tuple[bool, Any]:
+			started = time.perf_counter()
+			try:
+				value = call(client)
+			except Exception:
+				image_metrics.record_lookup(name, "error", time.perf_counter() - started)
+				raise
+			return race.finish(name, value, started), value
+
+		pending = {_race_pool.submit(leg, name, client) for name, client in self.providers.items()}
+		errors: List[BaseException] = []
+		while pending:
+			done, pending = wait(pending, return_when=FIRST_COMPLETED)
+			for future in done:
+				if future.exception() is not None:
+					errors.append(future.exception())
+					continue
+				won, value = future.result()
+				if won:
+					for straggler in pending:
+						straggler.cancel()
+					image_metrics.record_race(race.winner)
+					return value
+		image_metrics.record_race(None)
+		if len(errors) == len(self.providers):
+			raise errors[0]
+		return empty
+
+	def find_first(self, query: str) -> Optional[Dict[str, str]]:
+		return self._race_sync(lambda c: c.find_first(query), None)
+
+	async def find_first_async(self, query: str) -> Optional[Dict[str, str]]:
+		return await self._race_async(lambda c: c.find_first_async(query), None)
+
+	async def find_many_async(self, query: str, n: int) -> List[Dict[str, str]]:
+		return await self._race_async(lambda c: c.find_many_async(query, n), [])
+
 	def search_first(self, query: str) -> Dict[str, str]:
 		try:
-			with httpx.Client() as client:
-				response = client.get(
-					f"{self.base_url}/search",
-					params={"query": query, "per_page": 1, "orientation": "landscape"},
-					headers={"Authorization": self.api_key},
-					timeout=10.0,
-				)
-				response.raise_for_status()
-				data = response.json()
-				
-				if not data.get("photos") or len(data["photos"]) == 0:
-					return self._fallback()
-				
-				photo = data["photos"][0]
-				url = photo["src"]["large"]
-				
-				verify_response = client.head(url, timeout=5.0)
-				content_type = verify_response.headers.get("content-type", "")
-				if not content_type.startswith("image/"):
-					return self._fallback()
-				
-				return {
-					"url": url,
-					"source": "pexels",
-					"author": photo["photographer"],
-					"link": photo["url"],
-				}
+			return self.find_first(query) or ImagesClientStub().search_first(query)
 		except Exception:
-			return self._fallback()
-	
-	def _fallback(self) -> Dict[str, str]:
-		return ImagesClientStub().search_first("travel")
+			return ImagesClientStub().search_first(query)
+
+	async def search_first_async(self, query: str) -> Dict[str, str]:
+		try:
+			return await self.find_first_async(query) or ImagesClientStub().search_first(query)
+		except Exception:
+			return ImagesClientStub().search_first(query)
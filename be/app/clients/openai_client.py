@@ -4,7 +4,42 @@
 
 from typing import Any, Dict, List
 import random
+import time
+from app.core.circuit_breaker import CircuitBreaker
 from app.core.config import settings
+from app.core.metrics import llm_metrics
+
+
+class LLMUpstreamError(ValueError):
+	# upstream llm call failed; subclasses ValueError so existing callers keep working
+	pass
+
+
+class LLMTimeoutError(LLMUpstreamError):
+	# the operation's timeout budget ran out, including retries
+	pass
+
+
+class LLMCircuitOpenError(LLMUpstreamError):
+	# call refused without going upstream because the breaker is open
+	pass
+
+
+# shared by all client instances, clients are created per request
+breaker = CircuitBreaker(
+	"openai",
+	failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+	reset_timeout=settings.LLM_BREAKER_RESET_SECONDS,
+)
+
+# total time budget per schema, retries included
+TIMEOUT_BUDGETS = {
+	"destinations_response": settings.LLM_TIMEOUT_SUGGEST_SECONDS,
+	"expand_response": settings.LLM_TIMEOUT_EXPAND_SECONDS,
+	"customize_response": settings.LLM_TIMEOUT_CUSTOMIZE_SECONDS,
+}
+
+_jitter = random.Random()
 
 
 class OpenAIClientStub:
@@ -62,12 +97,69 @@ class OpenAIClient:
 		self.model = model or settings.OPENAI_MODEL
 		if not self.api_key:
 			raise ValueError("OPENAI_API_KEY not configured")
+		# sdk client and its connection pool, built on first use; attempts only change its timeout
+		self._client = None
+
+	def _parse(self, schema_name: str, schema: Dict[str, Any], messages: List[Dict[str, str]]) -> Any:
+		# runs a structured-output completion within the schema's timeout budget, retrying
+		# retryable errors with jittered backoff; records tokens, latency and errors per attempt
+		import openai
+		from openai import OpenAI
+		retryable = (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+		if not breaker.allow():
+			raise LLMCircuitOpenError("OpenAI circuit breaker is open")
+
+		budget = TIMEOUT_BUDGETS.get(schema_name, settings.LLM_TIMEOUT_EXPAND_SECONDS)
+		deadline = time.monotonic() + budget
+		attempts = max(0, settings.LLM_MAX_RETRIES) + 1
+		last_error: Exception | None = None
+		if self._client is None:
+			self._client = OpenAI(api_key=self.api_key, max_retries=0)
+		for attempt in range(attempts):
+			remaining = deadline - time.monotonic()
+			if remaining <= 0:
+				break
+			client = self._client.with_options(timeout=remaining)
+			started = time.perf_counter()
+			try:
+				response = client.beta.chat.completions.parse(
+					model=self.model,
+					messages=messages,
+					response_format={"type": "json_schema", "json_schema": {"name": schema_name, "strict": True, "schema": schema}},
+					temperature=0.2,
+					seed=42,
+				)
+			except retryable as e:
+				llm_metrics.record_call(schema_name, self.model, time.perf_counter() - started, error=type(e).__name__)
+				last_error = e
+				if attempt + 1 < attempts:
+					delay = _jitter.uniform(0, settings.LLM_RETRY_BASE_DELAY_SECONDS * (2 ** attempt))
+					time.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+				continue
+			except Exception as e:
+				# request or auth errors will not get better by retrying and say nothing about upstream health
+				llm_metrics.record_call(schema_name, self.model, time.perf_counter() - started, error=type(e).__name__)
+				breaker.release()
+				raise LLMUpstreamError(f"OpenAI API error: {str(e)}") from e
+			usage = getattr(response, "usage", None)
+			llm_metrics.record_call(
+				schema_name,
+				self.model,
+				time.perf_counter() - started,
+				prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+				completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+			)
+			breaker.record_success()
+			return response.choices[0].message.parsed
+
+		breaker.record_failure()
+		if last_error is None or isinstance(last_error, openai.APITimeoutError):
+			raise LLMTimeoutError(f"OpenAI call exceeded its {budget:.0f}s budget") from last_error
+		raise LLMUpstreamError(f"OpenAI API error: {str(last_error)}") from last_error
 
 	def suggest_destinations(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
 		try:
-			from openai import OpenAI
-			client = OpenAI(api_key=self.api_key)
-			
 			system_prompt = """You are a travel advisor. Generate exactly 5 travel destination suggestions based on user filters.
 Return JSON only per the provided schema. Prices are rough estimates for 6-8 nights; round to nearest 10 EUR.
 Consider the user's preferences for regions, budget, transport, and stay type."""
@@ -116,30 +208,21 @@ Transport: {filters.get('transport', [])}"""
 				},
 			}
 			
-			response = client.beta.chat.completions.parse(
-				model=self.model,
-				messages=[
-					{"role": "system", "content": system_prompt},
-					{"role": "user", "content": user_prompt},
-				],
-				response_format={"type": "json_schema", "json_schema": {"name": "destinations_response", "strict": True, "schema": schema}},
-				temperature=0.2,
-				seed=42,
-			)
-			
-			parsed = response.choices[0].message.parsed
+			parsed = self._parse("destinations_response", schema, [
+				{"role": "system", "content": system_prompt},
+				{"role": "user", "content": user_prompt},
+			])
 			if not parsed or "destinations" not in parsed:
 				raise ValueError("Invalid response format from OpenAI")
 			
 			return parsed["destinations"]
+		except LLMUpstreamError:
+			raise
 		except Exception as e:
 			raise ValueError(f"OpenAI API error: {str(e)}")
 
 	def expand_destination(self, base: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
 		try:
-			from openai import OpenAI
-			client = OpenAI(api_key=self.api_key)
-			
 			system_prompt = """You are a travel advisor. Generate detailed information about a destination.
 Return JSON only per the provided schema."""
 			
@@ -158,30 +241,21 @@ Include highlights, why visit, things to consider, and a long description."""
 				},
 			}
 			
-			response = client.beta.chat.completions.parse(
-				model=self.model,
-				messages=[
-					{"role": "system", "content": system_prompt},
-					{"role": "user", "content": user_prompt},
-				],
-				response_format={"type": "json_schema", "json_schema": {"name": "expand_response", "strict": True, "schema": schema}},
-				temperature=0.2,
-				seed=42,
-			)
-			
-			parsed = response.choices[0].message.parsed
+			parsed = self._parse("expand_response", schema, [
+				{"role": "system", "content": system_prompt},
+				{"role": "user", "content": user_prompt},
+			])
 			if not parsed:
 				raise ValueError("Invalid response format from OpenAI")
 			
 			return parsed
+		except LLMUpstreamError:
+			raise
 		except Exception as e:
 			raise ValueError(f"OpenAI API error: {str(e)}")
 
 	def customize_destination(self, base: Dict[str, Any], user_prompt: str) -> Dict[str, Any]:
 		try:
-			from openai import OpenAI
-			client = OpenAI(api_key=self.api_key)
-			
 			system_prompt = """You are a travel advisor. Customize destination details based on user preferences.
 Return JSON only per the provided schema."""
 			
@@ -201,21 +275,15 @@ Generate customized highlights, why visit, things to consider, and description."
 				},
 			}
 			
-			response = client.beta.chat.completions.parse(
-				model=self.model,
-				messages=[
-					{"role": "system", "content": system_prompt},
-					{"role": "user", "content": prompt},
-				],
-				response_format={"type": "json_schema", "json_schema": {"name": "customize_response", "strict": True, "schema": schema}},
-				temperature=0.2,
-				seed=42,
-			)
-			
-			parsed = response.choices[0].message.parsed
+			parsed = self._parse("customize_response", schema, [
+				{"role": "system", "content": system_prompt},
+				{"role": "user", "content": prompt},
+			])
 			if not parsed:
 				raise ValueError("Invalid response format from OpenAI")
 			
 			return parsed
+		except LLMUpstreamError:
+			raise
 		except Exception as e:
 			raise ValueError(f"OpenAI API error: {str(e)}")
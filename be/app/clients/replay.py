@@ -0,0 +1,195 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   replay.py
+# Functionality :   record and replay transports for llm and image clients
+
+import asyncio
+import hashlib
+import inspect
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import settings
+
+
+class LatencyModel:
+	# samples artificial latency in seconds from a spec string:
+	#   "none", "recorded", "fixed:MS", "uniform:LO_MS,HI_MS", "normal:MEAN_MS,STD_MS", "lognormal:MEDIAN_MS,SIGMA"
+	def __init__(self, spec: str = "recorded", seed: Optional[int] = None):
+		self.spec = (spec or "none").strip().lower()
+		self.kind, _, raw = self.spec.partition(":")
+		self.params = [float(p) for p in raw.split(",") if p.strip()]
+		self._rng = random.Random(seed)
+		self._lock = threading.Lock()
+		expected = {"none": 0, "recorded": 0, "fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+		if self.kind not in expected or len(self.params) != expected[self.kind]:
+			raise ValueError(f"Invalid latency spec: {spec}")
+
+	def sample(self, recorded_ms: Optional[float] = None) -> float:
+		with self._lock:
+			if self.kind == "none":
+				ms = 0.0
+			elif self.kind == "recorded":
+				ms = recorded_ms or 0.0
+			elif self.kind == "fixed":
+				ms = self.params[0]
+			elif self.kind == "uniform":
+				ms = self._rng.uniform(self.params[0], self.params[1])
+			elif self.kind == "normal":
+				ms = self._rng.gauss(self.params[0], self.params[1])
+			else:
+				ms = self._rng.lognormvariate(math.log(max(self.params[0], 1e-3)), self.params[1])
+		return max(0.0, ms) / 1000.0
+
+
+class FixtureStore:
+	# json fixtures stored as <root>/<namespace>/<method>/<key>.json
+	def __init__(self, root: str):
+		self.root = root
+		self._lock = threading.Lock()
+		self._index: Dict[str, List[str]] = {}
+
+	@staticmethod
+	def key_for(args: Any, kwargs: Any) -> str:
+		raw = json.dumps([args, kwargs], sort_keys=True, default=str)
+		return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+	def _dir(self, namespace: str, method: str) -> str:
+		return os.path.join(self.root, namespace, method)
+
+	def save(self, namespace: str, method: str, key: str, record: Dict[str, Any]) -> None:
+		directory = self._dir(namespace, method)
+		os.makedirs(directory, exist_ok=True)
+		path = os.path.join(directory, f"{key}.json")
+		tmp = f"{path}.tmp"
+		with open(tmp, "w", encoding="utf-8") as f:
+			json.dump(record, f, ensure_ascii=False, indent=2, default=str)
+		os.replace(tmp, path)
+		with self._lock:
+			self._index.pop(f"{namespace}/{method}", None)
+
+	def load(self, namespace: str, method: str, key: str) -> Optional[Dict[str, Any]]:
+		path = os.path.join(self._dir(namespace, method), f"{key}.json")
+		if not os.path.exists(path):
+			return None
+		with open(path, encoding="utf-8") as f:
+			return json.load(f)
+
+	def keys(self, namespace: str, method: str) -> List[str]:
+		# sorted fixture keys for a method, cached until the next save
+		index_key = f"{namespace}/{method}"
+		with self._lock:
+			if index_key not in self._index:
+				directory = self._dir(namespace, method)
+				names = sorted(n[:-5] for n in os.listdir(directory) if n.endswith(".json")) if os.path.isdir(directory) else []
+				self._index[index_key] = names
+			return self._index[index_key]
+
+
+def _fixture_method(name: str) -> str:
+	# async variants ("search_first_async") share fixtures with their sync method
+	return name[:-len("_async")] if name.endswith("_async") else name
+
+
+class RecordingClient:
+	# forwards every public method call to the wrapped client and saves the result as a fixture
+	def __init__(self, inner: Any, store: FixtureStore, namespace: str):
+		self._inner = inner
+		self._store = store
+		self._namespace = namespace
+
+	def __getattr__(self, name: str) -> Any:
+		target = getattr(self._inner, name)
+		if name.startswith("_") or not callable(target):
+			return target
+
+		def save(args, kwargs, result, started):
+			self._store.save(self._namespace, _fixture_method(name), FixtureStore.key_for(args, kwargs), {
+				"args": args,
+				"kwargs": kwargs,
+				"result": result,
+				"latency_ms": round((time.perf_counter() - started) * 1000, 3),
+			})
+
+		if inspect.iscoroutinefunction(target):
+			async def record_async(*args, **kwargs):
+				started = time.perf_counter()
+				result = await target(*args, **kwargs)
+				save(args, kwargs, result, started)
+				return result
+			return record_async
+
+		def record(*args, **kwargs):
+			started = time.perf_counter()
+			result = target(*args, **kwargs)
+			save(args, kwargs, result, started)
+			return result
+		return record
+
+
+class ReplayClient:
+	# answers method calls from fixtures after sleeping for a sampled latency; with strict=False an
+	# unknown request gets a deterministic pick among the method's fixtures instead of an error.
+	# "*_async" methods are coroutines answered from the sync method's fixtures
+	def __init__(self, store: FixtureStore, namespace: str, latency: LatencyModel, strict: bool = False, sleep: Callable[[float], None] = time.sleep):
+		self._store = store
+		self._namespace = namespace
+		self._latency = latency
+		self._strict = strict
+		self._sleep = sleep
+
+	def __getattr__(self, name: str) -> Any:
+		if name.startswith("_"):
+			raise AttributeError(name)
+
+		method = _fixture_method(name)
+
+		def lookup(args, kwargs):
+			key = FixtureStore.key_for(args, kwargs)
+			record = self._store.load(self._namespace, method, key)
+			if record is None and not self._strict:
+				keys = self._store.keys(self._namespace, method)
+				if keys:
+					record = self._store.load(self._namespace, method, keys[int(key, 16) % len(keys)])
+			if record is None:
+				raise LookupError(f"No {self._namespace}.{method} fixture recorded for key {key}")
+			return record, self._latency.sample(record.get("latency_ms"))
+
+		if method != name:
+			async def replay_async(*args, **kwargs):
+				record, delay = lookup(args, kwargs)
+				if delay:
+					await asyncio.sleep(delay)
+				return json.loads(json.dumps(record["result"]))
+			return replay_async
+
+		def replay(*args, **kwargs):
+			record, delay = lookup(args, kwargs)
+			if delay:
+				self._sleep(delay)
+			return json.loads(json.dumps(record["result"]))
+		return replay
+
+
+_stores: Dict[str, FixtureStore] = {}
+_latency_models: Dict[str, LatencyModel] = {}
+
+
+def wrap_transport(client: Any, namespace: str) -> Any:
+	# applies the configured transport mode ("live", "record" or "replay") for a client namespace;
+	# stores and latency models are shared because clients are created per request
+	mode = (settings.LLM_TRANSPORT if namespace == "llm" else settings.IMAGE_TRANSPORT).lower()
+	if mode == "live":
+		return client
+	store = _stores.setdefault(settings.FIXTURES_DIR, FixtureStore(settings.FIXTURES_DIR))
+	if mode == "record":
+		return RecordingClient(client, store, namespace)
+	if mode == "replay":
+		spec = settings.REPLAY_LATENCY_LLM if namespace == "llm" else settings.REPLAY_LATENCY_IMAGES
+		if spec not in _latency_models:
+			_latency_models[spec] = LatencyModel(spec)
+		return ReplayClient(store, namespace, _latency_models[spec], strict=settings.REPLAY_STRICT)
+	raise ValueError(f"Unknown transport mode: {mode}")
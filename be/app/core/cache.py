@@ -0,0 +1,67 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   cache.py
+# Functionality :   in-process lru cache with per-entry expiry
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+
+class TTLCache:
+	# thread-safe lru cache, values are deep-copied in and out so callers can mutate them freely
+	def __init__(self, maxsize: int = 256, ttl: float = 3600.0):
+		self.maxsize = max(1, maxsize)
+		self.ttl = ttl
+		self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, key: Hashable) -> Tuple[bool, Any]:
+		# returns (hit, value); expired entries count as misses but stay until evicted
+		now = time.monotonic()
+		with self._lock:
+			entry = self._data.get(key)
+			if entry is None or entry[0] < now:
+				self.misses += 1
+				return False, None
+			self._data.move_to_end(key)
+			self.hits += 1
+			value = entry[1]
+		return True, copy.deepcopy(value)
+
+	def get_stale(self, key: Hashable) -> Tuple[bool, Any]:
+		# returns an entry even if it expired, for serving degraded responses
+		with self._lock:
+			entry = self._data.get(key)
+			if entry is None:
+				return False, None
+			value = entry[1]
+		return True, copy.deepcopy(value)
+
+	def set(self, key: Hashable, value: Any) -> None:
+		value = copy.deepcopy(value)
+		with self._lock:
+			self._data[key] = (time.monotonic() + self.ttl, value)
+			self._data.move_to_end(key)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._data.clear()
+			self.hits = 0
+			self.misses = 0
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				"size": len(self._data),
+				"maxsize": self.maxsize,
+				"hits": self.hits,
+				"misses": self.misses,
+				"hit_rate": round(self.hits / lookups, 4) if lookups else None,
+			}
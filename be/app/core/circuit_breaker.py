@@ -0,0 +1,81 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   circuit_breaker.py
+# Functionality :   circuit breaker for calls to degraded upstream services
+
+import threading
+import time
+from typing import Any, Dict
+
+
+class CircuitBreaker:
+	# opens after consecutive failures, lets a single trial call through once the reset timeout passes
+	CLOSED = "closed"
+	OPEN = "open"
+	HALF_OPEN = "half_open"
+
+	def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+		self.name = name
+		self.failure_threshold = max(1, failure_threshold)
+		self.reset_timeout = reset_timeout
+		self._lock = threading.Lock()
+		self._state = self.CLOSED
+		self._failures = 0
+		self._opened_at = 0.0
+		self._trial_in_flight = False
+		self._times_opened = 0
+
+	def allow(self) -> bool:
+		# returns True if a call may go upstream now
+		with self._lock:
+			if self._state == self.CLOSED:
+				return True
+			if self._state == self.OPEN:
+				if time.monotonic() - self._opened_at < self.reset_timeout:
+					return False
+				self._state = self.HALF_OPEN
+				self._trial_in_flight = False
+			if self._trial_in_flight:
+				return False
+			self._trial_in_flight = True
+			return True
+
+	def record_success(self) -> None:
+		with self._lock:
+			self._state = self.CLOSED
+			self._failures = 0
+			self._trial_in_flight = False
+
+	def release(self) -> None:
+		# ends a call whose outcome says nothing about upstream health: the failure count and state are kept,
+		# only a half-open trial slot is handed back so the next call can try
+		with self._lock:
+			self._trial_in_flight = False
+
+	def record_failure(self) -> None:
+		with self._lock:
+			self._failures += 1
+			if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+				if self._state != self.OPEN:
+					self._times_opened += 1
+				self._state = self.OPEN
+				self._opened_at = time.monotonic()
+				self._trial_in_flight = False
+
+	def reset(self) -> None:
+		with self._lock:
+			self._state = self.CLOSED
+			self._failures = 0
+			self._trial_in_flight = False
+
+	def snapshot(self) -> Dict[str, Any]:
+		with self._lock:
+			retry_in = None
+			if self._state == self.OPEN:
+				retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 3)
+			return {
+				"name": self.name,
+				"state": self._state,
+				"consecutive_failures": self._failures,
+				"times_opened": self._times_opened,
+				"retry_in_seconds": retry_in,
+			}
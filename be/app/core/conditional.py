@@ -0,0 +1,54 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   conditional.py
+# Functionality :   etag validators for list endpoints built from data scope versions
+
+import hashlib
+from typing import Dict, List, Optional
+from sqlmodel import SQLModel, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.requests import Request
+from starlette.responses import Response
+from app.core.file_response import etag_matches
+from app.repositories.data_version_repo import DataVersionRepository
+
+# clients revalidate every time, an unchanged list then costs one primary key lookup and a 304
+CACHE_CONTROL = "private, no-cache"
+
+_schema_token: Optional[str] = None
+
+
+def _schema() -> str:
+	# changes when a deploy adds or removes columns, so cached bodies of the old shape stop matching
+	global _schema_token
+	if _schema_token is None:
+		columns = sorted(f"{t.name}.{c.name}" for t in SQLModel.metadata.tables.values() for c in t.columns)
+		_schema_token = hashlib.sha1("|".join(columns).encode("utf-8")).hexdigest()[:8]
+	return _schema_token
+
+
+def list_etag(request: Request, db: Session, scopes: List[str], session_id: str) -> str:
+	# weak etag over the versions of every scope the response reads, the caller's session and the query
+	# string; computed before the list query so a matching If-None-Match skips it entirely
+	return _etag(request, DataVersionRepository().get_many(db, scopes), session_id)
+
+
+async def list_etag_async(request: Request, db: AsyncSession, scopes: List[str], session_id: str) -> str:
+	return _etag(request, await DataVersionRepository().get_many_async(db, scopes), session_id)
+
+
+def _etag(request: Request, versions: Dict[str, int], session_id: str) -> str:
+	parts = [_schema(), request.url.path, request.url.query, session_id] + [f"{s}={v}" for s, v in versions.items()]
+	return 'W/"' + hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+	# 304 response when the client copy is current, None to build the full response
+	if etag_matches(request, etag.removeprefix("W/")):
+		return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+	return None
+
+
+def with_etag(response: Response, etag: str) -> Response:
+	response.headers["ETag"] = etag
+	response.headers["Cache-Control"] = CACHE_CONTROL
+	return response
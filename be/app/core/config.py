@@ -13,17 +13,93 @@ class Settings(BaseSettings):
 
 	ENV: str = Field(default="local")
 	DB_URL: str = Field(default="sqlite:///./travelbot.db")
+	DB_PROFILE: str = Field(default="default")  # default or production (wal, pragmas, larger pool)
+	DB_BUSY_TIMEOUT_MS: int = Field(default=15000)
+	DB_MMAP_SIZE_BYTES: int = Field(default=256 * 1024 * 1024)
+	DB_CACHE_SIZE_KB: int = Field(default=64 * 1024)
+	DB_POOL_SIZE: int = Field(default=10)
+	DB_POOL_MAX_OVERFLOW: int = Field(default=20)
 	ALLOWED_ORIGINS: str = Field(default="http://localhost:5173")
 	OPENAI_API_KEY: Optional[str] = None
 	OPENAI_MODEL: str = Field(default="gpt-4o-mini")
 	IMAGE_PROVIDER: str = Field(default="stub")
 	UNSPLASH_KEY: Optional[str] = None
 	PEXELS_API_KEY: Optional[str] = None
+	IMAGE_LOOKUP_DEADLINE_SECONDS: float = Field(default=4.0)
+	IMAGE_CACHE_ENABLED: bool = Field(default=True)
+	IMAGE_CACHE_TTL_SECONDS: int = Field(default=7 * 24 * 3600)
+	IMAGE_CACHE_NEGATIVE_TTL_SECONDS: int = Field(default=24 * 3600)
+	IMAGE_CACHE_MAX_ENTRIES: int = Field(default=5000)
+	IMAGE_SEARCH_CACHE_SIZE: int = Field(default=512)
+	IMAGE_VERIFY_CACHE_SIZE: int = Field(default=4096)
+	IMAGE_VERIFY_TTL_SECONDS: int = Field(default=24 * 3600)
+	IMAGE_STORE_DIR: str = Field(default="./image_store")
+	IMAGE_PROXY_ALLOWED_HOSTS: str = Field(default="images.unsplash.com,images.pexels.com,picsum.photos,fastly.picsum.photos")
+	IMAGE_PROXY_WIDTHS: str = Field(default="160,320,640,960,1280,1920")
+	IMAGE_PROXY_MAX_BYTES: int = Field(default=10 * 1024 * 1024)
+	IMAGE_STORE_MAX_BYTES: int = Field(default=1024 * 1024 * 1024)  # least recently served files are pruned past this
+	IMAGE_MAX_PIXELS: int = Field(default=40_000_000)  # pillow refuses to decode images over twice this
+	IMAGE_PROXY_MAX_AGE_SECONDS: int = Field(default=30 * 24 * 3600)
+	HTTP_POOL_HTTP2: bool = Field(default=True)  # used when the h2 package is installed
+	HTTP_POOL_MAX_CONNECTIONS: int = Field(default=20)
+	HTTP_POOL_MAX_KEEPALIVE: int = Field(default=10)
+	HTTP_POOL_KEEPALIVE_SECONDS: float = Field(default=60.0)
 	RATE_LIMIT_PER_MINUTE: int = Field(default=10)
 	RATE_LIMIT_EXPLORE_PER_MINUTE: int = Field(default=10)
+	RATE_LIMIT_BACKEND: str = Field(default="memory")
+	RATE_LIMIT_DB_PATH: str = Field(default="./rate_limit.db")
+	RATE_LIMIT_MAX_KEYS: int = Field(default=10000)
+	RATE_LIMIT_DB_TIMEOUT_MS: int = Field(default=50)  # sqlite busy wait; a hit that would wait longer is let through
+	LLM_TIMEOUT_SUGGEST_SECONDS: float = Field(default=20.0)
+	LLM_TIMEOUT_EXPAND_SECONDS: float = Field(default=15.0)
+	LLM_TIMEOUT_CUSTOMIZE_SECONDS: float = Field(default=15.0)
+	LLM_MAX_RETRIES: int = Field(default=2)
+	LLM_RETRY_BASE_DELAY_SECONDS: float = Field(default=0.5)
+	LLM_BREAKER_FAILURE_THRESHOLD: int = Field(default=5)
+	LLM_BREAKER_RESET_SECONDS: float = Field(default=30.0)
+	LLM_MAX_IN_FLIGHT: int = Field(default=8)  # per worker process
+	LLM_QUEUE_MAX_WAIT_SECONDS: float = Field(default=10.0)
+	LLM_CACHE_SIZE: int = Field(default=256)
+	LLM_CACHE_TTL_SECONDS: int = Field(default=3600)
+	LLM_TRANSPORT: str = Field(default="live")  # live, record or replay
+	IMAGE_TRANSPORT: str = Field(default="live")  # live, record or replay
+	FIXTURES_DIR: str = Field(default="./fixtures")
+	REPLAY_LATENCY_LLM: str = Field(default="recorded")
+	REPLAY_LATENCY_IMAGES: str = Field(default="recorded")
+	REPLAY_STRICT: bool = Field(default=False)
+	ENRICHMENT_CONCURRENCY: int = Field(default=4)
+	ENRICHMENT_BATCH_SIZE: int = Field(default=10)
+	ENRICHMENT_ON_STARTUP: bool = Field(default=False)
+	PLACEHOLDERS_ENABLED: bool = Field(default=True)
+	PLACEHOLDERS_ON_STARTUP: bool = Field(default=False)  # fetches remote images, like enrichment it is opt-in
+	PLACEHOLDER_WIDTH: int = Field(default=16)
+	PLACEHOLDER_CONCURRENCY: int = Field(default=4)
+	PLACEHOLDER_BATCH_SIZE: int = Field(default=20)
+	IMAGE_PREFETCH_ENABLED: bool = Field(default=True)
+	IMAGE_PREFETCH_CONCURRENCY: int = Field(default=2)
+	METRICS_SLOW_REQUEST_SECONDS: float = Field(default=1.0)
+	LOG_LEVEL: str = Field(default="INFO")
+	LOG_FORMAT: str = Field(default="json")  # json or text
+	LOG_REQUESTS: bool = Field(default=True)  # one access record per request, replaces uvicorn's access log
+	LOG_QUEUE_SIZE: int = Field(default=10000)  # records past this are dropped, never waited for
+	LOG_TRACEBACK_INTERVAL_SECONDS: float = Field(default=60.0)  # one full traceback per call site and exception type
+	WARMUP_ON_STARTUP: bool = Field(default=True)  # imports, clients and representative queries before serving
+	HEALTH_DB_LATENCY_MAX_MS: float = Field(default=250.0)  # readiness fails past any of these
+	HEALTH_POOL_USAGE_MAX: float = Field(default=0.9)  # checked out connections / (pool size + overflow)
+	HEALTH_LLM_QUEUE_MAX: int = Field(default=50)
+	HEALTH_PREFETCH_PENDING_MAX: int = Field(default=500)
+	HEALTH_LOG_QUEUE_USAGE_MAX: float = Field(default=0.9)
+	DB_QUERY_SHAPES_ENABLED: bool = Field(default=False)  # n+1 detection, warns past DB_QUERY_REPEAT_THRESHOLD
+	DB_QUERY_REPEAT_THRESHOLD: int = Field(default=5)
 
 	def allowed_origins_list(self) -> List[str]:
 		return [o.strip() for o in self.ALLOWED_ORIGINS.split(",") if o.strip()]
 
+	def image_proxy_hosts_list(self) -> List[str]:
+		return [h.strip().lower() for h in self.IMAGE_PROXY_ALLOWED_HOSTS.split(",") if h.strip()]
+
+	def image_proxy_widths_list(self) -> List[int]:
+		return sorted(int(w) for w in self.IMAGE_PROXY_WIDTHS.split(",") if w.strip())
+
 
 settings = Settings()  # load once
@@ -0,0 +1,12 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   context.py
+# Functionality :   per-request context variables shared by middleware and services
+
+from contextvars import ContextVar
+from typing import Any, Optional
+
+# set by the session and request id middleware, readable anywhere below them
+current_session_id: ContextVar[Optional[str]] = ContextVar("current_session_id", default=None)
+current_request_id: ContextVar[Optional[str]] = ContextVar("current_request_id", default=None)
+# QueryStats of the current request, set by the request id middleware and filled by the cursor events
+current_query_stats: ContextVar[Optional[Any]] = ContextVar("current_query_stats", default=None)
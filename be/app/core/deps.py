@@ -2,12 +2,75 @@
 # File:                   deps.py
 # Functionality :   dependency injection functions for database and session management
 
-from typing import Generator
+from typing import Any, AsyncGenerator, Dict, Generator, List, Optional, Tuple
 from fastapi import Depends, Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.core.config import settings
 
-_engine = create_engine(settings.DB_URL, echo=False)
+
+def sqlite_pragmas(profile: Optional[str] = None) -> List[Tuple[str, Any]]:
+	# pragmas run on every new connection; the production profile lets several worker processes share one
+	# database file: wal readers never wait for the writer, writers queue on busy_timeout instead of failing
+	# with "database is locked", and synchronous=NORMAL only syncs at checkpoints, which is safe in wal mode
+	if (profile or settings.DB_PROFILE).lower() != "production":
+		return []
+	return [
+		("busy_timeout", settings.DB_BUSY_TIMEOUT_MS),  # first, so switching to wal also waits for other workers
+		("journal_mode", "WAL"),
+		("synchronous", "NORMAL"),
+		("mmap_size", settings.DB_MMAP_SIZE_BYTES),
+		("cache_size", -settings.DB_CACHE_SIZE_KB),  # negative is KiB instead of pages
+	]
+
+
+def _engine_options(url: str, profile: Optional[str] = None, poolclass=None) -> Dict[str, Any]:
+	# pool sizes apply to file databases, in-memory sqlite keeps sqlalchemy's single connection pool
+	parsed = make_url(url)
+	if (profile or settings.DB_PROFILE).lower() != "production" or parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+		return {}
+	options = {"pool_size": settings.DB_POOL_SIZE, "max_overflow": settings.DB_POOL_MAX_OVERFLOW}
+	if poolclass:
+		options["poolclass"] = poolclass
+	return options
+
+
+def apply_sqlite_pragmas(engine: Engine, profile: Optional[str] = None) -> Engine:
+	# registers the profile pragmas on the engine's connect event (pass async_engine.sync_engine for async)
+	pragmas = sqlite_pragmas(profile) if engine.url.get_backend_name() == "sqlite" else []
+	if pragmas:
+		@event.listens_for(engine, "connect")
+		def _set_pragmas(dbapi_connection, connection_record):
+			cursor = dbapi_connection.cursor()
+			for name, value in pragmas:
+				cursor.execute(f"PRAGMA {name}={value}")
+			cursor.close()
+	return engine
+
+
+def make_engine(url: str, profile: Optional[str] = None, **kwargs) -> Engine:
+	# sync engine with the connection profile from DB_PROFILE
+	return apply_sqlite_pragmas(create_engine(url, echo=False, **_engine_options(url, profile), **kwargs), profile)
+
+
+def make_async_engine(engine: Engine, profile: Optional[str] = None, **kwargs) -> AsyncEngine:
+	# async engine for the same database as a sync engine; sqlite goes through aiosqlite, which runs each
+	# connection on its own thread so the event loop keeps serving other requests while a query runs
+	url = make_url(str(engine.url))
+	if url.get_backend_name() == "sqlite":
+		url = url.set(drivername="sqlite+aiosqlite")
+	# aiosqlite defaults to a new connection (and thread) per session, the production profile pools them
+	async_engine = create_async_engine(url, echo=False, **_engine_options(str(engine.url), profile, AsyncAdaptedQueuePool), **kwargs)
+	apply_sqlite_pragmas(async_engine.sync_engine, profile)
+	return async_engine
+
+
+_engine = make_engine(settings.DB_URL)
+_async_engine = make_async_engine(_engine)
 
 
 def get_engine():
@@ -15,6 +78,11 @@ def get_engine():
 	return _engine
 
 
+def get_async_engine() -> AsyncEngine:
+	# returns the async engine used by the async session dependency
+	return _async_engine
+
+
 def get_db() -> Generator[Session, None, None]:
 	# provides database session dependency
 	session = Session(_engine)
@@ -24,6 +92,13 @@ def get_db() -> Generator[Session, None, None]:
 		session.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+	# provides async database session dependency for the hot routes; objects stay loaded after commit
+	# because responses are built from them once the transaction is over
+	async with AsyncSession(_async_engine, expire_on_commit=False) as session:
+		yield session
+
+
 def get_session_id(request: Request) -> str:
 	# extracts session id from request state or cookies
 	sid = getattr(request.state, "session_id", None)
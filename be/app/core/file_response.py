@@ -0,0 +1,80 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   file_response.py
+# Functionality :   streamed file responses with etag revalidation and single byte ranges
+
+import os
+import re
+from typing import Iterator, Optional, Tuple
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+	# reads the requested slice in chunks, starlette runs sync iterators in its threadpool
+	with open(path, "rb") as f:
+		f.seek(start)
+		remaining = length
+		while remaining > 0:
+			chunk = f.read(min(CHUNK_SIZE, remaining))
+			if not chunk:
+				break
+			remaining -= len(chunk)
+			yield chunk
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+	# (start, end inclusive) for a single "bytes=" range, None to serve the whole file;
+	# raises ValueError when the range cannot be satisfied
+	match = _RANGE.match(header.strip())
+	if not match or match.group(1) == match.group(2) == "":
+		# multiple or malformed ranges may be ignored per RFC 9110
+		return None
+	first, last = match.group(1), match.group(2)
+	if first == "":
+		suffix = int(last)
+		if suffix == 0:
+			raise ValueError("empty suffix range")
+		return max(0, size - suffix), size - 1
+	start = int(first)
+	end = min(int(last), size - 1) if last else size - 1
+	if start >= size or end < start:
+		raise ValueError("range outside the file")
+	return start, end
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+	# True if If-None-Match lists the etag, so the client copy is current
+	header = request.headers.get("if-none-match")
+	if not header:
+		return False
+	candidates = [c.strip().removeprefix("W/") for c in header.split(",")]
+	return "*" in candidates or etag in candidates
+
+
+def ranged_file_response(request: Request, path: str, media_type: str, etag: str, cache_control: str) -> Response:
+	# serves a file from disk without loading it into memory; answers 304 on a matching etag and
+	# 206 for a single byte range (honoured only when If-Range, if sent, still matches the etag)
+	headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+	if etag_matches(request, etag):
+		return Response(status_code=304, headers=headers)
+
+	size = os.path.getsize(path)
+	byte_range = None
+	range_header = request.headers.get("range")
+	if range_header and request.headers.get("if-range", etag) == etag:
+		try:
+			byte_range = _parse_range(range_header, size)
+		except ValueError:
+			headers["Content-Range"] = f"bytes */{size}"
+			return Response(status_code=416, headers=headers)
+
+	if byte_range is None:
+		headers["Content-Length"] = str(size)
+		return StreamingResponse(_iter_file(path, 0, size), media_type=media_type, headers=headers)
+	start, end = byte_range
+	headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+	headers["Content-Length"] = str(end - start + 1)
+	return StreamingResponse(_iter_file(path, start, end - start + 1), status_code=206, media_type=media_type, headers=headers)
@@ -0,0 +1,107 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   health.py
+# Functionality :   readiness report of one worker: database latency, pools, caches, breaker and queues
+
+import time
+from typing import Any, Dict, List, Tuple
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.config import settings
+from app.core.deps import get_async_engine, get_engine
+from app.core.logging import log_queue_stats
+
+
+def pool_stats(engine: Engine | AsyncEngine) -> Dict[str, Any]:
+	# connection counts of a queue pool; other pools (null, singleton) only report their class
+	pool = engine.pool
+	stats: Dict[str, Any] = {"pool": type(pool).__name__}
+	if not hasattr(pool, "checkedout"):
+		return stats
+	max_overflow = getattr(pool, "_max_overflow", 0)
+	stats.update({
+		"size": pool.size(),
+		"checked_out": pool.checkedout(),
+		"overflow": max(0, pool.overflow()),
+		"capacity": pool.size() + max_overflow if max_overflow >= 0 else None,
+	})
+	return stats
+
+
+async def database_latency_ms(db: AsyncSession) -> float:
+	# round trip of a trivial statement on the async session, connection checkout included
+	started = time.perf_counter()
+	await db.exec(text("SELECT 1"))
+	return round((time.perf_counter() - started) * 1000, 2)
+
+
+def _queues() -> Dict[str, Any]:
+	from app.services.image_placeholder_service import get_placeholder_service
+	from app.services.image_prefetch_service import get_prefetch_service
+	from app.services.llm_service import LLMService
+	from app.services.offer_enrichment_service import get_enrichment_service
+	scheduler = LLMService.scheduler_state()
+	return {
+		"llm": {"in_flight": scheduler["in_flight"], "queued": scheduler["queued"], "queue_depth": scheduler["queue_depth"]},
+		"image_prefetch": {"pending": get_prefetch_service().status()["pending"]},
+		"enrichment": {"state": get_enrichment_service().status()["state"]},
+		"placeholders": {"state": get_placeholder_service().status()["state"]},
+		"log": log_queue_stats(),
+	}
+
+
+def _caches() -> Dict[str, Any]:
+	from app.clients.images_client import UnsplashClient
+	from app.services.image_service import ImageService
+	from app.services.llm_service import LLMService
+	return {
+		"llm_responses": LLMService.cache_stats(),
+		"image_search": ImageService.search_cache_stats(),
+		"image_verify": UnsplashClient.verify_cache_stats(),
+	}
+
+
+def _usage(used: int, capacity: int | None) -> float:
+	return used / capacity if capacity else 0.0
+
+
+async def readiness(db: AsyncSession) -> Tuple[bool, Dict[str, Any]]:
+	# ready unless a threshold is crossed; an open llm breaker is reported but does not fail readiness,
+	# since answers then come from the cache or stub catalog and every worker shares the same upstream
+	from app.services.llm_service import LLMService
+	failing: List[str] = []
+	try:
+		latency = await database_latency_ms(db)
+		database: Dict[str, Any] = {"ok": True, "latency_ms": latency}
+		if latency > settings.HEALTH_DB_LATENCY_MAX_MS:
+			failing.append(f"database latency {latency} ms > {settings.HEALTH_DB_LATENCY_MAX_MS}")
+	except Exception as e:
+		database = {"ok": False, "error": type(e).__name__}
+		failing.append("database unreachable")
+
+	pools = {"sync": pool_stats(get_engine()), "async": pool_stats(get_async_engine())}
+	for name, stats in pools.items():
+		usage = _usage(stats.get("checked_out", 0), stats.get("capacity"))
+		if usage > settings.HEALTH_POOL_USAGE_MAX:
+			failing.append(f"{name} pool {stats['checked_out']}/{stats['capacity']} checked out")
+
+	queues = _queues()
+	if queues["llm"]["queued"] > settings.HEALTH_LLM_QUEUE_MAX:
+		failing.append(f"llm queue {queues['llm']['queued']} > {settings.HEALTH_LLM_QUEUE_MAX}")
+	if queues["image_prefetch"]["pending"] > settings.HEALTH_PREFETCH_PENDING_MAX:
+		failing.append(f"image prefetch queue {queues['image_prefetch']['pending']} > {settings.HEALTH_PREFETCH_PENDING_MAX}")
+	log = queues["log"]
+	if _usage(log["depth"], log["capacity"]) > settings.HEALTH_LOG_QUEUE_USAGE_MAX:
+		failing.append(f"log queue {log['depth']}/{log['capacity']}")
+
+	report = {
+		"status": "degraded" if failing else "ok",
+		"failing": failing,
+		"database": database,
+		"pools": pools,
+		"caches": _caches(),
+		"circuit_breaker": LLMService.breaker_state(),
+		"queues": queues,
+	}
+	return not failing, report
@@ -0,0 +1,169 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   llm_scheduler.py
+# Functionality :   process-wide fair-share admission control for llm calls
+
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional
+from app.core.config import settings
+from app.core.metrics import Histogram
+
+# lower value is served first; explore and suggest share the "suggest" operation
+PRIORITIES: Dict[str, int] = {
+	"suggest": 0,
+	"expand": 1,
+	"customize": 2,
+	"background": 3,
+}
+
+QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+
+class SchedulerRejectedError(RuntimeError):
+	# call refused because its queue wait would exceed the deadline
+	def __init__(self, message: str, reason: str):
+		super().__init__(message)
+		self.reason = reason
+
+
+class _Waiter:
+	__slots__ = ("session_id", "priority", "event", "granted")
+
+	def __init__(self, session_id: str, priority: int):
+		self.session_id = session_id
+		self.priority = priority
+		self.event = threading.Event()
+		self.granted = False
+
+
+class LLMScheduler:
+	# caps concurrent llm calls; excess callers queue per priority level, and within a level sessions
+	# are served round-robin so one busy session cannot starve the others. Callers whose predicted
+	# wait exceeds their deadline are rejected before queueing, the rest when the deadline passes.
+	# slot() blocks the calling thread while queued, so callers on the event loop go through a thread.
+	def __init__(self, max_in_flight: int = 8, max_wait: float = 10.0, initial_service_time: float = 2.0):
+		self.max_in_flight = max(1, max_in_flight)
+		self.max_wait = max_wait
+		self._lock = threading.Lock()
+		self._in_flight = 0
+		# priority -> session -> waiters, session order is the round-robin order
+		self._queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {}
+		self._queued = 0
+		self._service_time = initial_service_time
+		self._wait = Histogram(QUEUE_WAIT_BUCKETS)
+		self._admitted: Dict[str, int] = {}
+		self._rejected: Dict[str, int] = {}
+		self._peak_queued = 0
+
+	def configure(self, max_in_flight: Optional[int] = None, max_wait: Optional[float] = None) -> None:
+		with self._lock:
+			if max_in_flight is not None:
+				self.max_in_flight = max(1, max_in_flight)
+			if max_wait is not None:
+				self.max_wait = max_wait
+			self._grant_next()
+
+	def _queued_ahead(self, priority: int) -> int:
+		# caller holds the lock; waiters that would be served before a new arrival at this priority
+		return sum(len(w) for p, sessions in self._queues.items() if p <= priority for w in sessions.values())
+
+	def _grant_next(self) -> None:
+		# caller holds the lock; hands free slots to the next waiters in priority, then round-robin order
+		while self._in_flight < self.max_in_flight and self._queued:
+			priority = min(p for p, sessions in self._queues.items() if sessions)
+			sessions = self._queues[priority]
+			session_id, waiters = next(iter(sessions.items()))
+			waiter = waiters.popleft()
+			if waiters:
+				sessions.move_to_end(session_id)
+			else:
+				del sessions[session_id]
+			self._queued -= 1
+			self._in_flight += 1
+			waiter.granted = True
+			waiter.event.set()
+
+	def _remove(self, waiter: _Waiter) -> None:
+		# caller holds the lock
+		sessions = self._queues.get(waiter.priority, {})
+		waiters = sessions.get(waiter.session_id)
+		if waiters is not None and waiter in waiters:
+			waiters.remove(waiter)
+			self._queued -= 1
+			if not waiters:
+				del sessions[waiter.session_id]
+
+	def _reject(self, operation: str, reason: str, message: str) -> SchedulerRejectedError:
+		# caller holds the lock
+		key = f"{operation}:{reason}"
+		self._rejected[key] = self._rejected.get(key, 0) + 1
+		return SchedulerRejectedError(message, reason)
+
+	def _admit(self, operation: str, waited: float) -> None:
+		# caller holds the lock
+		self._admitted[operation] = self._admitted.get(operation, 0) + 1
+		self._wait.observe(waited)
+
+	@contextmanager
+	def slot(self, operation: str, session_id: Optional[str] = None, max_wait: Optional[float] = None) -> Iterator[float]:
+		# holds one in-flight slot for the duration of the block, yields the seconds spent queueing
+		priority = PRIORITIES.get(operation, PRIORITIES["background"])
+		session_id = session_id or "anon"
+		max_wait = self.max_wait if max_wait is None else max_wait
+		waiter: Optional[_Waiter] = None
+		started = time.monotonic()
+		with self._lock:
+			if self._in_flight < self.max_in_flight and not self._queued:
+				self._in_flight += 1
+				self._admit(operation, 0.0)
+			else:
+				predicted = (self._queued_ahead(priority) + 1) / self.max_in_flight * self._service_time
+				if predicted > max_wait:
+					raise self._reject(operation, "predicted", f"LLM queue wait of ~{predicted:.1f}s exceeds {max_wait:.1f}s")
+				waiter = _Waiter(session_id, priority)
+				self._queues.setdefault(priority, OrderedDict()).setdefault(session_id, deque()).append(waiter)
+				self._queued += 1
+				self._peak_queued = max(self._peak_queued, self._queued)
+
+		if waiter is not None:
+			waiter.event.wait(max(0.0, max_wait))
+			with self._lock:
+				if not waiter.granted:
+					self._remove(waiter)
+					raise self._reject(operation, "deadline", f"LLM call not admitted within {max_wait:.1f}s")
+				self._admit(operation, time.monotonic() - started)
+
+		admitted_at = time.monotonic()
+		waited = admitted_at - started
+		try:
+			yield waited
+		finally:
+			with self._lock:
+				# moving average of call duration drives the wait prediction
+				self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - admitted_at)
+				self._in_flight -= 1
+				self._grant_next()
+
+	def snapshot(self) -> Dict[str, Any]:
+		with self._lock:
+			depth = {}
+			for name, priority in PRIORITIES.items():
+				depth[name] = sum(len(w) for w in self._queues.get(priority, {}).values())
+			return {
+				"max_in_flight": self.max_in_flight,
+				"max_wait_seconds": self.max_wait,
+				"in_flight": self._in_flight,
+				"queued": self._queued,
+				"peak_queued": self._peak_queued,
+				"queue_depth": depth,
+				"sessions_waiting": sum(len(s) for s in self._queues.values()),
+				"avg_service_seconds": round(self._service_time, 6),
+				"admitted": dict(self._admitted),
+				"rejected": dict(self._rejected),
+				"queue_wait_seconds": self._wait.snapshot(),
+			}
+
+
+llm_scheduler = LLMScheduler(max_in_flight=settings.LLM_MAX_IN_FLIGHT, max_wait=settings.LLM_QUEUE_MAX_WAIT_SECONDS)
@@ -1,15 +1,134 @@
 # Author:             Patrik Kišeda ( xkised00 )
 # File:                   logging.py
-# Functionality :   logging configuration
+# Functionality :   logging configuration, json records written by a listener thread through a bounded queue
 
+import atexit
 import logging
+import queue
 import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, Tuple
+import orjson
+from app.core.config import settings
+from app.core.context import current_request_id
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+# attributes every LogRecord has; anything else on a record came from extra= and goes into the json
+_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "request_id"}
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional["QueueLogHandler"] = None
+
+
+class JsonFormatter(logging.Formatter):
+	# one json object per line: time, level, logger, message, request id, extra fields. The session id is
+	# never logged, the session cookie is the only credential a customer has
+	def format(self, record: logging.LogRecord) -> str:
+		entry: Dict[str, Any] = {
+			"ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+			"level": record.levelname,
+			"logger": record.name,
+			"message": record.getMessage(),
+		}
+		request_id = getattr(record, "request_id", None)
+		if request_id:
+			entry["request_id"] = request_id
+		for key, value in record.__dict__.items():
+			if key not in _RECORD_ATTRS:
+				entry[key] = value
+		if record.exc_info:
+			entry["exc"] = self.formatException(record.exc_info)
+		elif record.exc_text:
+			entry["exc"] = record.exc_text
+		return orjson.dumps(entry, default=str).decode()
+
+
+class QueueLogHandler(QueueHandler):
+	# runs on the logging thread: stamps the request context, renders the message and hands the record to
+	# the queue without waiting; a full queue drops the record and counts it. A traceback is rendered at
+	# most once per traceback_interval per call site, repeats only carry the exception type and message
+	def __init__(self, records: "queue.Queue", traceback_interval: float):
+		super().__init__(records)
+		self.traceback_interval = traceback_interval
+		self.dropped = 0
+		self._lock = threading.Lock()
+		self._tracebacks: Dict[Tuple[str, int, str], Tuple[float, int]] = {}
+
+	def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+		record = logging.makeLogRecord(record.__dict__)
+		record.request_id = current_request_id.get()
+		record.msg, record.args = record.getMessage(), None
+		if record.exc_info:
+			exc_type, exc, tb = record.exc_info
+			suppressed = self._suppressed(record, exc_type)
+			if suppressed is None:
+				record.exc_text = "".join(traceback.format_exception(exc_type, exc, tb)).rstrip()
+			else:
+				record.exc_text = None
+				record.exc_type = exc_type.__name__
+				record.exc_message = str(exc)
+				record.tracebacks_suppressed = suppressed
+			record.exc_info = None
+		record.stack_info = None
+		return record
+
+	def _suppressed(self, record: logging.LogRecord, exc_type: type) -> Optional[int]:
+		# None when this traceback is due, else how many were skipped at this site since the last one
+		key = (record.pathname, record.lineno, exc_type.__name__)
+		now = time.monotonic()
+		with self._lock:
+			last, skipped = self._tracebacks.get(key, (float("-inf"), 0))
+			if now - last >= self.traceback_interval:
+				self._tracebacks[key] = (now, 0)
+				return None
+			self._tracebacks[key] = (last, skipped + 1)
+			return skipped + 1
+
+	def enqueue(self, record: logging.LogRecord) -> None:
+		try:
+			self.queue.put_nowait(record)
+		except queue.Full:
+			with self._lock:
+				self.dropped += 1
 
 
 def setup_logging() -> None:
-	# configures application logging
-	logging.basicConfig(
-		level=logging.INFO,
-		format="%(asctime)s %(levelname)s %(name)s %(message)s",
-		stream=sys.stdout,
-	)
+	# configures application logging; handlers only enqueue, the listener thread formats and writes.
+	# uvicorn's loggers are pointed at the same queue instead of their own stream handlers
+	global _listener, _queue_handler
+	if _listener is not None:
+		return
+	output = logging.StreamHandler(sys.stdout)
+	output.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+	records: "queue.Queue" = queue.Queue(settings.LOG_QUEUE_SIZE)
+	_queue_handler = QueueLogHandler(records, settings.LOG_TRACEBACK_INTERVAL_SECONDS)
+	root = logging.getLogger()
+	root.handlers = [_queue_handler]
+	root.setLevel(settings.LOG_LEVEL)
+	for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+		logger = logging.getLogger(name)
+		logger.handlers = []
+		logger.propagate = True
+	# the app's access records carry the route template, request id and duration
+	logging.getLogger("uvicorn.access").disabled = settings.LOG_REQUESTS
+	_listener = QueueListener(records, output)
+	_listener.start()
+	atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+	# writes out what is still queued and stops the listener thread
+	global _listener
+	if _listener is not None:
+		_listener.stop()
+		_listener = None
+
+
+def log_queue_stats() -> Dict[str, int]:
+	if _queue_handler is None:
+		return {"depth": 0, "capacity": 0, "dropped": 0}
+	return {"depth": _queue_handler.queue.qsize(), "capacity": _queue_handler.queue.maxsize, "dropped": _queue_handler.dropped}
@@ -0,0 +1,327 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   metrics.py
+# Functionality :   in-process counters and latency histograms
+
+import logging
+import threading
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.core.config import settings
+from app.core.context import current_session_id
+
+LLM_LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+IMAGE_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0)
+REQUEST_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+DB_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+logger = logging.getLogger(__name__)
+
+
+def _empty_session_totals() -> Dict[str, Any]:
+	return {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_seconds": 0.0, "cache_hits": 0, "cache_misses": 0}
+
+
+class Histogram:
+	# fixed-bucket histogram, the last bucket is +Inf; not thread-safe on its own
+	def __init__(self, buckets: Sequence[float]):
+		self.buckets = tuple(sorted(buckets))
+		self.counts = [0] * (len(self.buckets) + 1)
+		self.sum = 0.0
+		self.count = 0
+		self.max = 0.0
+
+	def observe(self, value: float) -> None:
+		self.counts[bisect_left(self.buckets, value)] += 1
+		self.sum += value
+		self.count += 1
+		if value > self.max:
+			self.max = value
+
+	def quantile(self, q: float) -> Optional[float]:
+		# upper bound of the bucket holding the q-th observation, the largest value seen for the +Inf bucket
+		if not self.count:
+			return None
+		rank = q * self.count
+		seen = 0
+		for i, c in enumerate(self.counts):
+			seen += c
+			if seen >= rank:
+				return self.buckets[i] if i < len(self.buckets) else round(self.max, 6)
+		return round(self.max, 6)
+
+	def snapshot(self) -> Dict[str, Any]:
+		cumulative = []
+		seen = 0
+		for bound, c in zip(list(self.buckets) + ["+Inf"], self.counts):
+			seen += c
+			cumulative.append({"le": bound, "count": seen})
+		return {
+			"count": self.count,
+			"sum": round(self.sum, 6),
+			"avg": round(self.sum / self.count, 6) if self.count else None,
+			"max": round(self.max, 6),
+			"p50": self.quantile(0.5),
+			"p95": self.quantile(0.95),
+			"p99": self.quantile(0.99),
+			"buckets": cumulative,
+		}
+
+
+class LLMMetrics:
+	# aggregates every llm call by schema and model, plus bounded per-session totals
+	MAX_SESSIONS = 10000
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.reset()
+
+	def reset(self) -> None:
+		with self._lock:
+			self._calls: Dict[Tuple[str, str], Dict[str, Any]] = {}
+			self._cache: Dict[str, Dict[str, int]] = {}
+			self._fallbacks: Dict[str, Dict[str, int]] = {}
+			self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+	def record_call(
+		self,
+		schema: str,
+		model: str,
+		latency: float,
+		prompt_tokens: int = 0,
+		completion_tokens: int = 0,
+		error: Optional[str] = None,
+		session_id: Optional[str] = None,
+	) -> None:
+		# records one upstream call; error is the exception class name when the call failed
+		session_id = session_id or current_session_id.get() or "anon"
+		with self._lock:
+			stats = self._calls.get((schema, model))
+			if stats is None:
+				stats = {
+					"calls": 0,
+					"errors": {},
+					"prompt_tokens": 0,
+					"completion_tokens": 0,
+					"latency": Histogram(LLM_LATENCY_BUCKETS),
+				}
+				self._calls[(schema, model)] = stats
+			stats["calls"] += 1
+			stats["prompt_tokens"] += prompt_tokens
+			stats["completion_tokens"] += completion_tokens
+			stats["latency"].observe(latency)
+			if error:
+				stats["errors"][error] = stats["errors"].get(error, 0) + 1
+
+			totals = self._session_totals(session_id)
+			totals["calls"] += 1
+			totals["errors"] += 1 if error else 0
+			totals["prompt_tokens"] += prompt_tokens
+			totals["completion_tokens"] += completion_tokens
+			totals["latency_seconds"] += latency
+
+	def record_cache(self, operation: str, hit: bool, session_id: Optional[str] = None) -> None:
+		# records the cache outcome of an llm service call
+		session_id = session_id or current_session_id.get() or "anon"
+		with self._lock:
+			outcome = self._cache.setdefault(operation, {"hits": 0, "misses": 0})
+			outcome["hits" if hit else "misses"] += 1
+			totals = self._session_totals(session_id)
+			totals["cache_hits" if hit else "cache_misses"] += 1
+
+	def record_fallback(self, operation: str, source: str) -> None:
+		# records a degraded answer served instead of an upstream call
+		with self._lock:
+			sources = self._fallbacks.setdefault(operation, {})
+			sources[source] = sources.get(source, 0) + 1
+
+	def _session_totals(self, session_id: str) -> Dict[str, Any]:
+		# caller holds the lock; least recently active sessions are dropped past MAX_SESSIONS
+		totals = self._sessions.get(session_id)
+		if totals is None:
+			totals = _empty_session_totals()
+			self._sessions[session_id] = totals
+			while len(self._sessions) > self.MAX_SESSIONS:
+				self._sessions.popitem(last=False)
+		else:
+			self._sessions.move_to_end(session_id)
+		return totals
+
+	def session_totals(self, session_id: str) -> Dict[str, Any]:
+		with self._lock:
+			totals = self._sessions.get(session_id)
+			if totals is None:
+				return _empty_session_totals()
+			result = dict(totals)
+		result["latency_seconds"] = round(result["latency_seconds"], 6)
+		return result
+
+	def snapshot(self) -> Dict[str, Any]:
+		with self._lock:
+			calls = []
+			for (schema, model), stats in sorted(self._calls.items()):
+				calls.append({
+					"schema": schema,
+					"model": model,
+					"calls": stats["calls"],
+					"errors": dict(stats["errors"]),
+					"prompt_tokens": stats["prompt_tokens"],
+					"completion_tokens": stats["completion_tokens"],
+					"latency_seconds": stats["latency"].snapshot(),
+				})
+			return {
+				"calls": calls,
+				"cache": {op: dict(outcome) for op, outcome in self._cache.items()},
+				"fallbacks": {op: dict(sources) for op, sources in self._fallbacks.items()},
+				"sessions_tracked": len(self._sessions),
+			}
+
+
+class ImageProviderMetrics:
+	# per-provider lookup outcomes and latencies, plus race wins when several providers are queried at once;
+	# outcomes are "win", "lost" (valid but slower), "empty", "error" and "cancelled"
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.reset()
+
+	def reset(self) -> None:
+		with self._lock:
+			self._providers: Dict[str, Dict[str, Any]] = {}
+			self._races = 0
+			self._races_without_winner = 0
+
+	def record_lookup(self, provider: str, outcome: str, latency: float) -> None:
+		with self._lock:
+			stats = self._providers.get(provider)
+			if stats is None:
+				stats = {"outcomes": {}, "latency": Histogram(IMAGE_LATENCY_BUCKETS)}
+				self._providers[provider] = stats
+			stats["outcomes"][outcome] = stats["outcomes"].get(outcome, 0) + 1
+			if outcome != "cancelled":
+				stats["latency"].observe(latency)
+
+	def record_race(self, winner: Optional[str]) -> None:
+		with self._lock:
+			self._races += 1
+			if winner is None:
+				self._races_without_winner += 1
+
+	def snapshot(self) -> Dict[str, Any]:
+		with self._lock:
+			providers = {}
+			for name, stats in sorted(self._providers.items()):
+				wins = stats["outcomes"].get("win", 0)
+				providers[name] = {
+					"lookups": sum(stats["outcomes"].values()),
+					"outcomes": dict(stats["outcomes"]),
+					"win_rate": round(wins / self._races, 4) if self._races else None,
+					"latency_seconds": stats["latency"].snapshot(),
+				}
+			return {"races": self._races, "races_without_winner": self._races_without_winner, "providers": providers}
+
+
+class QueryStats:
+	# database statements of one request, filled by the cursor events in query_metrics; with shapes on,
+	# it also counts statements per normalized shape, which is how an n+1 loop shows up
+	__slots__ = ("queries", "seconds", "shapes")
+
+	def __init__(self, shapes: bool = False):
+		self.queries = 0
+		self.seconds = 0.0
+		self.shapes: Optional[Dict[str, int]] = {} if shapes else None
+
+	def record(self, elapsed: float, shape: Optional[str] = None) -> None:
+		self.queries += 1
+		self.seconds += elapsed
+		if shape is not None and self.shapes is not None:
+			self.shapes[shape] = self.shapes.get(shape, 0) + 1
+
+	def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+		# shapes run more than threshold times, most frequent first
+		if not self.shapes:
+			return []
+		return sorted(((s, n) for s, n in self.shapes.items() if n > threshold), key=lambda item: -item[1])
+
+
+class RequestMetrics:
+	# per route template: latency by status, database statements and time per request; plus requests in
+	# flight, process-wide database totals (background jobs included) and the most recent slow requests
+	MAX_SLOW = 50
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.reset()
+
+	def reset(self) -> None:
+		with self._lock:
+			self._latency: Dict[Tuple[str, str, int], Histogram] = {}
+			self._db: Dict[Tuple[str, str], Dict[str, Histogram]] = {}
+			self._in_flight = 0
+			self._db_queries = 0
+			self._db_seconds = 0.0
+			self._slow: "deque[Dict[str, Any]]" = deque(maxlen=self.MAX_SLOW)
+
+	def started(self) -> None:
+		with self._lock:
+			self._in_flight += 1
+
+	def finished(self, method: str, route: str, status: int, duration: float, stats: QueryStats, request_id: Optional[str]) -> None:
+		with self._lock:
+			self._in_flight -= 1
+			latency = self._latency.get((method, route, status))
+			if latency is None:
+				latency = self._latency[(method, route, status)] = Histogram(REQUEST_LATENCY_BUCKETS)
+			latency.observe(duration)
+			db = self._db.get((method, route))
+			if db is None:
+				db = self._db[(method, route)] = {"queries": Histogram(DB_QUERY_COUNT_BUCKETS), "seconds": Histogram(DB_TIME_BUCKETS)}
+			db["queries"].observe(stats.queries)
+			db["seconds"].observe(stats.seconds)
+			slow = duration >= settings.METRICS_SLOW_REQUEST_SECONDS
+			if slow:
+				self._slow.append({
+					"request_id": request_id,
+					"method": method,
+					"route": route,
+					"status": status,
+					"seconds": round(duration, 6),
+					"db_queries": stats.queries,
+					"db_seconds": round(stats.seconds, 6),
+				})
+		if slow:
+			logger.warning(
+				"slow request %s %s status=%s seconds=%.3f db_queries=%d db_seconds=%.3f request_id=%s",
+				method, route, status, duration, stats.queries, stats.seconds, request_id,
+			)
+
+	def record_query(self, elapsed: float) -> None:
+		with self._lock:
+			self._db_queries += 1
+			self._db_seconds += elapsed
+
+	def snapshot(self) -> Dict[str, Any]:
+		with self._lock:
+			routes = []
+			for (method, route, status), latency in sorted(self._latency.items()):
+				db = self._db[(method, route)]
+				routes.append({
+					"method": method,
+					"route": route,
+					"status": status,
+					"latency_seconds": latency.snapshot(),
+					"db_queries": db["queries"].snapshot(),
+					"db_seconds": db["seconds"].snapshot(),
+				})
+			return {
+				"in_flight": self._in_flight,
+				"db_queries_total": self._db_queries,
+				"db_seconds_total": round(self._db_seconds, 6),
+				"routes": routes,
+				"slow_requests": list(self._slow),
+			}
+
+
+llm_metrics = LLMMetrics()
+image_metrics = ImageProviderMetrics()
+request_metrics = RequestMetrics()
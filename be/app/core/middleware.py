@@ -2,72 +2,110 @@
 # File:                   middleware.py
 # Functionality :   custom middleware for session management and rate limiting
 
+import asyncio
 import time
 import uuid
-from typing import Callable
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from http.cookies import SimpleCookie
+from starlette.requests import cookie_parser
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from app.core.config import settings
+from app.core.context import current_session_id
+from app.core.rate_limit import RateLimitBackend, make_backend
 
+# both are plain asgi middleware: BaseHTTPMiddleware runs the app in a separate task and re-wraps
+# the response body stream on every request, which costs latency and buffers streamed responses
 
-class SessionCookieMiddleware(BaseHTTPMiddleware):
+
+def _request_cookie(scope: Scope, name: str) -> str | None:
+	for key, value in scope["headers"]:
+		if key == b"cookie":
+			return cookie_parser(value.decode("latin-1")).get(name)
+	return None
+
+
+class SessionCookieMiddleware:
 	# middleware for managing session cookies
 	COOKIE_NAME = "sessionId"
 
-	async def dispatch(self, request: Request, call_next: Callable):
-		response: Response
-		session_id = request.cookies.get(self.COOKIE_NAME)
-		if not session_id:
+	def __init__(self, app: ASGIApp):
+		self.app = app
+
+	@classmethod
+	def _set_cookie_header(cls, session_id: str) -> bytes:
+		# same attributes as Response.set_cookie(httponly=True, secure=False, samesite="lax")
+		cookie: SimpleCookie = SimpleCookie()
+		cookie[cls.COOKIE_NAME] = session_id
+		cookie[cls.COOKIE_NAME]["path"] = "/"
+		cookie[cls.COOKIE_NAME]["httponly"] = True
+		cookie[cls.COOKIE_NAME]["samesite"] = "lax"
+		return cookie.output(header="").strip().encode("latin-1")
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+		session_id = _request_cookie(scope, self.COOKIE_NAME)
+		is_new = not session_id
+		if is_new:
 			session_id = str(uuid.uuid4())
-			request.state.session_id = session_id
-			response = await call_next(request)
-			response.set_cookie(
-				key=self.COOKIE_NAME,
-				value=session_id,
-				httponly=True,
-				secure=False,
-				samesite="lax",
-			)
-			return response
-		request.state.session_id = session_id
-		response = await call_next(request)
-		return response
-
-
-class SimpleRateLimiter(BaseHTTPMiddleware):
-	# rate limiting middleware using token bucket algorithm
+		scope.setdefault("state", {})["session_id"] = session_id
+		current_session_id.set(session_id)
+		if not is_new:
+			await self.app(scope, receive, send)
+			return
+
+		cookie_header = self._set_cookie_header(session_id)
+
+		async def send_with_cookie(message: Message) -> None:
+			if message["type"] == "http.response.start":
+				message.setdefault("headers", []).append((b"set-cookie", cookie_header))
+			await send(message)
+
+		await self.app(scope, receive, send_with_cookie)
+
+
+class SimpleRateLimiter:
+	# rate limiting middleware using a sliding window counter per session and endpoint group;
+	# counters live in the RATE_LIMIT_BACKEND store, bounded in size and shareable between workers
 
 	WINDOW = 60
 
-	def __init__(self, app, limit_per_minute: int):
-		super().__init__(app)
+	def __init__(self, app: ASGIApp, limit_per_minute: int, backend: RateLimitBackend | None = None):
+		self.app = app
 		self.limit = max(1, limit_per_minute)
-		self.bucket: dict[str, list[float]] = {}
+		self.backend = backend or make_backend()
 
-	def _key(self, request: Request) -> str:
-		path = request.url.path
-		path_key = ""
+	@staticmethod
+	def _path_key(path: str) -> str | None:
+		# rate limit group for llm endpoints, None for everything else
 		if path.endswith("/suggest") or path.endswith("/explore"):
-			path_key = "rl:suggest"
-		elif path.endswith("/expand"):
-			path_key = "rl:expand"
-		elif path.endswith("/customize"):
-			path_key = "rl:customize"
-		sid = request.cookies.get("sessionId") or getattr(request.state, "session_id", None) or "anon"
+			return "rl:suggest"
+		if path.endswith("/expand"):
+			return "rl:expand"
+		if path.endswith("/customize"):
+			return "rl:customize"
+		return None
+
+	def _key(self, scope: Scope, path_key: str) -> str:
+		sid = _request_cookie(scope, "sessionId") or scope.get("state", {}).get("session_id") or "anon"
 		return f"{sid}:{path_key}"
 
-	async def dispatch(self, request: Request, call_next: Callable):
-		path = request.url.path
-		if not (path.endswith("/suggest") or path.endswith("/explore") or path.endswith("/expand") or path.endswith("/customize")):
-			return await call_next(request)
-		now = time.time()
-		key = self._key(request)
-		window_start = now - self.WINDOW
-		entries = [ts for ts in self.bucket.get(key, []) if ts > window_start]
+	async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+		path = scope["path"]
+		path_key = self._path_key(path)
+		if path_key is None:
+			await self.app(scope, receive, send)
+			return
 		limit = settings.RATE_LIMIT_EXPLORE_PER_MINUTE if path.endswith("/explore") else settings.RATE_LIMIT_PER_MINUTE
-		if len(entries) >= limit:
-			from fastapi.responses import JSONResponse
-			return JSONResponse(status_code=429, content={"data": None, "error": {"code": "RATE_LIMIT", "message": "Too many requests"}})
-		entries.append(now)
-		self.bucket[key] = entries
-		return await call_next(request)
+		args = (self._key(scope, path_key), limit, self.WINDOW, time.time())
+		allowed = await asyncio.to_thread(self.backend.hit, *args) if self.backend.blocking else self.backend.hit(*args)
+		if not allowed:
+			response = JSONResponse(status_code=429, content={"data": None, "error": {"code": "RATE_LIMIT", "message": "Too many requests"}})
+			await response(scope, receive, send)
+			return
+		await self.app(scope, receive, send)
+
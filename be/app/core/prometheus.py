@@ -0,0 +1,74 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   prometheus.py
+# Functionality :   prometheus text exposition of the in-process request, database and upstream metrics
+
+from typing import Any, Dict, List
+from app.core.metrics import image_metrics, llm_metrics, request_metrics
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+	if not labels:
+		return ""
+	escaped = (
+		f'{name}="' + str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') + '"'
+		for name, value in labels.items()
+	)
+	return "{" + ",".join(escaped) + "}"
+
+
+class _Family:
+	# one metric family: the HELP and TYPE header followed by its samples
+	def __init__(self, name: str, kind: str, help_text: str):
+		self.name = name
+		self.lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+	def sample(self, value: Any, suffix: str = "", **labels) -> None:
+		self.lines.append(f"{self.name}{suffix}{_labels(labels)} {value}")
+
+	def histogram(self, snapshot: Dict[str, Any], **labels) -> None:
+		# snapshot as returned by Histogram.snapshot(), whose buckets are already cumulative
+		for bucket in snapshot["buckets"]:
+			self.sample(bucket["count"], "_bucket", **labels, le=bucket["le"])
+		self.sample(snapshot["sum"], "_sum", **labels)
+		self.sample(snapshot["count"], "_count", **labels)
+
+
+def render() -> str:
+	requests = request_metrics.snapshot()
+	families: List[_Family] = []
+
+	in_flight = _Family("travelbot_http_requests_in_flight", "gauge", "Requests being handled by this worker.")
+	in_flight.sample(requests["in_flight"])
+	latency = _Family("travelbot_http_request_duration_seconds", "histogram", "Request latency by route template and status.")
+	db_queries = _Family("travelbot_http_request_db_queries", "histogram", "Database statements per request.")
+	db_seconds = _Family("travelbot_http_request_db_seconds", "histogram", "Database time per request.")
+	seen_routes = set()
+	for route in requests["routes"]:
+		latency.histogram(route["latency_seconds"], method=route["method"], route=route["route"], status=route["status"])
+		if (route["method"], route["route"]) not in seen_routes:
+			seen_routes.add((route["method"], route["route"]))
+			db_queries.histogram(route["db_queries"], method=route["method"], route=route["route"])
+			db_seconds.histogram(route["db_seconds"], method=route["method"], route=route["route"])
+	queries_total = _Family("travelbot_db_queries_total", "counter", "Database statements, background jobs included.")
+	queries_total.sample(requests["db_queries_total"])
+	db_total = _Family("travelbot_db_seconds_total", "counter", "Database time, background jobs included.")
+	db_total.sample(requests["db_seconds_total"])
+	families += [in_flight, latency, db_queries, db_seconds, queries_total, db_total]
+
+	upstream = _Family("travelbot_upstream_duration_seconds", "histogram", "Upstream call latency by service and operation.")
+	upstream_errors = _Family("travelbot_upstream_errors_total", "counter", "Failed upstream calls by error.")
+	for call in llm_metrics.snapshot()["calls"]:
+		labels = {"upstream": "openai", "operation": call["schema"], "model": call["model"]}
+		upstream.histogram(call["latency_seconds"], **labels)
+		for error, count in call["errors"].items():
+			upstream_errors.sample(count, **labels, error=error)
+	for provider, stats in image_metrics.snapshot()["providers"].items():
+		labels = {"upstream": "images", "operation": provider, "model": ""}
+		upstream.histogram(stats["latency_seconds"], **labels)
+		if stats["outcomes"].get("error"):
+			upstream_errors.sample(stats["outcomes"]["error"], **labels, error="error")
+	families += [upstream, upstream_errors]
+
+	return "\n".join(line for family in families for line in family.lines) + "\n"
@@ -0,0 +1,115 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   query_metrics.py
+# Functionality :   sqlalchemy cursor events counting statements and database time per request, n+1 detection
+
+import logging
+import re
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Iterator, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+from app.core.context import current_query_stats
+from app.core.metrics import QueryStats, request_metrics
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMETER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+# called with (request label, QueryStats) after every request while a query_budget is open
+_request_observers: List[Callable[[str, QueryStats], None]] = []
+
+
+@lru_cache(maxsize=1024)
+def statement_shape(statement: str) -> str:
+	# the statement with literals and parameter lists collapsed, so the same query with other ids or a
+	# longer IN list has one shape; sqlalchemy reuses statement strings, hence the cache
+	shape = _STRING.sub("?", statement)
+	shape = _NUMBER.sub("?", shape)
+	shape = _PARAMETER_LIST.sub("(?)", shape)
+	return _SPACE.sub(" ", shape).strip()
+
+
+def shapes_enabled() -> bool:
+	return settings.DB_QUERY_SHAPES_ENABLED or bool(_request_observers)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+	if context is not None:
+		context._travelbot_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+	started = getattr(context, "_travelbot_started", None)
+	if started is None:
+		return
+	elapsed = time.perf_counter() - started
+	request_metrics.record_query(elapsed)
+	# sync sessions in the threadpool and async sessions in sqlalchemy's greenlets both see the
+	# request's context, so statements land on the request that issued them
+	stats = current_query_stats.get()
+	if stats is not None:
+		stats.record(elapsed, statement_shape(statement) if stats.shapes is not None else None)
+
+
+def install_query_events() -> None:
+	# listens on the Engine class, which covers every engine, the sync side of async engines included
+	if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+		event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+		event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def report_repeated_queries(label: str, stats: QueryStats, request_id: Optional[str]) -> None:
+	# called by the request id middleware once a request is done
+	for shape, count in stats.repeated(settings.DB_QUERY_REPEAT_THRESHOLD):
+		logger.warning("repeated query %s ran %d times in %s request_id=%s", shape, count, label, request_id)
+	for observer in list(_request_observers):
+		observer(label, stats)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+	# counts the statements run in this context with their shapes, e.g. around a background job batch
+	stats = QueryStats(shapes=True)
+	token = current_query_stats.set(stats)
+	try:
+		yield stats
+	finally:
+		current_query_stats.reset(token)
+
+
+class QueryBudgetExceeded(AssertionError):
+	pass
+
+
+@contextmanager
+def query_budget(max_queries: int, max_repeats: Optional[int] = None) -> Iterator[List[Tuple[str, QueryStats]]]:
+	# test helper: every request finished inside the block, and the statements the block runs itself, must
+	# stay within max_queries and repeat no shape more than max_repeats times (DB_QUERY_REPEAT_THRESHOLD)
+	max_repeats = settings.DB_QUERY_REPEAT_THRESHOLD if max_repeats is None else max_repeats
+	recorded: List[Tuple[str, QueryStats]] = []
+
+	def observer(label: str, stats: QueryStats) -> None:
+		recorded.append((label, stats))
+
+	_request_observers.append(observer)
+	try:
+		with track_queries() as direct:
+			yield recorded
+	finally:
+		_request_observers.remove(observer)
+	if direct.queries:
+		recorded.insert(0, ("direct", direct))
+	problems = []
+	for label, stats in recorded:
+		if stats.queries > max_queries:
+			problems.append(f"{label} ran {stats.queries} statements, budget is {max_queries}")
+		for shape, count in stats.repeated(max_repeats):
+			problems.append(f"{label} ran {count} x {shape}")
+	if problems:
+		raise QueryBudgetExceeded("\n".join(problems))
@@ -0,0 +1,160 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   rate_limit.py
+# Functionality :   sliding window counter rate limit backends (per process memory or shared sqlite)
+
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _estimate(window_index: int, count: int, previous: int, stored_index: int, now: float, window: float) -> Tuple[int, int, float]:
+	# sliding window counter: the previous fixed window counts in proportion to how much of it still
+	# overlaps the last `window` seconds; returns (count, previous, estimate) rolled forward to window_index
+	if stored_index != window_index:
+		previous = count if stored_index == window_index - 1 else 0
+		count = 0
+	elapsed = now / window - window_index
+	return count, previous, previous * (1.0 - elapsed) + count
+
+
+class RateLimitBackend:
+	# counts allowed requests per key; hit() records one and returns False once the key is over its limit.
+	# blocking backends do i/o in hit(), so the middleware calls them from a worker thread
+	blocking = False
+
+	def hit(self, key: str, limit: int, window: float, now: float) -> bool:
+		raise NotImplementedError
+
+	def size(self) -> int:
+		raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+	# per-process counters in least recently used order; keys idle for two windows no longer affect any
+	# limit and are dropped, and past max_keys the least recently used key is dropped
+	def __init__(self, max_keys: Optional[int] = None):
+		self.max_keys = max(1, max_keys or settings.RATE_LIMIT_MAX_KEYS)
+		self._counters: "OrderedDict[str, Tuple[int, int, int]]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	def hit(self, key: str, limit: int, window: float, now: float) -> bool:
+		window_index = int(now // window)
+		with self._lock:
+			stored_index, count, previous = self._counters.get(key, (window_index, 0, 0))
+			count, previous, estimate = _estimate(window_index, count, previous, stored_index, now, window)
+			allowed = estimate < limit
+			if allowed:
+				count += 1
+			self._counters[key] = (window_index, count, previous)
+			self._counters.move_to_end(key)
+			self._evict(window_index)
+			return allowed
+
+	def _evict(self, window_index: int) -> None:
+		# the front of the dict is the least recently used key, each call drops at most what it finds stale
+		while self._counters:
+			stored_index = next(iter(self._counters.values()))[0]
+			if stored_index < window_index - 1 or len(self._counters) > self.max_keys:
+				self._counters.popitem(last=False)
+			else:
+				break
+
+	def size(self) -> int:
+		with self._lock:
+			return len(self._counters)
+
+
+class SqliteRateLimitBackend(RateLimitBackend):
+	# counters in a sqlite file, so every worker process on the host enforces the same limit; each hit is
+	# one short immediate transaction. Stale keys are purged once per window and the key cap is enforced every
+	# PURGE_EVERY new keys, so the table stays within max_keys plus PURGE_EVERY rows per worker. A hit that
+	# cannot get the write lock within RATE_LIMIT_DB_TIMEOUT_MS fails open: the request is let through
+	PURGE_EVERY = 256
+	blocking = True
+
+	def __init__(self, path: Optional[str] = None, max_keys: Optional[int] = None, timeout_ms: Optional[int] = None):
+		self.path = path or settings.RATE_LIMIT_DB_PATH
+		self.max_keys = max(1, max_keys or settings.RATE_LIMIT_MAX_KEYS)
+		directory = os.path.dirname(os.path.abspath(self.path))
+		os.makedirs(directory, exist_ok=True)
+		self._conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+		self._conn.execute("PRAGMA journal_mode=WAL")
+		self._conn.execute("PRAGMA synchronous=NORMAL")
+		self._conn.execute(
+			"CREATE TABLE IF NOT EXISTS rate_limit ("
+			"key TEXT PRIMARY KEY, window_index INTEGER NOT NULL, count INTEGER NOT NULL, "
+			"previous INTEGER NOT NULL, used_at REAL NOT NULL)"
+		)
+		self._conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_limit_used_at ON rate_limit (used_at)")
+		# workers starting together may wait on each other for the schema above; hits only wait this long
+		timeout_ms = settings.RATE_LIMIT_DB_TIMEOUT_MS if timeout_ms is None else timeout_ms
+		self._conn.execute(f"PRAGMA busy_timeout = {max(0, int(timeout_ms))}")
+		self._lock = threading.Lock()
+		self._purged_index: Optional[int] = None
+		self._new_keys = 0
+		self.failed_open = 0
+
+	def hit(self, key: str, limit: int, window: float, now: float) -> bool:
+		with self._lock:
+			try:
+				return self._hit(key, limit, window, now)
+			except sqlite3.OperationalError as e:
+				# locked past the busy timeout or unavailable; a missed count is cheaper than a stalled request
+				self.failed_open += 1
+				logger.warning("rate limit store unavailable, request let through: %s", e)
+				return True
+
+	def _hit(self, key: str, limit: int, window: float, now: float) -> bool:
+		window_index = int(now // window)
+		cur = self._conn.cursor()
+		cur.execute("BEGIN IMMEDIATE")
+		try:
+			row = cur.execute("SELECT window_index, count, previous FROM rate_limit WHERE key = ?", (key,)).fetchone()
+			stored_index, count, previous = row or (window_index, 0, 0)
+			count, previous, estimate = _estimate(window_index, count, previous, stored_index, now, window)
+			allowed = estimate < limit
+			if allowed:
+				count += 1
+			cur.execute(
+				"INSERT INTO rate_limit (key, window_index, count, previous, used_at) VALUES (?, ?, ?, ?, ?) "
+				"ON CONFLICT(key) DO UPDATE SET window_index = excluded.window_index, count = excluded.count, "
+				"previous = excluded.previous, used_at = excluded.used_at",
+				(key, window_index, count, previous, now),
+			)
+			if row is None:
+				self._new_keys += 1
+			if self._purged_index != window_index or self._new_keys >= self.PURGE_EVERY:
+				self._purge(cur, now, window)
+				self._purged_index = window_index
+				self._new_keys = 0
+			cur.execute("COMMIT")
+		except BaseException:
+			if self._conn.in_transaction:
+				cur.execute("ROLLBACK")
+			raise
+		return allowed
+
+	def _purge(self, cur: sqlite3.Cursor, now: float, window: float) -> None:
+		# keys idle for two windows no longer affect any limit; past the cap the least recently used go
+		cur.execute("DELETE FROM rate_limit WHERE used_at < ?", (now - 2 * window,))
+		cur.execute(
+			"DELETE FROM rate_limit WHERE key IN (SELECT key FROM rate_limit ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+			(self.max_keys,),
+		)
+
+	def size(self) -> int:
+		with self._lock:
+			return self._conn.execute("SELECT COUNT(*) FROM rate_limit").fetchone()[0]
+
+
+def make_backend() -> RateLimitBackend:
+	# RATE_LIMIT_BACKEND is "memory" (per worker) or "sqlite" (shared by all workers on the host)
+	if settings.RATE_LIMIT_BACKEND.lower() == "sqlite":
+		return SqliteRateLimitBackend()
+	return MemoryRateLimitBackend()
@@ -2,19 +2,65 @@
 # File:                   request_id.py
 # Functionality :   middleware for adding request id headers
 
+import logging
+import time
 import uuid
-from typing import Callable
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.core.context import current_query_stats, current_request_id
+from app.core.metrics import QueryStats, request_metrics
+from app.core.query_metrics import report_repeated_queries, shapes_enabled
 
+access_logger = logging.getLogger("app.access")
 
-class RequestIdMiddleware(BaseHTTPMiddleware):
-	# middleware for adding unique request ids to requests
+
+def route_template(scope: Scope) -> str:
+	# path template of the matched route ("/api/v1/agent/offers/{offer_id}"), so metric labels stay few
+	route = scope.get("route")
+	return getattr(route, "path", None) or "unmatched"
+
+
+class RequestIdMiddleware:
+	# plain asgi middleware adding unique request ids to requests and responses; it also records the
+	# request metrics and writes one access record per request, so a slow request is logged and listed
+	# together with its request id
 	HEADER_NAME = "X-Request-ID"
 
-	async def dispatch(self, request: Request, call_next: Callable):
-		req_id = request.headers.get(self.HEADER_NAME) or str(uuid.uuid4())
-		request.state.request_id = req_id
-		response = await call_next(request)
-		response.headers[self.HEADER_NAME] = req_id
-		return response
+	def __init__(self, app: ASGIApp):
+		self.app = app
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+		req_id = Headers(scope=scope).get(self.HEADER_NAME) or str(uuid.uuid4())
+		scope.setdefault("state", {})["request_id"] = req_id
+		current_request_id.set(req_id)
+		stats = QueryStats(shapes=shapes_enabled())
+		stats_token = current_query_stats.set(stats)
+		status = 500
+		started = time.perf_counter()
+		request_metrics.started()
+
+		async def send_with_request_id(message: Message) -> None:
+			nonlocal status
+			if message["type"] == "http.response.start":
+				status = message["status"]
+				MutableHeaders(scope=message)[self.HEADER_NAME] = req_id
+			await send(message)
+
+		try:
+			await self.app(scope, receive, send_with_request_id)
+		finally:
+			route = route_template(scope)
+			duration = time.perf_counter() - started
+			request_metrics.finished(scope["method"], route, status, duration, stats, req_id)
+			if settings.LOG_REQUESTS:
+				access_logger.info(
+					"%s %s %s", scope["method"], scope["path"], status,
+					extra={"method": scope["method"], "route": route, "status": status, "duration_ms": round(duration * 1000, 2), "db_queries": stats.queries},
+				)
+			if stats.shapes is not None:
+				report_repeated_queries(f"{scope['method']} {route}", stats, req_id)
+			current_query_stats.reset(stats_token)
@@ -0,0 +1,32 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   responses.py
+# Functionality :   orjson based json response used as the app default and by the response envelope
+
+from typing import Any
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+	# called by orjson only for types it cannot encode itself; models (sqlmodel rows included) are dumped
+	# in pydantic-core json mode like jsonable_encoder did, anything else goes through fastapi's encoder
+	if isinstance(obj, BaseModel):
+		return obj.model_dump(mode="json")
+	if isinstance(obj, (set, frozenset)):
+		return list(obj)
+	return jsonable_encoder(obj)
+
+
+def dumps(content: Any) -> bytes:
+	return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+class OrjsonResponse(JSONResponse):
+	# json response rendered by orjson; returned directly from endpoints it also skips fastapi's
+	# jsonable_encoder pass, because fastapi sends Response instances as they are
+	def render(self, content: Any) -> bytes:
+		return dumps(content)
@@ -0,0 +1,74 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   startup_lease.py
+# Functionality :   lets exactly one worker process of an instance run the startup background jobs
+
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+def _alive(pid: int) -> bool:
+	# signal 0 only checks that the process exists; off posix os.kill would terminate it instead, so there
+	# every process counts as gone and each one claims the lease
+	if os.name != "posix":
+		return False
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except PermissionError:
+		return True
+	return True
+
+
+def _process_token(pid: int) -> Optional[str]:
+	# boot id and start time of a process, None without /proc. A pid reused after a restart belongs to a
+	# process that started later, and a reboot changes the boot id, so the token tells the holder apart
+	try:
+		with open(f"/proc/{pid}/stat", encoding="utf-8") as f:
+			stat = f.read()
+		with open("/proc/sys/kernel/random/boot_id", encoding="utf-8") as f:
+			boot_id = f.read().strip()
+	except OSError:
+		return None
+	# the command name in parentheses may contain spaces; starttime is the 20th field after it
+	return f"{boot_id}:{stat.rsplit(')', 1)[1].split()[19]}"
+
+
+def _held(pid: int, token: Optional[str]) -> bool:
+	# whether the recorded holder is still running; with /proc the token has to match, not just the pid
+	current = _process_token(pid)
+	if current is not None or token is not None:
+		return current is not None and current == token
+	return _alive(pid)
+
+
+def claim_startup_jobs(engine: Engine, name: str = "startup_jobs", pid: Optional[int] = None) -> bool:
+	# True for the worker that should start the background jobs. The first worker to get here records its
+	# pid and process token; the others skip while that process runs, so a restart runs the jobs again. The
+	# immediate transaction makes workers starting together take turns, like the schema setup
+	pid = pid or os.getpid()
+	with engine.connect() as connection:
+		connection.exec_driver_sql("BEGIN IMMEDIATE")
+		connection.exec_driver_sql(
+			"CREATE TABLE IF NOT EXISTS startup_lease (name TEXT PRIMARY KEY, pid INTEGER NOT NULL, claimed_at TEXT NOT NULL)"
+		)
+		columns = {row[1] for row in connection.exec_driver_sql("PRAGMA table_info(startup_lease)")}
+		if "token" not in columns:
+			connection.exec_driver_sql("ALTER TABLE startup_lease ADD COLUMN token TEXT")
+		row = connection.exec_driver_sql("SELECT pid, token FROM startup_lease WHERE name = ?", (name,)).first()
+		if row is not None and row[0] != pid and _held(row[0], row[1]):
+			connection.rollback()
+			logger.info("startup jobs left to worker pid %s", row[0])
+			return False
+		connection.exec_driver_sql(
+			"INSERT INTO startup_lease (name, pid, token, claimed_at) VALUES (?, ?, ?, ?) "
+			"ON CONFLICT(name) DO UPDATE SET pid = excluded.pid, token = excluded.token, claimed_at = excluded.claimed_at",
+			(name, pid, _process_token(pid), datetime.now(timezone.utc).isoformat()),
+		)
+		connection.commit()
+	return True
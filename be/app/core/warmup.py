@@ -0,0 +1,85 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   warmup.py
+# Functionality :   startup warm-up, so the first requests after a deploy do not pay for imports and cold caches
+
+import importlib
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Union
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.config import settings
+from app.models.data_version import CATALOG_SCOPE, TAGS_SCOPE
+from app.repositories.agency_offer_repo import AgencyOfferRepository
+from app.repositories.data_version_repo import DataVersionRepository
+from app.repositories.tag_repo import TagRepository
+
+logger = logging.getLogger(__name__)
+
+# imported on first use by request handlers and jobs
+_LAZY_MODULES = (
+	"app.core.health",
+	"app.services.image_prefetch_service",
+	"app.services.image_placeholder_service",
+	"app.services.offer_enrichment_service",
+)
+
+
+def _import_modules() -> None:
+	for name in _LAZY_MODULES:
+		importlib.import_module(name)
+	if settings.OPENAI_API_KEY:
+		# the first live llm call imports openai and its lazily loaded resources, over a second on a cold start
+		import openai
+		client = openai.OpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0)
+		# the sdk imports resource modules on first attribute access, reading it is the warm-up
+		_ = client.beta.chat.completions
+		client.close()
+
+
+def _build_clients() -> None:
+	from app.clients import http_pool
+	http_pool.get_client()
+	http_pool.get_async_client()
+
+
+def _sync_queries(engine: Engine) -> None:
+	# the routes still on the sync session; fills sqlite's page cache and sqlalchemy's statement cache
+	with Session(engine) as db:
+		DataVersionRepository().get_many(db, [CATALOG_SCOPE, TAGS_SCOPE])
+		AgencyOfferRepository().list_filtered_rows(db)
+		TagRepository().list_all(db)
+
+
+async def _async_queries(async_engine: AsyncEngine) -> None:
+	# the hot list routes, on a connection of the pool they are served from
+	async with AsyncSession(async_engine, expire_on_commit=False) as db:
+		await DataVersionRepository().get_many_async(db, [CATALOG_SCOPE, TAGS_SCOPE])
+		await AgencyOfferRepository().list_filtered_rows_async(db)
+		await TagRepository().list_all_async(db)
+
+
+async def warm_up(engine: Engine, async_engine: AsyncEngine) -> Dict[str, float]:
+	# runs each step once and returns its duration in seconds; a failing step is logged and skipped,
+	# warm-up never keeps the worker from starting
+	steps: Dict[str, Callable[[], Union[None, Awaitable[None]]]] = {
+		"imports": _import_modules,
+		"clients": _build_clients,
+		"sync_queries": lambda: _sync_queries(engine),
+		"async_queries": lambda: _async_queries(async_engine),
+	}
+	timings: Dict[str, float] = {}
+	started = time.perf_counter()
+	for name, step in steps.items():
+		step_started = time.perf_counter()
+		try:
+			result = step()
+			if result is not None:
+				await result
+		except Exception:
+			logger.warning("warm-up step %s failed", name, exc_info=True)
+		timings[name] = round(time.perf_counter() - step_started, 4)
+	logger.info("warm-up finished in %.3f s", time.perf_counter() - started, extra={"warmup_seconds": timings})
+	return timings
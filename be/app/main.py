@@ -8,10 +8,13 @@ from sqlmodel import SQLModel, Session, text
 from app.api.v1.routes import router as api_v1_router
 from app.core.config import settings
 from app.core.logging import setup_logging
+from app.core.query_metrics import install_query_events
 from app.core.middleware import SessionCookieMiddleware, SimpleRateLimiter
 from app.core.request_id import RequestIdMiddleware
 from app.core.errors import add_exception_handlers
-from app.core.deps import get_engine, get_db
+from app.core.responses import OrjsonResponse
+from app.core.deps import get_async_db, get_engine, get_db
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 # Ensure models are imported so metadata is registered
 from app.models import session as _m_session  # noqa: F401
@@ -20,10 +23,13 @@ from app.models import customer_response as _m_customer_response  # noqa: F401
 from app.models import customer_order as _m_customer_order  # noqa: F401
 from app.models import customer_note as _m_customer_note  # noqa: F401
 from app.models import tag as _m_tag  # noqa: F401
+from app.models import image_cache as _m_image_cache  # noqa: F401
+from app.models import data_version as _m_data_version  # noqa: F401
 
 
 setup_logging()
-app = FastAPI(title="ITU Travel Backend")
+install_query_events()
+app = FastAPI(title="ITU Travel Backend", default_response_class=OrjsonResponse)
 
 # CORS
 app.add_middleware(
@@ -52,49 +58,91 @@ app.include_router(api_v1_router)
 async def on_startup():
 	# initializes database and runs migrations
 	engine = get_engine()
-	SQLModel.metadata.create_all(engine)
-	
-	# migrate customer_order table to add new columns if they don't exist
-	from sqlmodel import text
-	with Session(engine) as session:
-		try:
-			# check if table exists first
-			table_check = session.exec(text("SELECT name FROM sqlite_master WHERE type='table' AND name='customer_order'")).first()
-			if not table_check:
-				return
+	migrate(engine)
+
+	if settings.WARMUP_ON_STARTUP:
+		from app.core.deps import get_async_engine
+		from app.core.warmup import warm_up
+		await warm_up(engine, get_async_engine())
+
+	# background jobs start in one worker only, the others would repeat its work in parallel
+	if settings.ENRICHMENT_ON_STARTUP or settings.PLACEHOLDERS_ON_STARTUP:
+		from app.core.startup_lease import claim_startup_jobs
+		if not claim_startup_jobs(engine):
+			return
+
+	if settings.ENRICHMENT_ON_STARTUP:
+		from app.services.offer_enrichment_service import get_enrichment_service
+		get_enrichment_service().start()
+
+	if settings.PLACEHOLDERS_ON_STARTUP:
+		from app.services.image_placeholder_service import get_placeholder_service
+		get_placeholder_service(engine).request()
+
+
+def migrate(engine) -> None:
+	# creates tables and triggers and adds missing columns. Every worker process runs this on start, the
+	# immediate transaction makes them take turns (the others wait on busy_timeout), so no worker races
+	# another on CREATE TABLE / ALTER TABLE or sees a half migrated schema
+	with engine.connect() as connection:
+		connection.exec_driver_sql("BEGIN IMMEDIATE")
+		SQLModel.metadata.create_all(connection)
+
+		# add columns introduced after a table was first created, create_all does not alter existing tables
+		with Session(bind=connection) as session:
+			_add_missing_columns(session, "customer_order", {
+				"special_requirements": "TEXT",
+				"is_gift": "INTEGER DEFAULT 0",
+				"gift_recipient_email": "TEXT",
+				"gift_recipient_name": "TEXT",
+				"gift_sender_name": "TEXT",
+				"gift_note": "TEXT",
+				"gift_subject": "TEXT"
+			})
+			for table in ("agency_offer", "destination"):
+				_add_missing_columns(session, table, {"image_placeholder": "TEXT", "image_placeholder_url": "TEXT"})
+			_add_missing_columns(session, "image_cache", {"images": "TEXT"})
+		connection.commit()
+
+
+def _add_missing_columns(session: Session, table: str, required_columns: dict) -> None:
+	# adds any of the given columns the table does not have yet
+	try:
+		# check if table exists first
+		table_check = session.exec(text(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table}'")).first()
+		if not table_check:
+			return
+		# get existing columns from PRAGMA table_info
+		result = session.exec(text(f"PRAGMA table_info({table})"))
+		columns = set()
+		for row in result:
+			# PRAGMA table_info returns: cid, name, type, notnull, dflt_value, pk
+			# access by index since SQLModel returns Row objects
+			if hasattr(row, '__getitem__'):
+				col_name = row[1] if len(row) > 1 else str(row)
 			else:
-				# get existing columns from PRAGMA table_info
-				result = session.exec(text("PRAGMA table_info(customer_order)"))
-				columns = set()
-				for row in result:
-					# PRAGMA table_info returns: cid, name, type, notnull, dflt_value, pk
-					# access by index since SQLModel returns Row objects
-					if hasattr(row, '__getitem__'):
-						col_name = row[1] if len(row) > 1 else str(row)
-					else:
-						col_name = getattr(row, 'name', str(row))
-					columns.add(col_name)
-				
-				# add missing columns
-				required_columns = {
-					"special_requirements": "TEXT",
-					"is_gift": "INTEGER DEFAULT 0",
-					"gift_recipient_email": "TEXT",
-					"gift_recipient_name": "TEXT",
-					"gift_sender_name": "TEXT",
-					"gift_note": "TEXT",
-					"gift_subject": "TEXT"
-				}
-				
-				for col_name, col_type in required_columns.items():
-					if col_name not in columns:
-						try:
-							session.exec(text(f"ALTER TABLE customer_order ADD COLUMN {col_name} {col_type}"))
-							session.commit()
-						except Exception as e:
-							pass
-		except Exception as e:
-			pass
+				col_name = getattr(row, 'name', str(row))
+			columns.add(col_name)
+
+		# add missing columns
+		for col_name, col_type in required_columns.items():
+			if col_name not in columns:
+				try:
+					session.exec(text(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_type}"))
+					session.commit()
+				except Exception as e:
+					pass
+	except Exception as e:
+		pass
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+	# closes pooled upstream http connections and the async database connections
+	from app.clients import http_pool
+	from app.core.deps import get_async_engine
+	await http_pool.aclose()
+	await get_async_engine().dispose()
 
 
 @app.get("/health")
@@ -114,3 +162,20 @@ async def health(db: Session = Depends(get_db)):
 		},
 		"error": None
 	}
+
+
+@app.get("/health/live")
+async def liveness():
+	# the worker's event loop answers; no dependencies are checked, so a restart is only triggered by a hung worker
+	return OrjsonResponse({"data": {"status": "ok"}, "error": None})
+
+
+@app.get("/health/ready")
+async def readiness(db: AsyncSession = Depends(get_async_db)):
+	# 503 while a threshold in app.core.health is crossed, so the load balancer sends traffic elsewhere
+	from app.core.health import readiness as readiness_report
+	ready, report = await readiness_report(db)
+	if ready:
+		return OrjsonResponse({"data": report, "error": None})
+	error = {"code": "NOT_READY", "message": "; ".join(report["failing"])}
+	return OrjsonResponse({"data": report, "error": error}, status_code=503)
@@ -61,6 +61,11 @@ class AgencyOffer(SQLModel, table=True):
 	image_credit_author: Optional[str] = None
 	# image credit link
 	image_credit_link: Optional[str] = None
+	# tiny inline thumbnail shown while image_url loads, filled in by the placeholder job
+	image_placeholder: Optional[str] = None
+	# image_url the placeholder was computed for, differs from image_url after the image changed; internal
+	# bookkeeping of the placeholder job, left out of api responses
+	image_placeholder_url: Optional[str] = Field(default=None, exclude=True)
 	created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), nullable=False)
 	updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), nullable=False)
 
@@ -0,0 +1,53 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   data_version.py
+# Functionality :   change counters per data scope, bumped by sqlite triggers and used as etag validators
+
+from sqlalchemy import event, text
+from sqlmodel import SQLModel, Field
+
+CATALOG_SCOPE = "catalog"
+TAGS_SCOPE = "tags"
+
+
+def session_scope(session_id: str) -> str:
+	return f"session:{session_id}"
+
+
+class DataVersion(SQLModel, table=True):
+	# one row per scope, version grows on every write to a table in that scope
+	__tablename__ = "data_version"
+	scope: str = Field(primary_key=True)
+	version: int = Field(default=0, nullable=False)
+
+
+def _bump(scope_sql: str) -> str:
+	return (
+		f"INSERT INTO data_version (scope, version) VALUES ({scope_sql}, 1) "
+		"ON CONFLICT(scope) DO UPDATE SET version = version + 1;"
+	)
+
+
+# (table, scope expression); triggers cover every write path, including bulk updates and other workers
+_VERSIONED_TABLES = (
+	("agency_offer", f"'{CATALOG_SCOPE}'"),
+	("offer_tag", f"'{CATALOG_SCOPE}'"),
+	("tag", f"'{TAGS_SCOPE}'"),
+	("customer_response", "'session:' || {row}.customer_session_id"),
+	("customer_note", "'session:' || {row}.customer_session_id"),
+)
+
+
+def install_version_triggers(connection) -> None:
+	# creates the insert / update / delete triggers that are missing; safe to run on every start
+	for table, scope in _VERSIONED_TABLES:
+		for operation, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+			connection.execute(text(
+				f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{operation.lower()}_version AFTER {operation} ON {table} "
+				f"BEGIN {_bump(scope.format(row=row))} END"
+			))
+
+
+@event.listens_for(SQLModel.metadata, "after_create")
+def _after_create(target, connection, **kw) -> None:
+	# create_all runs this for new and existing databases alike
+	install_version_triggers(connection)
@@ -27,6 +27,8 @@ class Destination(SQLModel, table=True):
 	image_credit_source: Optional[str] = None
 	image_credit_author: Optional[str] = None
 	image_credit_link: Optional[str] = None
+	image_placeholder: Optional[str] = None  # inline thumbnail data uri, filled in by the placeholder job
+	image_placeholder_url: Optional[str] = Field(default=None, exclude=True)  # image_url the placeholder was computed for, internal
 	tags: Optional[str] = None
 	long_description: Optional[str] = None
 	highlights: Optional[str] = None  # JSON array string
@@ -0,0 +1,27 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   image_cache.py
+# Functionality :   database model for cached image lookups
+
+from datetime import datetime, timezone
+from typing import Optional
+from sqlmodel import SQLModel, Field
+
+
+class ImageCacheEntry(SQLModel, table=True):
+	# image provider answer for a normalized query; found=False caches queries without a usable result
+	__tablename__ = "image_cache"
+	# "<provider>:<normalized query>", multi-image searches use "search:<provider>:<n>:<normalized query>"
+	key: str = Field(primary_key=True)
+	provider: str = Field(nullable=False)
+	query: str = Field(nullable=False)
+	found: bool = Field(default=True)
+	url: Optional[str] = None
+	source: Optional[str] = None
+	author: Optional[str] = None
+	link: Optional[str] = None
+	# json list of images for a multi-image search entry, the single-image fields above stay empty
+	images: Optional[str] = None
+	# unix timestamps, sqlite drops timezones so datetimes would compare naive
+	expires_at: float = Field(index=True, nullable=False)
+	last_used_at: float = Field(index=True, nullable=False)
+	created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), nullable=False)
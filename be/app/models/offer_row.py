@@ -0,0 +1,16 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   offer_row.py
+# Functionality :   read-only slotted records for offer list queries
+
+from dataclasses import make_dataclass
+from app.models.agency_offer import AgencyOffer
+
+# one field per agency_offer column, in model order, so a record serializes to the same json object as
+# AgencyOffer.model_dump(); built from the table so new columns are picked up without touching this file,
+# minus the internal ones the model excludes from dumps, which the list queries then never select.
+# Records skip the orm identity map and pydantic validation, and orjson encodes slotted dataclasses natively
+OFFER_COLUMNS = tuple(c for c in AgencyOffer.__table__.columns if not AgencyOffer.model_fields[c.name].exclude)
+OfferRow = make_dataclass("OfferRow", [c.name for c in OFFER_COLUMNS], slots=True)
+
+# catalog row with the customer's response status and note, used by the customer status listing
+OfferStatusRow = make_dataclass("OfferStatusRow", [c.name for c in OFFER_COLUMNS] + ["status", "note"], slots=True)
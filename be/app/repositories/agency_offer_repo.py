@@ -1,8 +1,11 @@
 from datetime import date
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import update
 from sqlmodel import Session, select, and_, or_, func
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models.agency_offer import AgencyOffer
-from app.models.tag import OfferTag
+from app.models.offer_row import OFFER_COLUMNS, OfferRow
+from app.models.tag import OfferTag, Tag
 
 
 class AgencyOfferRepository:
@@ -19,6 +22,15 @@ class AgencyOfferRepository:
 		stmt = select(AgencyOffer).where(AgencyOffer.id == offer_id)
 		return db.exec(stmt).first()
 
+	def list_by_ids(self, db: Session, offer_ids: List[str]) -> Dict[str, AgencyOffer]:
+		# offers by id in one query, missing ids are left out
+		if not offer_ids:
+			return {}
+		return {o.id: o for o in db.exec(select(AgencyOffer).where(AgencyOffer.id.in_(offer_ids)))}
+
+	async def get_by_id_async(self, db: AsyncSession, offer_id: str) -> Optional[AgencyOffer]:
+		return await db.get(AgencyOffer, offer_id)
+
 	def update(self, db: Session, offer: AgencyOffer) -> AgencyOffer:
 		# updates an existing offer
 		from datetime import datetime, timezone
@@ -36,10 +48,9 @@ class AgencyOfferRepository:
 		db.delete(offer)
 		db.commit()
 
-	def list_filtered(
-		# lists offers with various filters applied
+	def _filter_conditions(
+		# where clauses for the offer list filters; price is filtered afterwards in python
 		self,
-		db: Session,
 		agent_session_id: Optional[str] = None,
 		origin: Optional[str] = None,
 		destination: Optional[str] = None,
@@ -49,11 +60,8 @@ class AgencyOfferRepository:
 		date_to: Optional[date] = None,
 		season: Optional[str] = None,
 		type_of_stay: Optional[List[str]] = None,
-		price_min: Optional[int] = None,
-		price_max: Optional[int] = None,
 		transport_mode: Optional[str] = None,
-		tag_ids: Optional[List[int]] = None,
-	) -> List[AgencyOffer]:
+	) -> list:
 		conditions = []
 		if agent_session_id:
 			conditions.append(AgencyOffer.agent_session_id == agent_session_id)
@@ -73,40 +81,213 @@ class AgencyOfferRepository:
 		if season:
 			conditions.append(AgencyOffer.season == season)
 		if type_of_stay:
-			import json
 			type_conditions = []
 			for stay_type in type_of_stay:
 				type_conditions.append(AgencyOffer.type_of_stay.ilike(f"%{stay_type}%"))
 			if type_conditions:
 				conditions.append(or_(*type_conditions))
-		if price_min is not None or price_max is not None:
-			# Calculate total price in Python after fetching (simpler for SQLite)
-			pass  # Will filter in Python
 		if transport_mode:
 			conditions.append(AgencyOffer.price_transport_mode == transport_mode)
+		return conditions
 
-		if conditions:
-			stmt = select(AgencyOffer).where(and_(*conditions))
-		else:
-			stmt = select(AgencyOffer)
+	@staticmethod
+	def _filter_price(offers: list, price_min: Optional[int], price_max: Optional[int]) -> list:
+		# Filter by total price (housing + food + transport) in Python
+		if price_min is None and price_max is None:
+			return offers
+		filtered = []
+		for offer in offers:
+			total_price = offer.price_housing + offer.price_food + (offer.price_transport_amount or 0)
+			if price_min is not None and total_price < price_min:
+				continue
+			if price_max is not None and total_price > price_max:
+				continue
+			filtered.append(offer)
+		return filtered
+
+	def list_filtered(
+		# lists offers with various filters applied
+		self,
+		db: Session,
+		agent_session_id: Optional[str] = None,
+		origin: Optional[str] = None,
+		destination: Optional[str] = None,
+		capacity_min: Optional[int] = None,
+		capacity_max: Optional[int] = None,
+		date_from: Optional[date] = None,
+		date_to: Optional[date] = None,
+		season: Optional[str] = None,
+		type_of_stay: Optional[List[str]] = None,
+		price_min: Optional[int] = None,
+		price_max: Optional[int] = None,
+		transport_mode: Optional[str] = None,
+		tag_ids: Optional[List[int]] = None,
+	) -> List[AgencyOffer]:
+		conditions = self._filter_conditions(
+			agent_session_id, origin, destination, capacity_min, capacity_max, date_from, date_to, season, type_of_stay, transport_mode
+		)
+		stmt = select(AgencyOffer).where(and_(*conditions)) if conditions else select(AgencyOffer)
 		
 		# Filter by tags if provided
 		if tag_ids:
 			stmt = stmt.join(OfferTag).where(OfferTag.tag_id.in_(tag_ids))
 		
-		results = list(db.exec(stmt))
-		
-		# Filter by total price (housing + food + transport) in Python
-		if price_min is not None or price_max is not None:
-			filtered = []
-			for offer in results:
-				total_price = offer.price_housing + offer.price_food + (offer.price_transport_amount or 0)
-				if price_min is not None and total_price < price_min:
-					continue
-				if price_max is not None and total_price > price_max:
+		return self._filter_price(list(db.exec(stmt)), price_min, price_max)
+
+	def list_filtered_rows(
+		# read-only variant of list_filtered for list endpoints: selects the columns as plain rows and
+		# wraps them in OfferRow records, without orm instances, identity map or validation
+		self,
+		db: Session,
+		agent_session_id: Optional[str] = None,
+		origin: Optional[str] = None,
+		destination: Optional[str] = None,
+		capacity_min: Optional[int] = None,
+		capacity_max: Optional[int] = None,
+		date_from: Optional[date] = None,
+		date_to: Optional[date] = None,
+		season: Optional[str] = None,
+		type_of_stay: Optional[List[str]] = None,
+		price_min: Optional[int] = None,
+		price_max: Optional[int] = None,
+		transport_mode: Optional[str] = None,
+	) -> List[OfferRow]:
+		stmt = self._rows_statement(
+			agent_session_id, origin, destination, capacity_min, capacity_max, date_from, date_to, season, type_of_stay, transport_mode
+		)
+		rows = [OfferRow(*row) for row in db.exec(stmt)]
+		return self._filter_price(rows, price_min, price_max)
+
+	async def list_filtered_rows_async(
+		# list_filtered_rows on an async session, same filters and records
+		self,
+		db: AsyncSession,
+		agent_session_id: Optional[str] = None,
+		origin: Optional[str] = None,
+		destination: Optional[str] = None,
+		capacity_min: Optional[int] = None,
+		capacity_max: Optional[int] = None,
+		date_from: Optional[date] = None,
+		date_to: Optional[date] = None,
+		season: Optional[str] = None,
+		type_of_stay: Optional[List[str]] = None,
+		price_min: Optional[int] = None,
+		price_max: Optional[int] = None,
+		transport_mode: Optional[str] = None,
+	) -> List[OfferRow]:
+		stmt = self._rows_statement(
+			agent_session_id, origin, destination, capacity_min, capacity_max, date_from, date_to, season, type_of_stay, transport_mode
+		)
+		rows = [OfferRow(*row) for row in await db.exec(stmt)]
+		return self._filter_price(rows, price_min, price_max)
+
+	def _rows_statement(self, *filters):
+		conditions = self._filter_conditions(*filters)
+		stmt = select(*OFFER_COLUMNS)
+		if conditions:
+			stmt = stmt.where(and_(*conditions))
+		return stmt
+
+	def _missing_details_condition(self, detail_tag_types: List[str]):
+		# offers without extended description or without any detail tag
+		tagged = select(OfferTag.offer_id).join(Tag, Tag.id == OfferTag.tag_id).where(Tag.type.in_(detail_tag_types))
+		return or_(
+			AgencyOffer.extended_description.is_(None),
+			AgencyOffer.extended_description == "",
+			AgencyOffer.id.not_in(tagged),
+		)
+
+	def count_missing_details(self, db: Session, detail_tag_types: List[str]) -> int:
+		# counts offers that still need detail content
+		stmt = select(func.count()).select_from(AgencyOffer).where(self._missing_details_condition(detail_tag_types))
+		return db.exec(stmt).one()
+
+	def list_missing_details(self, db: Session, detail_tag_types: List[str], after_id: Optional[str] = None, limit: int = 10) -> List[AgencyOffer]:
+		# lists offers missing detail content ordered by id so a run can page through them with a cursor
+		stmt = select(AgencyOffer).where(self._missing_details_condition(detail_tag_types))
+		if after_id:
+			stmt = stmt.where(AgencyOffer.id > after_id)
+		stmt = stmt.order_by(AgencyOffer.id).limit(limit)
+		return list(db.exec(stmt))
+
+	def apply_details_batch(self, db: Session, details: Dict[str, Dict[str, Any]]) -> int:
+		# fills empty detail fields for many offers in a single transaction
+		# details maps offer id to {"extended_description": str, "tags": [(tag_name, tag_type), ...]}
+		from datetime import datetime, timezone
+		now = datetime.now(timezone.utc)
+		# offers, their tag links and the named tags are loaded up front, not once per offer or tag
+		offer_ids = list(details)
+		offers = self.list_by_ids(db, offer_ids)
+		existing: Dict[str, set] = {}
+		for offer_id, tag_id in db.exec(select(OfferTag.offer_id, OfferTag.tag_id).where(OfferTag.offer_id.in_(offer_ids))):
+			existing.setdefault(offer_id, set()).add(tag_id)
+		tag_names = {name for payload in details.values() for name, _ in payload.get("tags", [])}
+		tag_cache: Dict[str, Tag] = {t.tag_name: t for t in db.exec(select(Tag).where(Tag.tag_name.in_(tag_names)))} if tag_names else {}
+		updated = 0
+		for offer_id, payload in details.items():
+			offer = offers.get(offer_id)
+			if not offer:
+				continue
+			if not offer.extended_description and payload.get("extended_description"):
+				offer.extended_description = payload["extended_description"]
+			existing_tag_ids = existing.get(offer_id, set())
+			for tag_name, tag_type in payload.get("tags", []):
+				tag = tag_cache.get(tag_name)
+				if not tag:
+					tag = Tag(tag_name=tag_name, type=tag_type, quantity=0)
+					db.add(tag)
+					db.flush()
+				tag_cache[tag_name] = tag
+				if tag.id in existing_tag_ids:
 					continue
-				filtered.append(offer)
-			return filtered
-		
-		return results
+				db.add(OfferTag(offer_id=offer_id, tag_id=tag.id))
+				existing_tag_ids.add(tag.id)
+				tag.quantity += 1
+				tag.updated_at = now
+				db.add(tag)
+			offer.updated_at = now
+			db.add(offer)
+			updated += 1
+		db.commit()
+		return updated
+
+	def list_missing_placeholders(self, db: Session, after_id: Optional[str], limit: int) -> List[Tuple[str, str]]:
+		# (id, image_url) of rows whose placeholder is missing or was computed for a different image, ordered by id
+		stmt = select(AgencyOffer.id, AgencyOffer.image_url).where(
+			AgencyOffer.image_url.is_not(None),
+			AgencyOffer.image_url != "",
+			or_(AgencyOffer.image_placeholder_url.is_(None), AgencyOffer.image_placeholder_url != AgencyOffer.image_url),
+		)
+		if after_id is not None:
+			stmt = stmt.where(AgencyOffer.id > after_id)
+		return [(row[0], row[1]) for row in db.exec(stmt.order_by(AgencyOffer.id).limit(limit))]
 
+	def apply_placeholders(self, db: Session, placeholders: Dict[str, Tuple[str, Optional[str]]]) -> int:
+		# stores {id: (image_url, placeholder)} in one commit; rows whose image changed meanwhile are left alone
+		updated = 0
+		for row_id, (url, placeholder) in placeholders.items():
+			result = db.execute(
+				update(AgencyOffer)
+				.where(AgencyOffer.id == row_id, AgencyOffer.image_url == url)
+				.values(image_placeholder=placeholder, image_placeholder_url=url)
+			)
+			updated += result.rowcount
+		db.commit()
+		return updated
+
+	def apply_image(self, db: Session, offer_id: str, image: Dict[str, Optional[str]]) -> bool:
+		# sets the image and its credit on an offer that still has none; an image the agent set meanwhile wins
+		from datetime import datetime, timezone
+		result = db.execute(
+			update(AgencyOffer)
+			.where(AgencyOffer.id == offer_id, or_(AgencyOffer.image_url.is_(None), AgencyOffer.image_url == ""))
+			.values(
+				image_url=image.get("url"),
+				image_credit_source=image.get("source"),
+				image_credit_author=image.get("author"),
+				image_credit_link=image.get("link"),
+				updated_at=datetime.now(timezone.utc),
+			)
+		)
+		db.commit()
+		return result.rowcount > 0
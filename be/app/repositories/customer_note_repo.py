@@ -2,9 +2,10 @@
 # File:                   customer_note_repo.py
 # Functionality :   data access layer for customer notes
 
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime, timezone
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models.customer_note import CustomerNote
 
 
@@ -33,6 +34,16 @@ class CustomerNoteRepository:
 		)
 		return db.exec(stmt).first()
 
+	def texts_by_offer(self, db: Session, customer_session_id: str) -> Dict[str, str]:
+		# note text per offer id for a customer, one query for a whole listing
+		return {offer_id: text for offer_id, text in db.exec(self._texts(customer_session_id))}
+
+	async def texts_by_offer_async(self, db: AsyncSession, customer_session_id: str) -> Dict[str, str]:
+		return {offer_id: text for offer_id, text in await db.exec(self._texts(customer_session_id))}
+
+	def _texts(self, customer_session_id: str):
+		return select(CustomerNote.offer_id, CustomerNote.note_text).where(CustomerNote.customer_session_id == customer_session_id)
+
 	def delete(self, db: Session, customer_session_id: str, offer_id: str) -> None:
 		note = self.get_by_offer(db, customer_session_id, offer_id)
 		if not note:
@@ -5,6 +5,7 @@
 from typing import List, Optional, Tuple
 from datetime import datetime, timezone
 from sqlmodel import Session, select, func, and_
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models.customer_order import CustomerOrder, OrderStatus
 from app.models.agency_offer import AgencyOffer
 
@@ -54,11 +55,16 @@ class CustomerOrderRepository:
 
 	def list_for_customer(self, db: Session, customer_session_id: str, status: Optional[str] = None) -> List[CustomerOrder]:
 		# lists orders for a customer optionally filtered by status
+		return list(db.exec(self._for_customer(customer_session_id, status)))
+
+	async def list_for_customer_async(self, db: AsyncSession, customer_session_id: str, status: Optional[str] = None) -> List[CustomerOrder]:
+		return list(await db.exec(self._for_customer(customer_session_id, status)))
+
+	def _for_customer(self, customer_session_id: str, status: Optional[str]):
 		conditions = [CustomerOrder.customer_session_id == customer_session_id]
 		if status:
 			conditions.append(CustomerOrder.order_status == status)
-		stmt = select(CustomerOrder).where(and_(*conditions))
-		return list(db.exec(stmt))
+		return select(CustomerOrder).where(and_(*conditions))
 
 	def get_confirmed_orders_for_offer(self, db: Session, offer_id: str) -> List[CustomerOrder]:
 		stmt = select(CustomerOrder).where(
@@ -2,8 +2,9 @@
 # File:                   customer_response_repo.py
 # Functionality :   data access layer for customer responses
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models.customer_response import CustomerResponse, ResponseStatus
 
 
@@ -23,13 +24,26 @@ class CustomerResponseRepository:
 		db.refresh(response)
 		return response
 
-	def get_by_offer(self, db: Session, customer_session_id: str, offer_id: str) -> Optional[CustomerResponse]:
-		# gets response for a specific offer
-		stmt = select(CustomerResponse).where(
+	async def create_or_update_async(self, db: AsyncSession, response: CustomerResponse) -> CustomerResponse:
+		# create_or_update on an async session
+		existing = (await db.exec(self._by_offer(response.customer_session_id, response.offer_id))).first()
+		if existing:
+			existing.response_status = response.response_status
+			response = existing
+		db.add(response)
+		await db.commit()
+		await db.refresh(response)
+		return response
+
+	def _by_offer(self, customer_session_id: str, offer_id: str):
+		return select(CustomerResponse).where(
 			CustomerResponse.customer_session_id == customer_session_id,
 			CustomerResponse.offer_id == offer_id
 		)
-		return db.exec(stmt).first()
+
+	def get_by_offer(self, db: Session, customer_session_id: str, offer_id: str) -> Optional[CustomerResponse]:
+		# gets response for a specific offer
+		return db.exec(self._by_offer(customer_session_id, offer_id)).first()
 
 	def list_accepted(self, db: Session, customer_session_id: str) -> List[CustomerResponse]:
 		# lists all accepted responses
@@ -59,6 +73,13 @@ class CustomerResponseRepository:
 		)
 		return list(db.exec(stmt))
 
+	async def statuses_by_offer_async(self, db: AsyncSession, customer_session_id: str) -> Dict[str, str]:
+		# response status per offer id for a customer, one query for a whole listing
+		stmt = select(CustomerResponse.offer_id, CustomerResponse.response_status).where(
+			CustomerResponse.customer_session_id == customer_session_id
+		)
+		return {offer_id: status for offer_id, status in await db.exec(stmt)}
+
 	def get_by_status(self, db: Session, customer_session_id: str, status: str) -> List[CustomerResponse]:
 		stmt = select(CustomerResponse).where(
 			CustomerResponse.customer_session_id == customer_session_id,
@@ -0,0 +1,23 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   data_version_repo.py
+# Functionality :   data access for data scope change counters
+
+from typing import Dict, List
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.data_version import DataVersion
+
+
+class DataVersionRepository:
+	# reads the counters the version triggers maintain
+	def get_many(self, db: Session, scopes: List[str]) -> Dict[str, int]:
+		# version per scope, 0 for scopes never written
+		found = dict(db.exec(self._versions(scopes)).all())
+		return {scope: found.get(scope, 0) for scope in scopes}
+
+	async def get_many_async(self, db: AsyncSession, scopes: List[str]) -> Dict[str, int]:
+		found = dict((await db.exec(self._versions(scopes))).all())
+		return {scope: found.get(scope, 0) for scope in scopes}
+
+	def _versions(self, scopes: List[str]):
+		return select(DataVersion.scope, DataVersion.version).where(DataVersion.scope.in_(scopes))
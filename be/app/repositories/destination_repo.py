@@ -2,8 +2,9 @@
 # File:                   destination_repo.py
 # Functionality :   data access layer for legacy destination system
 
-from typing import List, Optional
-from sqlmodel import Session, select
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import update
+from sqlmodel import Session, select, or_
 from app.models.destination import Destination
 
 
@@ -65,3 +66,27 @@ class DestinationRepository:
 		db.commit()
 		db.refresh(d)
 		return d
+
+	def list_missing_placeholders(self, db: Session, after_id: Optional[str], limit: int) -> List[Tuple[str, str]]:
+		# (id, image_url) of rows whose placeholder is missing or was computed for a different image, ordered by id
+		stmt = select(Destination.id, Destination.image_url).where(
+			Destination.image_url.is_not(None),
+			Destination.image_url != "",
+			or_(Destination.image_placeholder_url.is_(None), Destination.image_placeholder_url != Destination.image_url),
+		)
+		if after_id is not None:
+			stmt = stmt.where(Destination.id > after_id)
+		return [(row[0], row[1]) for row in db.exec(stmt.order_by(Destination.id).limit(limit))]
+
+	def apply_placeholders(self, db: Session, placeholders: Dict[str, Tuple[str, Optional[str]]]) -> int:
+		# stores {id: (image_url, placeholder)} in one commit; rows whose image changed meanwhile are left alone
+		updated = 0
+		for row_id, (url, placeholder) in placeholders.items():
+			result = db.execute(
+				update(Destination)
+				.where(Destination.id == row_id, Destination.image_url == url)
+				.values(image_placeholder=placeholder, image_placeholder_url=url)
+			)
+			updated += result.rowcount
+		db.commit()
+		return updated
@@ -0,0 +1,42 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   image_cache_repo.py
+# Functionality :   data access layer for the persistent image lookup cache
+
+from typing import Dict, List
+from sqlalchemy import delete, update
+from sqlmodel import Session, select, func
+from app.models.image_cache import ImageCacheEntry
+
+# hits refresh last_used_at at most this often, so reads rarely write
+TOUCH_INTERVAL_SECONDS = 300
+
+
+class ImageCacheRepository:
+	# handles database operations for cached image lookups
+	def get_many(self, db: Session, keys: List[str], now: float) -> Dict[str, ImageCacheEntry]:
+		# returns unexpired entries by key
+		if not keys:
+			return {}
+		stmt = select(ImageCacheEntry).where(ImageCacheEntry.key.in_(keys), ImageCacheEntry.expires_at > now)
+		return {e.key: e for e in db.exec(stmt)}
+
+	def touch(self, db: Session, entries: List[ImageCacheEntry], now: float) -> None:
+		# marks hit entries as recently used; entries touched within TOUCH_INTERVAL_SECONDS are skipped so reads rarely write
+		keys = [e.key for e in entries if e.last_used_at < now - TOUCH_INTERVAL_SECONDS]
+		if keys:
+			db.execute(update(ImageCacheEntry).where(ImageCacheEntry.key.in_(keys)).values(last_used_at=now))
+			db.commit()
+
+	def put_many(self, db: Session, entries: List[ImageCacheEntry], max_entries: int, now: float) -> None:
+		# upserts entries in one commit, then drops expired rows and the least recently used past max_entries
+		if not entries:
+			return
+		for e in entries:
+			db.merge(e)
+		db.commit()
+		db.execute(delete(ImageCacheEntry).where(ImageCacheEntry.expires_at <= now))
+		count = db.exec(select(func.count()).select_from(ImageCacheEntry)).one()
+		if count > max_entries:
+			oldest = select(ImageCacheEntry.key).order_by(ImageCacheEntry.last_used_at).limit(count - max_entries)
+			db.execute(delete(ImageCacheEntry).where(ImageCacheEntry.key.in_(oldest)))
+		db.commit()
@@ -19,17 +19,21 @@ class ListRepository:
 
 	def all_with_stats(self, db: Session, session_id: str) -> List[Tuple[ListModel, dict]]:
 		lists = list(db.exec(select(ListModel).where(ListModel.session_id == session_id)))
+		if not lists:
+			return []
+		# count and price sum of existing destinations per list, for all lists in one grouped query
+		stmt = (
+			select(ListItem.list_id, func.count(Destination.id), func.sum(Destination.approx_price_eur))
+			.join(Destination, Destination.id == ListItem.destination_id)
+			.where(ListItem.list_id.in_([lst.id for lst in lists]))
+			.group_by(ListItem.list_id)
+		)
+		totals = {list_id: (count, total) for list_id, count, total in db.exec(stmt)}
 		result = []
 		for lst in lists:
-			items = list(db.exec(select(ListItem).where(ListItem.list_id == lst.id)))
-			member_ids = [it.destination_id for it in items]
-			if member_ids:
-				dests = list(db.exec(select(Destination).where(Destination.id.in_(member_ids))))
-				count = len(dests)
-				avg = int(sum(d.approx_price_eur for d in dests) / count) if count else 0
-				result.append((lst, {"count": count, "avgApproxPriceEUR": avg}))
-			else:
-				result.append((lst, {"count": 0, "avgApproxPriceEUR": 0}))
+			count, total = totals.get(lst.id, (0, 0))
+			avg = int(total / count) if count else 0
+			result.append((lst, {"count": count, "avgApproxPriceEUR": avg}))
 		return result
 
 	def get_with_members(self, db: Session, list_id: str) -> Tuple[Optional[ListModel], List[str], dict]:
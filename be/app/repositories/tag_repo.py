@@ -4,6 +4,7 @@
 
 from typing import List, Optional
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models.tag import Tag, OfferTag
 from datetime import datetime, timezone
 
@@ -26,6 +27,12 @@ class TagRepository:
 
     def list_all(self, db: Session, tag_type: Optional[str] = None, order_by_popularity: bool = True) -> List[Tag]:
 		# lists all tags optionally filtered by type and sorted by popularity
+        return list(db.exec(self._list_statement(tag_type, order_by_popularity)))
+
+    async def list_all_async(self, db: AsyncSession, tag_type: Optional[str] = None, order_by_popularity: bool = True) -> List[Tag]:
+        return list(await db.exec(self._list_statement(tag_type, order_by_popularity)))
+
+    def _list_statement(self, tag_type: Optional[str], order_by_popularity: bool):
         stmt = select(Tag)
         if tag_type:
             stmt = stmt.where(Tag.type == tag_type)
@@ -33,7 +40,7 @@ class TagRepository:
             stmt = stmt.order_by(Tag.quantity.desc(), Tag.tag_name)
         else:
             stmt = stmt.order_by(Tag.tag_name)
-        return list(db.exec(stmt))
+        return stmt
 
     def update(self, db: Session, tag: Tag) -> Tag:
         tag.updated_at = datetime.now(timezone.utc)
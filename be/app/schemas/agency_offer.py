@@ -35,6 +35,7 @@ class AgencyOfferDTO(BaseModel):
 	image_credit_source: Optional[str] = None
 	image_credit_author: Optional[str] = None
 	image_credit_link: Optional[str] = None
+	image_placeholder: Optional[str] = None
 	tags: Optional[str] = None
 	created_at: str
 	updated_at: str
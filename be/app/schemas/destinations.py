@@ -24,6 +24,7 @@ class DestinationDTO(BaseModel):
 	image_credit_source: Optional[str] = None
 	image_credit_author: Optional[str] = None
 	image_credit_link: Optional[str] = None
+	image_placeholder: Optional[str] = None
 	tags: Optional[str] = None
 	long_description: Optional[str] = None
 	highlights: Optional[str] = None
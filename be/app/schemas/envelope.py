@@ -4,6 +4,7 @@
 
 from pydantic import BaseModel
 from typing import Generic, Optional, TypeVar
+from app.core.responses import OrjsonResponse
 
 T = TypeVar("T")
 
@@ -19,10 +20,13 @@ class ResponseEnvelope(BaseModel, Generic[T]):
 	data: Optional[T]
 	error: Optional[ErrorEnvelope] = None
 
+	# ok() and err() return the response itself, so rows and models in the payload are encoded once
+	# by orjson instead of being walked by jsonable_encoder first
+
 	@staticmethod
-	def ok(payload):
-		return {"data": payload, "error": None}
+	def ok(payload) -> OrjsonResponse:
+		return OrjsonResponse({"data": payload, "error": None})
 
 	@staticmethod
-	def err(code: str, message: str):
-		return {"data": None, "error": {"code": code, "message": message}}
+	def err(code: str, message: str) -> OrjsonResponse:
+		return OrjsonResponse({"data": None, "error": {"code": code, "message": message}})
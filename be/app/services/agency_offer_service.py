@@ -7,9 +7,13 @@ import uuid
 from datetime import date, datetime
 from typing import List, Optional, Dict, Any
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.repositories.agency_offer_repo import AgencyOfferRepository
 from app.models.agency_offer import AgencyOffer
+from app.models.offer_row import OfferRow
 from app.core.validation import validate_offer_data, ValidationError
+from app.services.image_placeholder_service import get_placeholder_service
+from app.services.image_prefetch_service import get_prefetch_service
 
 
 class AgencyOfferService:
@@ -33,8 +37,8 @@ class AgencyOfferService:
 		price_min: Optional[int] = None,
 		price_max: Optional[int] = None,
 		transport_mode: Optional[str] = None,
-	) -> List[AgencyOffer]:
-		return self.repo.list_filtered(
+	) -> List[OfferRow]:
+		return self.repo.list_filtered_rows(
 			db,
 			agent_session_id,
 			origin=origin,
@@ -50,6 +54,10 @@ class AgencyOfferService:
 			transport_mode=transport_mode,
 		)
 
+	async def list_filtered_async(self, db: AsyncSession, agent_session_id: str, **filters) -> List[OfferRow]:
+		# list_filtered on an async session, takes the same keyword filters
+		return await self.repo.list_filtered_rows_async(db, agent_session_id, **filters)
+
 	def create(self, db: Session, agent_session_id: str, data: Dict[str, Any]) -> AgencyOffer:
 		# creates a new offer with validation
 		validate_offer_data(data)
@@ -89,7 +97,23 @@ class AgencyOfferService:
 			image_credit_link=data.get("image_credit_link"),
 			tags=tags_str,
 		)
-		return self.repo.create(db, offer)
+		offer = self.repo.create(db, offer)
+		if offer.image_url:
+			get_placeholder_service(db.get_bind()).request()
+		else:
+			# the image is looked up after the response, see image_status()
+			get_prefetch_service(db.get_bind()).queue(offer.id, f"{offer.destination_name} {offer.country}")
+		return offer
+
+	def image_status(self, db: Session, offer: AgencyOffer) -> str:
+		# "ready" once the offer has an image, "pending" while a background lookup is queued, else "none".
+		# A lookup leaves the queue only after writing its image, so a finished one is picked up by reloading
+		if offer.image_url:
+			return "ready"
+		if get_prefetch_service(db.get_bind()).is_pending(offer.id):
+			return "pending"
+		db.refresh(offer)
+		return "ready" if offer.image_url else "none"
 
 	def update(self, db: Session, agent_session_id: str, offer_id: str, data: Dict[str, Any]) -> Optional[AgencyOffer]:
 		# updates an existing offer
@@ -147,6 +171,7 @@ class AgencyOfferService:
 			offer.things_to_consider = json.dumps(data["things_to_consider"]) if data.get("things_to_consider") else None
 		if "tags" in data:
 			offer.tags = json.dumps(data["tags"]) if data.get("tags") else None
+		image_changed = "image_url" in data and data.get("image_url") != offer.image_url
 		if "image_url" in data:
 			offer.image_url = data.get("image_url")
 		if "image_credit_source" in data:
@@ -156,7 +181,10 @@ class AgencyOfferService:
 		if "image_credit_link" in data:
 			offer.image_credit_link = data.get("image_credit_link")
 
-		return self.repo.update(db, offer)
+		offer = self.repo.update(db, offer)
+		if image_changed and offer.image_url:
+			get_placeholder_service(db.get_bind()).request()
+		return offer
 
 	def delete(self, db: Session, agent_session_id: str, offer_id: str) -> None:
 		# deletes an offer
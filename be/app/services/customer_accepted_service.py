@@ -29,11 +29,8 @@ class CustomerAcceptedService:
 		if not offer_ids:
 			return []
 
-		offers = []
-		for offer_id in offer_ids:
-			offer = self.offer_repo.get_by_id(db, None, offer_id)
-			if offer:
-				offers.append(offer)
+		by_id = self.offer_repo.list_by_ids(db, offer_ids)
+		offers = [by_id[offer_id] for offer_id in offer_ids if offer_id in by_id]
 
 		key_map = {
 			"price": lambda o: o.price_housing + o.price_food + (o.price_transport_amount or 0),
@@ -3,11 +3,12 @@
 # Functionality :   business logic for customer offer browsing and status management
 
 from datetime import date
-from typing import List, Optional
+from typing import Dict, List, Optional
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.repositories.agency_offer_repo import AgencyOfferRepository
 from app.repositories.customer_response_repo import CustomerResponseRepository
-from app.models.agency_offer import AgencyOffer
+from app.models.offer_row import OfferRow, OfferStatusRow
 from app.models.customer_response import CustomerResponse, ResponseStatus
 
 
@@ -33,11 +34,11 @@ class CustomerOfferService:
 		price_min: Optional[int] = None,
 		price_max: Optional[int] = None,
 		transport_mode: Optional[str] = None,
-	) -> List[AgencyOffer]:
+	) -> List[OfferRow]:
 		rejected_ids = self.response_repo.get_rejected_offer_ids(db, customer_session_id)
 		accepted_responses = self.response_repo.list_accepted(db, customer_session_id)
 		accepted_ids = {resp.offer_id for resp in accepted_responses}
-		all_offers = self.offer_repo.list_filtered(
+		all_offers = self.offer_repo.list_filtered_rows(
 			db,
 			agent_session_id=None,  # Show all offers to customers (not filtered by agent)
 			origin=origin,
@@ -54,38 +55,37 @@ class CustomerOfferService:
 		)
 		return [o for o in all_offers if o.id not in rejected_ids and o.id not in accepted_ids]
 
-	def accept(self, db: Session, customer_session_id: str, offer_id: str) -> CustomerResponse:
-		# marks an offer as accepted
+	async def list_available_async(self, db: AsyncSession, customer_session_id: str, **filters) -> List[OfferRow]:
+		# list_available on an async session, takes the same keyword filters; responses come in one query
+		statuses = await self.response_repo.statuses_by_offer_async(db, customer_session_id)
+		hidden = {offer_id for offer_id, status in statuses.items() if status in (ResponseStatus.ACCEPTED, ResponseStatus.REJECTED)}
+		all_offers = await self.offer_repo.list_filtered_rows_async(db, agent_session_id=None, **filters)
+		return [o for o in all_offers if o.id not in hidden]
+
+	def _response(self, customer_session_id: str, offer_id: str, status: str) -> CustomerResponse:
 		import uuid
-		response = CustomerResponse(
+		return CustomerResponse(
 			id=f"resp_{uuid.uuid4().hex[:12]}",
 			customer_session_id=customer_session_id,
 			offer_id=offer_id,
-			response_status=ResponseStatus.ACCEPTED,
+			response_status=status,
 		)
-		return self.response_repo.create_or_update(db, response)
+
+	def accept(self, db: Session, customer_session_id: str, offer_id: str) -> CustomerResponse:
+		# marks an offer as accepted
+		return self.response_repo.create_or_update(db, self._response(customer_session_id, offer_id, ResponseStatus.ACCEPTED))
 
 	def reject(self, db: Session, customer_session_id: str, offer_id: str) -> CustomerResponse:
 		# marks an offer as rejected
-		import uuid
-		response = CustomerResponse(
-			id=f"resp_{uuid.uuid4().hex[:12]}",
-			customer_session_id=customer_session_id,
-			offer_id=offer_id,
-			response_status=ResponseStatus.REJECTED,
-		)
-		return self.response_repo.create_or_update(db, response)
+		return self.response_repo.create_or_update(db, self._response(customer_session_id, offer_id, ResponseStatus.REJECTED))
 
 	def update_status(self, db: Session, customer_session_id: str, offer_id: str, status: str) -> CustomerResponse:
 		# updates the status of an offer
-		import uuid
-		response = CustomerResponse(
-			id=f"resp_{uuid.uuid4().hex[:12]}",
-			customer_session_id=customer_session_id,
-			offer_id=offer_id,
-			response_status=status,
-		)
-		return self.response_repo.create_or_update(db, response)
+		return self.response_repo.create_or_update(db, self._response(customer_session_id, offer_id, status))
+
+	async def update_status_async(self, db: AsyncSession, customer_session_id: str, offer_id: str, status: str) -> CustomerResponse:
+		# accept, reject and status updates on an async session
+		return await self.response_repo.create_or_update_async(db, self._response(customer_session_id, offer_id, status))
 
 	def list_all_with_status(
 		# lists all offers with their status for unified view
@@ -101,12 +101,12 @@ class CustomerOfferService:
 		status_filter: Optional[str] = None,
 		sort: Optional[str] = "status",
 		order: Optional[str] = "asc",
-	) -> List[dict]:
+	) -> List[OfferStatusRow]:
 		from app.repositories.customer_note_repo import CustomerNoteRepository
 		note_repo = CustomerNoteRepository()
 		
 		# Get all offers with filters
-		all_offers = self.offer_repo.list_filtered(
+		all_offers = self.offer_repo.list_filtered_rows(
 			db,
 			agent_session_id=None,
 			origin=origin,
@@ -122,12 +122,35 @@ class CustomerOfferService:
 		response_map = {r.offer_id: r.response_status for r in all_responses}
 		
 		# Get all notes for this customer
-		notes_map = {}
-		for offer in all_offers:
-			note = note_repo.get_by_offer(db, customer_session_id, offer.id)
-			if note:
-				notes_map[offer.id] = note.note_text
-		
+		notes_map = note_repo.texts_by_offer(db, customer_session_id)
+		return self._with_status(all_offers, response_map, notes_map, status_filter, sort, order)
+
+	async def list_all_with_status_async(
+		# list_all_with_status on an async session
+		self,
+		db: AsyncSession,
+		customer_session_id: str,
+		status_filter: Optional[str] = None,
+		sort: Optional[str] = "status",
+		order: Optional[str] = "asc",
+		**filters,
+	) -> List[OfferStatusRow]:
+		from app.repositories.customer_note_repo import CustomerNoteRepository
+		all_offers = await self.offer_repo.list_filtered_rows_async(db, agent_session_id=None, **filters)
+		response_map = await self.response_repo.statuses_by_offer_async(db, customer_session_id)
+		notes_map = await CustomerNoteRepository().texts_by_offer_async(db, customer_session_id)
+		return self._with_status(all_offers, response_map, notes_map, status_filter, sort, order)
+
+	def _with_status(
+		# attaches status and note to each offer, then filters and sorts by status group
+		self,
+		all_offers: List[OfferRow],
+		response_map: Dict[str, str],
+		notes_map: Dict[str, str],
+		status_filter: Optional[str],
+		sort: Optional[str],
+		order: Optional[str],
+	) -> List[OfferStatusRow]:
 		# Attach status and note to each offer
 		result = []
 		for offer in all_offers:
@@ -143,10 +166,7 @@ class CustomerOfferService:
 				elif status_filter_upper == "REJECTED" and status != ResponseStatus.REJECTED:
 					continue
 			
-			offer_dict = offer.model_dump()
-			offer_dict["status"] = status
-			offer_dict["note"] = notes_map.get(offer.id)
-			result.append(offer_dict)
+			result.append(OfferStatusRow(*(getattr(offer, f) for f in OfferRow.__slots__), status, notes_map.get(offer.id)))
 		
 		# Sort by status group first (ACCEPTED, UNDECIDED, REJECTED, null), then by sort criteria
 		def sort_key(item):
@@ -156,17 +176,15 @@ class CustomerOfferService:
 				ResponseStatus.UNDECIDED: 2,
 				ResponseStatus.REJECTED: 3,
 			}
-			status = item.get("status")
-			primary = status_order.get(status, 1)
+			primary = status_order.get(item.status, 1)
 			
 			if sort == "price":
-				price = item.get("price_housing", 0) + item.get("price_food", 0) + (item.get("price_transport_amount") or 0)
+				price = item.price_housing + item.price_food + (item.price_transport_amount or 0)
 				return (primary, price)
 			elif sort == "date":
-				date_from = item.get("date_from")
-				return (primary, date_from or "")
+				return (primary, item.date_from or "")
 			else:  # status sort
-				return (primary, item.get("destination_name", ""))
+				return (primary, item.destination_name or "")
 		
 		result.sort(key=sort_key, reverse=(order == "desc"))
 		
@@ -4,6 +4,7 @@
 
 from typing import List, Optional, Dict, Any
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.repositories.customer_order_repo import CustomerOrderRepository
 from app.repositories.agency_offer_repo import AgencyOfferRepository
 from app.models.customer_order import CustomerOrder, OrderStatus
@@ -117,6 +118,9 @@ class CustomerOrderService:
 		# lists orders for a customer session
 		return self.order_repo.list_for_customer(db, customer_session_id, status)
 
+	async def list_orders_async(self, db: AsyncSession, customer_session_id: str, status: Optional[str] = None) -> List[CustomerOrder]:
+		return await self.order_repo.list_for_customer_async(db, customer_session_id, status)
+
 	def cancel_order(self, db: Session, customer_session_id: str, order_id: str) -> Optional[CustomerOrder]:
 		# cancels an order and restores capacity if confirmed
 		order = self.order_repo.get_by_id(db, customer_session_id, order_id)
@@ -1,3 +1,4 @@
+import asyncio
 from typing import List, Dict, Any
 from app.services.llm_service import LLMService
 from app.services.image_service import ImageService
@@ -8,13 +9,14 @@ class ExplorationService:
 		self.llm = llm or LLMService()
 		self.images = images or ImageService()
 
-	def generate_suggestions(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
-		# generates destination suggestions using llm and enriches with images
-		suggestions = self.llm.suggest_destinations(filters)
+	async def generate_suggestions(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+		# generates destination suggestions using llm and enriches with images; the llm call runs
+		# in a worker thread and the image lookups run concurrently under one deadline
+		suggestions = await asyncio.to_thread(self.llm.suggest_destinations, filters)
+		queries = [f"{suggestion['title']} {suggestion['country']} travel" for suggestion in suggestions]
+		images = await self.images.pick_images(queries)
 		enriched = []
-		for suggestion in suggestions:
-			query = f"{suggestion['title']} {suggestion['country']} travel"
-			image_data = self.images.pick_image(query)
+		for suggestion, image_data in zip(suggestions, images):
 			suggestion["image_url"] = image_data.get("url")
 			suggestion["image_credit_source"] = image_data.get("source")
 			suggestion["image_credit_author"] = image_data.get("author")
@@ -0,0 +1,164 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   image_placeholder_service.py
+# Functionality :   background job computing tiny inline placeholders for offer and destination images
+
+import base64
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+import httpx
+from sqlmodel import Session
+from app.clients.http_pool import get_client
+from app.core.config import settings
+from app.core.deps import get_engine
+from app.repositories.agency_offer_repo import AgencyOfferRepository
+from app.repositories.destination_repo import DestinationRepository
+from app.services.image_proxy_service import ImageProxyService
+
+try:
+	from PIL import Image
+	PLACEHOLDERS_AVAILABLE = True
+except ImportError:
+	PLACEHOLDERS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class _TransientError(Exception):
+	# fetch failed in a way worth retrying on a later run
+	pass
+
+
+def make_placeholder(data: bytes, width: int) -> str:
+	# downscales an image to a few pixels wide and returns it as a jpeg data uri of a few hundred bytes;
+	# the frontend stretches and blurs it while the real image loads
+	with Image.open(io.BytesIO(data)) as img:
+		img.draft("RGB", (width * 4, width * 4))
+		thumb = img.convert("RGB")
+		thumb.thumbnail((width, width))
+		out = io.BytesIO()
+		thumb.save(out, format="JPEG", quality=50, optimize=True)
+	return "data:image/jpeg;base64," + base64.b64encode(out.getvalue()).decode("ascii")
+
+
+class ImagePlaceholderService:
+	# computes placeholders for every offer and destination whose image_url has none yet or changed since.
+	# Runs off the request path; request() starts a run or, if one is running, queues one more pass
+	def __init__(self, engine=None, concurrency: Optional[int] = None, batch_size: Optional[int] = None):
+		self.engine = engine or get_engine()
+		self.concurrency = max(1, concurrency or settings.PLACEHOLDER_CONCURRENCY)
+		self.batch_size = max(1, batch_size or settings.PLACEHOLDER_BATCH_SIZE)
+		self.targets = (("agency_offer", AgencyOfferRepository()), ("destination", DestinationRepository()))
+		self.proxy = ImageProxyService()
+		self._lock = threading.Lock()
+		self._running = False
+		self._rerun = False
+		self._progress: Dict[str, Any] = {"state": "idle", "computed": 0, "failed": 0, "started_at": None, "finished_at": None}
+
+	def status(self) -> Dict[str, Any]:
+		with self._lock:
+			return dict(self._progress)
+
+	def request(self) -> bool:
+		# asks for a pass over all images; returns True if a new background run was started
+		if not settings.PLACEHOLDERS_ENABLED or not PLACEHOLDERS_AVAILABLE:
+			return False
+		with self._lock:
+			if self._running:
+				self._rerun = True
+				return False
+			self._running = True
+		threading.Thread(target=self._loop, name="image-placeholders", daemon=True).start()
+		return True
+
+	def _loop(self) -> None:
+		try:
+			while True:
+				self.run()
+				with self._lock:
+					if not self._rerun:
+						self._running = False
+						return
+					self._rerun = False
+		except Exception:
+			with self._lock:
+				self._running = False
+			raise
+
+	def _fetch(self, url: str) -> bytes:
+		# downloads an allow-listed image with a size cap; other hosts are never fetched server-side, and the
+		# proxy checks every redirect hop before following it
+		data = bytearray()
+		try:
+			with self.proxy.open_stream(get_client(), url, timeout=10.0) as response:
+				if response.status_code >= 500 or response.status_code == 429:
+					raise _TransientError(f"HTTP {response.status_code}")
+				if response.status_code != 200:
+					raise ValueError(f"HTTP {response.status_code} from {response.url.host}")
+				for chunk in response.iter_bytes(64 * 1024):
+					data.extend(chunk)
+					if len(data) > settings.IMAGE_PROXY_MAX_BYTES:
+						raise ValueError("image too large")
+		except httpx.TransportError as e:
+			raise _TransientError(str(e)) from e
+		return bytes(data)
+
+	def _compute(self, row_id: str, url: str) -> Tuple[str, str, Optional[str], bool]:
+		# (id, url, placeholder, store); a permanent failure stores None so the image is not retried until
+		# it changes, a transient one stores nothing so the next run tries again
+		try:
+			return row_id, url, make_placeholder(self._fetch(url), settings.PLACEHOLDER_WIDTH), True
+		except _TransientError as e:
+			logger.info("placeholder fetch for %s will be retried: %s", url, e)
+			return row_id, url, None, False
+		except Exception as e:
+			logger.info("no placeholder for %s: %s", url, e)
+			return row_id, url, None, True
+
+	def run(self) -> Dict[str, Any]:
+		# one pass over both tables in id order, writing each batch in a single commit
+		with self._lock:
+			self._progress = {"state": "running", "computed": 0, "failed": 0, "started_at": datetime.now(timezone.utc).isoformat(), "finished_at": None}
+		try:
+			with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="image-placeholders") as pool:
+				for _, repo in self.targets:
+					cursor: Optional[str] = None
+					while True:
+						with Session(self.engine) as db:
+							rows = repo.list_missing_placeholders(db, cursor, self.batch_size)
+						if not rows:
+							break
+						cursor = rows[-1][0]
+						results = list(pool.map(lambda row: self._compute(*row), rows))
+						batch = {row_id: (url, placeholder) for row_id, url, placeholder, store in results if store}
+						if batch:
+							with Session(self.engine) as db:
+								repo.apply_placeholders(db, batch)
+						computed = sum(1 for _, _, placeholder, _ in results if placeholder)
+						with self._lock:
+							self._progress["computed"] += computed
+							self._progress["failed"] += len(results) - computed
+			state = "done"
+		except Exception:
+			logger.exception("placeholder run aborted")
+			state = "failed"
+		with self._lock:
+			self._progress["state"] = state
+			self._progress["finished_at"] = datetime.now(timezone.utc).isoformat()
+			return dict(self._progress)
+
+
+_services: Dict[Any, ImagePlaceholderService] = {}
+_services_lock = threading.Lock()
+
+
+def get_placeholder_service(engine=None) -> ImagePlaceholderService:
+	# returns the placeholder service for an engine, the app engine by default
+	engine = engine or get_engine()
+	with _services_lock:
+		if engine not in _services:
+			_services[engine] = ImagePlaceholderService(engine=engine)
+		return _services[engine]
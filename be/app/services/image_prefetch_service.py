@@ -0,0 +1,88 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   image_prefetch_service.py
+# Functionality :   background image lookup for offers created without an image
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Optional
+from sqlmodel import Session
+from app.core.config import settings
+from app.core.deps import get_engine
+from app.repositories.agency_offer_repo import AgencyOfferRepository
+from app.services.image_placeholder_service import get_placeholder_service
+from app.services.image_service import ImageService
+
+logger = logging.getLogger(__name__)
+
+
+class ImagePrefetchService:
+	# looks up an image for an offer after it was saved and fills image_url and the credit fields,
+	# so creating an offer never waits on the image provider
+	def __init__(self, engine=None, concurrency: Optional[int] = None):
+		self.engine = engine or get_engine()
+		self.concurrency = max(1, concurrency or settings.IMAGE_PREFETCH_CONCURRENCY)
+		self.repo = AgencyOfferRepository()
+		self._lock = threading.Lock()
+		self._pool: Optional[ThreadPoolExecutor] = None
+		self._pending: Dict[str, Future] = {}
+		self._counts: Dict[str, int] = {"filled": 0, "empty": 0, "skipped": 0, "failed": 0}
+
+	def status(self) -> Dict[str, Any]:
+		with self._lock:
+			return {"pending": len(self._pending), **self._counts}
+
+	def is_pending(self, offer_id: str) -> bool:
+		with self._lock:
+			return offer_id in self._pending
+
+	def queue(self, offer_id: str, query: str) -> bool:
+		# schedules a lookup, returns False when prefetching is off or the offer is already queued;
+		# the stub provider only has random filler photos, so nothing is looked up without a real one
+		if not settings.IMAGE_PREFETCH_ENABLED or ImageService(engine=self.engine).provider == "stub":
+			return False
+		with self._lock:
+			if offer_id in self._pending:
+				return False
+			if self._pool is None:
+				self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="image-prefetch")
+			self._pending[offer_id] = self._pool.submit(self._prefetch, offer_id, query)
+			return True
+
+	def join(self, timeout: Optional[float] = None) -> None:
+		# waits for the lookups queued so far
+		with self._lock:
+			futures = list(self._pending.values())
+		wait(futures, timeout=timeout)
+
+	def _prefetch(self, offer_id: str, query: str) -> None:
+		outcome = "failed"
+		try:
+			image = ImageService(engine=self.engine).find_image(query)
+			if not image or not image.get("url"):
+				outcome = "empty"
+			else:
+				with Session(self.engine) as db:
+					applied = self.repo.apply_image(db, offer_id, image)
+				outcome = "filled" if applied else "skipped"
+				if applied:
+					get_placeholder_service(self.engine).request()
+		except Exception:
+			logger.exception("image prefetch failed for offer %s", offer_id)
+		finally:
+			with self._lock:
+				self._pending.pop(offer_id, None)
+				self._counts[outcome] += 1
+
+
+_services: Dict[Any, ImagePrefetchService] = {}
+_services_lock = threading.Lock()
+
+
+def get_prefetch_service(engine=None) -> ImagePrefetchService:
+	# returns the prefetch service for an engine, the app engine by default
+	engine = engine or get_engine()
+	with _services_lock:
+		if engine not in _services:
+			_services[engine] = ImagePrefetchService(engine=engine)
+		return _services[engine]
@@ -0,0 +1,284 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   image_proxy_service.py
+# Functionality :   content-addressed local store of remote images with resized variants
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+import httpx
+from app.clients.http_pool import get_async_client
+from app.core.config import settings
+
+try:
+	from PIL import Image
+	# opening an image over twice this many pixels raises DecompressionBombError instead of allocating for it
+	Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
+	RESIZE_AVAILABLE = True
+except ImportError:
+	RESIZE_AVAILABLE = False
+
+# formats re-encoded when resizing, anything else (gif, svg, ...) is served as fetched
+_RESIZABLE = {"JPEG", "PNG", "WEBP"}
+MAX_REDIRECTS = 3
+
+
+class ImageFetchError(RuntimeError):
+	# remote image could not be fetched or is not an acceptable image
+	pass
+
+
+class StoredImage(NamedTuple):
+	path: str
+	etag: str
+	content_type: str
+
+
+class ImageProxyService:
+	# fetches each remote url once and stores the bytes under their sha256; width variants are
+	# derived from the stored original, so a (digest, width) pair always maps to the same bytes
+	# downloads in flight per url; concurrent requests await the same task instead of fetching again
+	_downloads: Dict[str, "asyncio.Task[Tuple[str, str]]"] = {}
+	# bytes in the store per root, counted up between prunes; each worker keeps its own count
+	_usage: Dict[str, int] = {}
+	_usage_lock = threading.Lock()
+
+	def __init__(self, root: Optional[str] = None):
+		self.root = root or settings.IMAGE_STORE_DIR
+
+	def _path(self, kind: str, name: str) -> str:
+		return os.path.join(self.root, kind, name[:2], name)
+
+	def is_allowed(self, url: str) -> bool:
+		# only provider cdns are fetched server-side, anything else would let clients make us request arbitrary hosts
+		parsed = urlparse(url)
+		host = (parsed.hostname or "").lower()
+		if parsed.scheme not in ("http", "https") or not host:
+			return False
+		return any(host == h or host.endswith("." + h) for h in settings.image_proxy_hosts_list())
+
+	def _next_hop(self, response: httpx.Response) -> Optional[str]:
+		# the url a redirect points to, None for any other response; hosts outside the allow list are
+		# refused here, before anything is requested from them
+		if not response.is_redirect:
+			return None
+		target = str(response.url.join(response.headers.get("location", "")))
+		if not self.is_allowed(target):
+			raise ImageFetchError("Image redirected to a host outside the allow list")
+		return target
+
+	@asynccontextmanager
+	async def open_stream_async(self, client: httpx.AsyncClient, url: str, timeout: float = 10.0) -> AsyncIterator[httpx.Response]:
+		# streamed GET following at most MAX_REDIRECTS redirects by hand, every hop checked against the allow list
+		if not self.is_allowed(url):
+			raise ImageFetchError("Host not allowed")
+		for _ in range(MAX_REDIRECTS + 1):
+			response = await client.send(client.build_request("GET", url, timeout=timeout), stream=True, follow_redirects=False)
+			try:
+				target = self._next_hop(response)
+				if target is None:
+					yield response
+					return
+			finally:
+				await response.aclose()
+			url = target
+		raise ImageFetchError("Image fetch exceeded the redirect limit")
+
+	@contextmanager
+	def open_stream(self, client: httpx.Client, url: str, timeout: float = 10.0) -> Iterator[httpx.Response]:
+		# open_stream_async for sync callers such as the placeholder job
+		if not self.is_allowed(url):
+			raise ImageFetchError("Host not allowed")
+		for _ in range(MAX_REDIRECTS + 1):
+			response = client.send(client.build_request("GET", url, timeout=timeout), stream=True, follow_redirects=False)
+			try:
+				target = self._next_hop(response)
+				if target is None:
+					yield response
+					return
+			finally:
+				response.close()
+			url = target
+		raise ImageFetchError("Image fetch exceeded the redirect limit")
+
+	@staticmethod
+	def snap_width(width: Optional[int]) -> Optional[int]:
+		# rounds a requested width up to a configured variant width to bound the number of variants
+		if not width:
+			return None
+		widths = settings.image_proxy_widths_list()
+		for w in widths:
+			if w >= width:
+				return w
+		return widths[-1] if widths else None
+
+	def _read_index(self, url: str) -> Optional[Tuple[str, str]]:
+		path = self._path("urls", hashlib.sha256(url.encode("utf-8")).hexdigest())
+		try:
+			with open(path, encoding="utf-8") as f:
+				entry = json.load(f)
+			if os.path.exists(self._path("originals", entry["digest"])):
+				_touch(path)
+				return entry["digest"], entry["content_type"]
+		except (OSError, ValueError, KeyError):
+			pass
+		return None
+
+	def _write_atomic(self, path: str, data: bytes) -> None:
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+		with open(tmp, "wb") as f:
+			f.write(data)
+		os.replace(tmp, path)
+
+	async def fetch(self, url: str) -> Tuple[str, str]:
+		# returns (digest, content type) of the stored original, downloading it on first use. Concurrent
+		# requests for the same url await one shared download, which stays registered until it has
+		# written the index, so a later request either finds the index or joins the download
+		cached = await asyncio.to_thread(self._read_index, url)
+		if cached:
+			return cached
+		task = self._downloads.get(url)
+		if task is None:
+			task = asyncio.ensure_future(self._download(url))
+			self._downloads[url] = task
+			task.add_done_callback(lambda done: self._download_finished(url, done))
+		# a request that goes away does not cancel the download for the others
+		return await asyncio.shield(task)
+
+	def _download_finished(self, url: str, task: "asyncio.Task[Tuple[str, str]]") -> None:
+		if self._downloads.get(url) is task:
+			del self._downloads[url]
+		if not task.cancelled():
+			# marks a failure as retrieved when every waiter has gone
+			task.exception()
+
+	async def _download(self, url: str) -> Tuple[str, str]:
+		# reads the body with a size cap, then hashes and stores it in a worker thread
+		data = bytearray()
+		try:
+			async with self.open_stream_async(get_async_client(), url) as response:
+				if response.status_code != 200:
+					raise ImageFetchError(f"Image fetch returned HTTP {response.status_code}")
+				content_type = response.headers.get("content-type", "").split(";")[0].strip()
+				if not content_type.startswith("image/"):
+					raise ImageFetchError(f"Not an image: {content_type or 'unknown content type'}")
+				async for chunk in response.aiter_bytes(64 * 1024):
+					data.extend(chunk)
+					if len(data) > settings.IMAGE_PROXY_MAX_BYTES:
+						raise ImageFetchError("Image exceeds IMAGE_PROXY_MAX_BYTES")
+		except ImageFetchError:
+			raise
+		except Exception as e:
+			raise ImageFetchError(f"Image fetch failed: {e}") from e
+		name = await asyncio.to_thread(self._store, url, bytes(data), content_type)
+		return name, content_type
+
+	def _store(self, url: str, data: bytes, content_type: str) -> str:
+		# writes the original under its sha256 and then the url index pointing at it, returns the digest
+		name = hashlib.sha256(data).hexdigest()
+		self._write_atomic(self._path("originals", name), data)
+		index = json.dumps({"url": url, "digest": name, "content_type": content_type}).encode("utf-8")
+		self._write_atomic(self._path("urls", hashlib.sha256(url.encode("utf-8")).hexdigest()), index)
+		self._stored(len(data) + len(index))
+		return name
+
+	def _files(self) -> List[Tuple[float, int, str]]:
+		# (mtime, size, path) of every stored file; serving a file touches it, so mtime is its last use
+		files = []
+		for kind in ("originals", "variants", "urls"):
+			for directory, _, names in os.walk(os.path.join(self.root, kind)):
+				for name in names:
+					path = os.path.join(directory, name)
+					try:
+						stat = os.stat(path)
+					except OSError:
+						continue
+					files.append((stat.st_mtime, stat.st_size, path))
+		return files
+
+	def _stored(self, size: int) -> None:
+		# counts newly written bytes and prunes once the store is over IMAGE_STORE_MAX_BYTES
+		with self._usage_lock:
+			if self.root not in self._usage:
+				self._usage[self.root] = sum(f[1] for f in self._files())
+			else:
+				self._usage[self.root] += size
+			over = self._usage[self.root] > settings.IMAGE_STORE_MAX_BYTES
+		if over:
+			self.prune()
+
+	def prune(self) -> int:
+		# deletes least recently used files until the store is under 90% of IMAGE_STORE_MAX_BYTES; a url
+		# whose original is gone is downloaded again on its next request. Returns the bytes left
+		files = sorted(self._files())
+		total = sum(f[1] for f in files)
+		target = settings.IMAGE_STORE_MAX_BYTES * 0.9
+		for _, size, path in files:
+			if total <= target:
+				break
+			_remove(path)
+			total -= size
+		with self._usage_lock:
+			self._usage[self.root] = total
+		return total
+
+	def _variant(self, digest: str, width: int) -> bool:
+		# writes a resized copy of the original in its own format; False when the original is already
+		# narrow enough or is not a format we re-encode
+		path = self._path("variants", f"{digest}-w{width}")
+		if os.path.exists(path):
+			return True
+		with Image.open(self._path("originals", digest)) as img:
+			if img.format not in _RESIZABLE or img.width <= width:
+				return False
+			height = max(1, round(img.height * width / img.width))
+			resized = img.resize((width, height), Image.LANCZOS)
+			if img.format == "JPEG" and resized.mode not in ("RGB", "L"):
+				resized = resized.convert("RGB")
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+			resized.save(tmp, format=img.format, quality=82, optimize=True)
+			os.replace(tmp, path)
+		self._stored(os.path.getsize(path))
+		return True
+
+	async def get(self, url: str, width: Optional[int] = None) -> StoredImage:
+		# stored original or width variant for a remote url
+		digest, content_type = await self.fetch(url)
+		return await asyncio.to_thread(self._serve, digest, content_type, self.snap_width(width))
+
+	def _serve(self, digest: str, content_type: str, width: Optional[int]) -> StoredImage:
+		# the file to serve, touched so pruning keeps recently served files
+		if width and RESIZE_AVAILABLE:
+			try:
+				resized = self._variant(digest, width)
+			except (OSError, Image.DecompressionBombError):
+				# undecodable or oversized image, the original is still servable
+				resized = False
+			if resized:
+				path = self._path("variants", f"{digest}-w{width}")
+				_touch(path)
+				return StoredImage(path, f'"{digest}-w{width}"', content_type)
+		path = self._path("originals", digest)
+		_touch(path)
+		return StoredImage(path, f'"{digest}"', content_type)
+
+
+def _remove(path: str) -> None:
+	try:
+		os.remove(path)
+	except OSError:
+		pass
+
+
+def _touch(path: str) -> None:
+	try:
+		os.utime(path)
+	except OSError:
+		pass
@@ -2,28 +2,218 @@
 # File:                   image_service.py
 # Functionality :   service for fetching images from external apis
 
-from typing import Dict
-from app.clients.images_client import ImagesClientStub, UnsplashClient, PexelsClient
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from sqlmodel import Session
+from app.clients.images_client import ImagesClientStub, PexelsClient, RacingImagesClient, UnsplashClient
+from app.clients.replay import wrap_transport
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.deps import get_engine
+from app.models.image_cache import ImageCacheEntry
+from app.repositories.image_cache_repo import ImageCacheRepository
+
+logger = logging.getLogger(__name__)
+
+# multi-image search results by provider, query and count, in front of the persistent cache; shared
+# because services are created per request
+_search_cache = TTLCache(maxsize=settings.IMAGE_SEARCH_CACHE_SIZE, ttl=settings.IMAGE_CACHE_TTL_SECONDS)
 
 
 class ImageService:
-	# handles image search operations
-	def __init__(self):
+	# handles image search operations; provider answers are cached persistently per query
+	def __init__(self, engine=None):
+		# IMAGE_PROVIDER is "unsplash", "pexels", "race" (every provider with a key, first valid answer wins) or "stub"
 		provider = settings.IMAGE_PROVIDER.lower()
-		if provider == "unsplash" and settings.UNSPLASH_KEY:
-			try:
-				self.client = UnsplashClient()
-			except ValueError:
-				self.client = ImagesClientStub()
-		elif provider == "pexels" and settings.PEXELS_API_KEY:
-			try:
-				self.client = PexelsClient()
-			except ValueError:
-				self.client = ImagesClientStub()
+		available = self._configured_providers()
+		if provider == "race" and len(available) > 1:
+			self.client = RacingImagesClient(available)
+			self.provider = "race"
+		elif provider == "race" and available:
+			self.provider, self.client = next(iter(available.items()))
+		elif provider in available:
+			self.client = available[provider]
+			self.provider = provider
 		else:
 			self.client = ImagesClientStub()
+			self.provider = "stub"
+		self.client = wrap_transport(self.client, "images")
+		self.engine = engine or get_engine()
+		self.cache = ImageCacheRepository()
+
+	@staticmethod
+	def _configured_providers() -> Dict[str, Any]:
+		# provider clients that have an api key, in race order
+		providers: Dict[str, Any] = {}
+		for name, key, factory in (("unsplash", settings.UNSPLASH_KEY, UnsplashClient), ("pexels", settings.PEXELS_API_KEY, PexelsClient)):
+			if key:
+				try:
+					providers[name] = factory()
+				except ValueError:
+					pass
+		return providers
+
+	@staticmethod
+	def _stub(query: str) -> Dict[str, str]:
+		return ImagesClientStub().search_first(query)
+
+	def _cache_key(self, query: str) -> str:
+		return f"{self.provider}:{' '.join(query.lower().split())}"
+
+	def _cache_enabled(self) -> bool:
+		# the stub answers instantly, caching it would only cost writes
+		return settings.IMAGE_CACHE_ENABLED and self.provider != "stub"
+
+	def _cache_get(self, queries: List[str]) -> Dict[str, Optional[Dict[str, str]]]:
+		# cached answers by query, None marks a cached "no result"; cache errors count as misses
+		if not self._cache_enabled() or not queries:
+			return {}
+		now = time.time()
+		keys = {self._cache_key(q): q for q in queries}
+		try:
+			with Session(self.engine) as db:
+				entries = self.cache.get_many(db, list(keys), now)
+				hits = {}
+				for key, e in entries.items():
+					hits[keys[key]] = {"url": e.url, "source": e.source, "author": e.author, "link": e.link} if e.found else None
+				self.cache.touch(db, list(entries.values()), now)
+		except Exception:
+			logger.exception("image cache read failed")
+			return {}
+		return hits
+
+	def _cache_put(self, results: Dict[str, Optional[Dict[str, str]]]) -> None:
+		# stores provider answers; "no result" answers expire sooner so new photos are picked up
+		if not self._cache_enabled() or not results:
+			return
+		now = time.time()
+		entries = []
+		for query, photo in results.items():
+			ttl = settings.IMAGE_CACHE_TTL_SECONDS if photo else settings.IMAGE_CACHE_NEGATIVE_TTL_SECONDS
+			photo = photo or {}
+			entries.append(ImageCacheEntry(
+				key=self._cache_key(query),
+				provider=self.provider,
+				query=query,
+				found=bool(photo),
+				url=photo.get("url"),
+				source=photo.get("source"),
+				author=photo.get("author"),
+				link=photo.get("link"),
+				expires_at=now + ttl,
+				last_used_at=now,
+			))
+		try:
+			with Session(self.engine) as db:
+				self.cache.put_many(db, entries, settings.IMAGE_CACHE_MAX_ENTRIES, now)
+		except Exception:
+			logger.exception("image cache write failed")
+
+	def _search_key(self, query: str, n: int) -> str:
+		return f"search:{self.provider}:{n}:{' '.join(query.lower().split())}"
+
+	def _search_get(self, query: str, n: int) -> Optional[List[Dict[str, str]]]:
+		# persisted result list of a multi-image search, None on a miss; cache errors count as misses
+		if not self._cache_enabled():
+			return None
+		now = time.time()
+		key = self._search_key(query, n)
+		try:
+			with Session(self.engine) as db:
+				entry = self.cache.get_many(db, [key], now).get(key)
+				if entry is None or not entry.images:
+					return None
+				self.cache.touch(db, [entry], now)
+				return json.loads(entry.images)
+		except Exception:
+			logger.exception("image cache read failed")
+			return None
+
+	def _search_put(self, query: str, n: int, images: List[Dict[str, str]]) -> None:
+		if not self._cache_enabled():
+			return
+		now = time.time()
+		entry = ImageCacheEntry(
+			key=self._search_key(query, n),
+			provider=self.provider,
+			query=query,
+			images=json.dumps(images),
+			expires_at=now + settings.IMAGE_CACHE_TTL_SECONDS,
+			last_used_at=now,
+		)
+		try:
+			with Session(self.engine) as db:
+				self.cache.put_many(db, [entry], settings.IMAGE_CACHE_MAX_ENTRIES, now)
+		except Exception:
+			logger.exception("image cache write failed")
+
+	def find_image(self, query: str) -> Optional[Dict[str, str]]:
+		# provider image for a query, None when there is none or the provider failed
+		hits = self._cache_get([query])
+		if query in hits:
+			return hits[query]
+		try:
+			photo = self.client.find_first(query)
+		except Exception:
+			# provider failures are not cached
+			return None
+		self._cache_put({query: photo})
+		return photo
 
 	def pick_image(self, query: str) -> Dict[str, str]:
 		# searches for an image using the configured provider
-		return self.client.search_first(query)
+		return self.find_image(query) or self._stub(query)
+
+	async def pick_images(self, queries: List[str], deadline: Optional[float] = None) -> List[Dict[str, str]]:
+		# serves cached queries, looks up the rest concurrently under one shared deadline; lookups that
+		# fail or are still running when it passes are cancelled and get the stub image. The cache is a
+		# sync sqlite table that can wait on the write lock, so it is read and written in a worker thread
+		deadline = settings.IMAGE_LOOKUP_DEADLINE_SECONDS if deadline is None else deadline
+		hits = await asyncio.to_thread(self._cache_get, queries)
+		misses = list(dict.fromkeys(q for q in queries if q not in hits))
+		tasks = {q: asyncio.ensure_future(self.client.find_first_async(q)) for q in misses}
+		fetched: Dict[str, Optional[Dict[str, str]]] = {}
+		if tasks:
+			done, pending = await asyncio.wait(tasks.values(), timeout=max(0.0, deadline))
+			for task in pending:
+				task.cancel()
+			if pending:
+				await asyncio.gather(*pending, return_exceptions=True)
+			for query, task in tasks.items():
+				if task in done and not task.cancelled() and task.exception() is None:
+					fetched[query] = task.result()
+			await asyncio.to_thread(self._cache_put, fetched)
+		answers = {**hits, **fetched}
+		return [answers.get(q) or self._stub(q) for q in queries]
+
+	async def search_many(self, query: str, n: int) -> List[Dict[str, str]]:
+		# up to n distinct images for one query from a single provider request; non-empty result lists are
+		# cached in process and in the persistent image cache, so they survive restarts and are shared by
+		# workers. Provider errors or an empty answer give a single stub image
+		key = (self.provider, " ".join(query.lower().split()), n)
+		hit, images = _search_cache.get(key)
+		if hit:
+			return images
+		images = await asyncio.to_thread(self._search_get, query, n)
+		if images is None:
+			try:
+				images = await self.client.find_many_async(query, n)
+			except Exception:
+				logger.warning("image search failed for %r", query, exc_info=True)
+				images = []
+			if not images:
+				return [self._stub(query)]
+			await asyncio.to_thread(self._search_put, query, n, images)
+		_search_cache.set(key, images)
+		return images
+
+	@staticmethod
+	def search_cache_stats() -> Dict[str, Any]:
+		return _search_cache.stats()
+
+	@staticmethod
+	def clear_search_cache() -> None:
+		_search_cache.clear()
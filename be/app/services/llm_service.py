@@ -2,14 +2,36 @@
 # File:                   llm_service.py
 # Functionality :   service for interacting with llm api
 
-from typing import Any, Dict, List
-from app.clients.openai_client import OpenAIClientStub, OpenAIClient
+import json
+from typing import Any, Callable, Dict, List
+from app.clients.openai_client import OpenAIClientStub, OpenAIClient, LLMUpstreamError, breaker
+from app.clients.replay import wrap_transport
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.context import current_session_id
+from app.core.llm_scheduler import SchedulerRejectedError, llm_scheduler
+from app.core.metrics import llm_metrics
+
+# shared across service instances, services are created per request
+_cache = TTLCache(maxsize=settings.LLM_CACHE_SIZE, ttl=settings.LLM_CACHE_TTL_SECONDS)
+_fallback_client: OpenAIClientStub | None = None
+
+
+def _fallback() -> OpenAIClientStub:
+	# catalog-based answers served while openai is unavailable
+	global _fallback_client
+	if _fallback_client is None:
+		_fallback_client = OpenAIClientStub()
+	return _fallback_client
 
 
 class LLMService:
 	# handles llm operations for destination suggestions
-	def __init__(self, client=None):
+	def __init__(self, client=None, allow_fallback: bool = True, background: bool = False):
+		# allow_fallback=False makes upstream failures raise instead of returning degraded content;
+		# background=True queues calls behind every interactive operation in the scheduler
+		self.allow_fallback = allow_fallback
+		self.background = background
 		if client:
 			self.client = client
 		elif settings.OPENAI_API_KEY:
@@ -19,16 +41,77 @@ class LLMService:
 				self.client = OpenAIClientStub()
 		else:
 			self.client = OpenAIClientStub()
+		if not client:
+			self.client = wrap_transport(self.client, "llm")
+
+	@staticmethod
+	def cache_stats() -> Dict[str, Any]:
+		return _cache.stats()
+
+	@staticmethod
+	def clear_cache() -> None:
+		_cache.clear()
+
+	@staticmethod
+	def breaker_state() -> Dict[str, Any]:
+		return breaker.snapshot()
+
+	@staticmethod
+	def scheduler_state() -> Dict[str, Any]:
+		return llm_scheduler.snapshot()
+
+	def _cached(self, operation: str, key_parts: Any, produce: Callable[[], Any], fallback: Callable[[], Any], refresh: bool = False) -> Any:
+		# serves identical requests from the shared cache and records the outcome; misses go through
+		# the global scheduler. When upstream fails, the breaker is open or the scheduler rejects the
+		# call, answers from a possibly stale cache entry or the stub catalog. refresh=True skips the
+		# fresh lookup but still stores the answer for that fallback
+		key = (operation, type(self.client).__name__, json.dumps(key_parts, sort_keys=True, default=str))
+		if not refresh:
+			hit, value = _cache.get(key)
+			llm_metrics.record_cache(operation, hit)
+			if hit:
+				return value
+		else:
+			llm_metrics.record_cache(operation, False)
+		try:
+			with llm_scheduler.slot("background" if self.background else operation, current_session_id.get()):
+				value = produce()
+		except (LLMUpstreamError, SchedulerRejectedError):
+			if not self.allow_fallback:
+				raise
+			stale_hit, stale = _cache.get_stale(key)
+			if stale_hit:
+				llm_metrics.record_fallback(operation, "cache")
+				return stale
+			llm_metrics.record_fallback(operation, "stub")
+			return fallback()
+		_cache.set(key, value)
+		return value
 
 	def suggest_destinations(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
 		# generates destination suggestions from llm
-		res = self.client.suggest_destinations(filters)
-		if not isinstance(res, list) or len(res) != 5:
-			raise ValueError("LLM returned invalid suggestions length")
-		return res
+		def produce():
+			res = self.client.suggest_destinations(filters)
+			if not isinstance(res, list) or len(res) != 5:
+				raise ValueError("LLM returned invalid suggestions length")
+			return res
+		# identical filters get fresh suggestions each time; the cached answer is only a fallback
+		return self._cached("suggest", filters, produce, lambda: _fallback().suggest_destinations(filters), refresh=True)
 
 	def expand_destination(self, base: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
-		return self.client.expand_destination(base, options)
+		refresh = bool((options or {}).get("forceRefresh"))
+		return self._cached(
+			"expand",
+			base,
+			lambda: self.client.expand_destination(base, options),
+			lambda: _fallback().expand_destination(base, options),
+			refresh=refresh,
+		)
 
 	def customize_destination(self, base: Dict[str, Any], user_prompt: str) -> Dict[str, Any]:
-		return self.client.customize_destination(base, user_prompt)
+		return self._cached(
+			"customize",
+			[base, user_prompt],
+			lambda: self.client.customize_destination(base, user_prompt),
+			lambda: _fallback().customize_destination(base, user_prompt),
+		)
@@ -0,0 +1,160 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   offer_enrichment_service.py
+# Functionality :   background pipeline that pre-generates missing offer detail content
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlmodel import Session
+from app.clients.openai_client import OpenAIClientStub
+from app.core.config import settings
+from app.core.deps import get_engine
+from app.repositories.agency_offer_repo import AgencyOfferRepository
+from app.services.llm_service import LLMService
+
+logger = logging.getLogger(__name__)
+
+# maps llm expand keys to the tag types used by the agent panel
+DETAIL_TAG_TYPES: Dict[str, str] = {
+	"highlights": "highlights",
+	"whyVisit": "why_visit",
+	"thingsToConsider": "things_to_consider",
+}
+
+
+class OfferEnrichmentService:
+	# finds offers with missing details, expands them through the llm and writes results back in batches
+	def __init__(self, engine=None, llm: LLMService | None = None, concurrency: Optional[int] = None, batch_size: Optional[int] = None):
+		self.engine = engine or get_engine()
+		self.llm = llm
+		self.concurrency = max(1, concurrency or settings.ENRICHMENT_CONCURRENCY)
+		self.batch_size = max(1, batch_size or settings.ENRICHMENT_BATCH_SIZE)
+		self.repo = AgencyOfferRepository()
+		self._lock = threading.Lock()
+		self._thread: Optional[threading.Thread] = None
+		self._progress: Dict[str, Any] = self._empty_progress("idle")
+
+	def _empty_progress(self, state: str) -> Dict[str, Any]:
+		return {
+			"state": state,
+			"total": 0,
+			"processed": 0,
+			"enriched": 0,
+			"failed": 0,
+			"cursor": None,
+			"started_at": None,
+			"finished_at": None,
+		}
+
+	def status(self) -> Dict[str, Any]:
+		# returns a snapshot of the current or last run
+		with self._lock:
+			return dict(self._progress)
+
+	def is_running(self) -> bool:
+		return self._thread is not None and self._thread.is_alive()
+
+	def _ensure_llm(self) -> bool:
+		# builds the default llm on first use. Without OPENAI_API_KEY its client is the stub, whose canned
+		# text must never be written into offers, so the job reports "disabled" and does nothing
+		if self.llm is None:
+			llm = LLMService(allow_fallback=False, background=True)
+			if isinstance(getattr(llm.client, "_inner", llm.client), OpenAIClientStub):
+				self._update(**self._empty_progress("disabled"))
+				return False
+			self.llm = llm
+		return True
+
+	def start(self) -> bool:
+		# starts a run in a background thread, returns False if one is already running or the job is disabled
+		if not self._ensure_llm():
+			return False
+		with self._lock:
+			if self.is_running():
+				return False
+			self._thread = threading.Thread(target=self.run, name="offer-enrichment", daemon=True)
+			self._thread.start()
+			return True
+
+	def _update(self, **changes: Any) -> None:
+		with self._lock:
+			self._progress.update(changes)
+
+	def _generate(self, offer_id: str, base: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+		# expands a single offer, returns None on failure so the batch can continue
+		try:
+			details = self.llm.expand_destination(base, {"forceRefresh": False})
+		except Exception:
+			logger.exception("offer enrichment failed for %s", offer_id)
+			return offer_id, None
+		tags: List[Tuple[str, str]] = []
+		for key, tag_type in DETAIL_TAG_TYPES.items():
+			for name in details.get(key) or []:
+				name = (name or "").strip()
+				if name:
+					tags.append((name, tag_type))
+		return offer_id, {"extended_description": details.get("longDescription"), "tags": tags}
+
+	def run(self) -> Dict[str, Any]:
+		# processes every offer with missing details; offers enriched by a previous run are skipped,
+		# so an interrupted run resumes where it stopped when started again
+		if not self._ensure_llm():
+			return self.status()
+		tag_types = list(DETAIL_TAG_TYPES.values())
+		with Session(self.engine) as db:
+			total = self.repo.count_missing_details(db, tag_types)
+		progress = self._empty_progress("running")
+		progress["total"] = total
+		progress["started_at"] = datetime.now(timezone.utc).isoformat()
+		with self._lock:
+			self._progress = progress
+
+		cursor: Optional[str] = None
+		try:
+			with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="offer-enrichment") as pool:
+				while True:
+					with Session(self.engine) as db:
+						offers = self.repo.list_missing_details(db, tag_types, after_id=cursor, limit=self.batch_size)
+						bases = [(o.id, {"title": o.destination_name, "country": o.country}) for o in offers]
+					if not bases:
+						break
+					cursor = bases[-1][0]
+
+					futures = [pool.submit(self._generate, offer_id, base) for offer_id, base in bases]
+					batch: Dict[str, Dict[str, Any]] = {}
+					failed = 0
+					for future in as_completed(futures):
+						offer_id, details = future.result()
+						if details is None:
+							failed += 1
+						else:
+							batch[offer_id] = details
+
+					enriched = 0
+					if batch:
+						with Session(self.engine) as db:
+							enriched = self.repo.apply_details_batch(db, batch)
+
+					with self._lock:
+						self._progress["processed"] += len(bases)
+						self._progress["enriched"] += enriched
+						self._progress["failed"] += failed
+						self._progress["cursor"] = cursor
+			self._update(state="done", finished_at=datetime.now(timezone.utc).isoformat())
+		except Exception:
+			logger.exception("offer enrichment run aborted at cursor %s", cursor)
+			self._update(state="failed", finished_at=datetime.now(timezone.utc).isoformat())
+		return self.status()
+
+
+_service: Optional[OfferEnrichmentService] = None
+
+
+def get_enrichment_service() -> OfferEnrichmentService:
+	# returns the app-lifetime enrichment service
+	global _service
+	if _service is None:
+		_service = OfferEnrichmentService()
+	return _service
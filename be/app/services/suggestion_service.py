@@ -12,6 +12,7 @@ from app.models.proposal import Proposal, ProposalStatus
 from app.models.destination import Destination
 from app.services.llm_service import LLMService
 from app.services.image_service import ImageService
+from app.services.image_placeholder_service import get_placeholder_service
 
 
 class SuggestionService:
@@ -79,9 +80,11 @@ class SuggestionService:
 			image_credit_link=p.image_credit_link,
 			tags=p.tags,
 		)
-		created = self.destinations.create(db, d)
+		d = self.destinations.create(db, d)
 		self.proposals.mark_rejected(db, session_id, proposal_id)
-		return created
+		if d.image_url:
+			get_placeholder_service(db.get_bind()).request()
+		return d
 
 	def reject(self, db: Session, session_id: str, proposal_id: str) -> None:
 		self.proposals.mark_rejected(db, session_id, proposal_id)
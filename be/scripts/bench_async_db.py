@@ -0,0 +1,186 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   bench_async_db.py
+# Functionality :   throughput of customer offer routes under concurrent requests, blocking vs async sessions
+#
+# Usage (from be/):
+#   PYTHONPATH=.:scripts python scripts/bench_async_db.py --offers 2000 --requests 300 --concurrency 12
+#
+# Seeds a temporary sqlite database and sends concurrent requests through the asgi app. "blocking" is the
+# previous route shape (async def with the sync session, every query runs on the event loop), "threadpool"
+# is the same route as a plain def that fastapi runs in its threadpool, "async" is the route on the
+# aiosqlite session. While the requests run, a ticker coroutine measures how late the event loop wakes it
+# up, which is what every other request on the worker waits for.
+#
+# Keep --concurrency at or below 15 (sync pool size plus overflow): past it "blocking" stalls for the 30 s
+# pool timeout, since the request waiting for a connection blocks the loop that would release one.
+#
+# Scenarios:
+#   list       GET of every offer, mostly python work (rows, json) on a warm database
+#   contended  a destination search with every fourth request a status update, while another connection
+#              (a second worker, the enrichment job) keeps taking the write lock for 20 ms at a time
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from typing import Optional
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Concurrent offer requests on blocking and async sessions")
+	parser.add_argument("--offers", type=int, default=2000, help="offers to seed")
+	parser.add_argument("--requests", type=int, default=300, help="requests per variant and scenario")
+	parser.add_argument("--concurrency", type=int, default=12, help="requests in flight")
+	parser.add_argument("--json", action="store_true", help="print results as json")
+	return parser.parse_args()
+
+
+def build_apps():
+	from fastapi import Depends, FastAPI
+	from sqlmodel import Session
+	from sqlmodel.ext.asyncio.session import AsyncSession
+	from app.core.deps import get_async_db, get_db
+	from app.schemas.envelope import ResponseEnvelope
+	from app.services.customer_offer_service import CustomerOfferService
+
+	blocking, threadpool, async_app = FastAPI(), FastAPI(), FastAPI()
+	service = CustomerOfferService()
+
+	@blocking.get("/offers")
+	async def blocking_list(destination: Optional[str] = None, db: Session = Depends(get_db)):
+		return ResponseEnvelope.ok(service.list_available(db, "customer", destination=destination))
+
+	@blocking.put("/offers/{offer_id}/status")
+	async def blocking_status(offer_id: str, db: Session = Depends(get_db)):
+		return ResponseEnvelope.ok(service.update_status(db, "customer", offer_id, "UNDECIDED").model_dump())
+
+	@threadpool.get("/offers")
+	def threadpool_list(destination: Optional[str] = None, db: Session = Depends(get_db)):
+		return ResponseEnvelope.ok(service.list_available(db, "customer", destination=destination))
+
+	@threadpool.put("/offers/{offer_id}/status")
+	def threadpool_status(offer_id: str, db: Session = Depends(get_db)):
+		return ResponseEnvelope.ok(service.update_status(db, "customer", offer_id, "UNDECIDED").model_dump())
+
+	@async_app.get("/offers")
+	async def async_list(destination: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+		return ResponseEnvelope.ok(await service.list_available_async(db, "customer", destination=destination))
+
+	@async_app.put("/offers/{offer_id}/status")
+	async def async_status(offer_id: str, db: AsyncSession = Depends(get_async_db)):
+		return ResponseEnvelope.ok((await service.update_status_async(db, "customer", offer_id, "UNDECIDED")).model_dump())
+
+	return (("blocking", blocking), ("threadpool", threadpool), ("async", async_app))
+
+
+def hold_write_lock(path: str, stop: threading.Event, hold: float = 0.02, pause: float = 0.01) -> None:
+	# another writer on the same file: takes the write lock, keeps it for `hold` seconds, lets go
+	conn = sqlite3.connect(path, isolation_level=None)
+	while not stop.is_set():
+		conn.execute("BEGIN IMMEDIATE")
+		conn.execute("UPDATE agency_offer SET capacity_available = capacity_available WHERE id = 'offer_bench0000000'")
+		time.sleep(hold)
+		conn.execute("COMMIT")
+		time.sleep(pause)
+	conn.close()
+
+
+async def ticker(stop: asyncio.Event, lags: list, interval: float = 0.005) -> None:
+	# records how much later than asked the loop resumes a sleeping coroutine
+	while not stop.is_set():
+		start = time.perf_counter()
+		await asyncio.sleep(interval)
+		lags.append(time.perf_counter() - start - interval)
+
+
+async def hammer(target, requests, args) -> dict:
+	# requests is a list of (method, path); workers take them in order until all are sent
+	import httpx
+	async with httpx.AsyncClient(transport=httpx.ASGITransport(app=target), base_url="http://bench") as client:
+		await client.request(*requests[0])
+		latencies, pending, lags = [], list(reversed(requests)), []
+
+		async def worker():
+			while pending:
+				method, path = pending.pop()
+				start = time.perf_counter()
+				response = await client.request(method, path)
+				latencies.append(time.perf_counter() - start)
+				assert response.status_code == 200, response.text
+
+		stop = asyncio.Event()
+		tick = asyncio.create_task(ticker(stop, lags))
+		start = time.perf_counter()
+		await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+		elapsed = time.perf_counter() - start
+		stop.set()
+		await tick
+	latencies.sort()
+	return {
+		"req_per_s": round(len(requests) / elapsed, 1),
+		"p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+		"p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+		"loop_lag_max_ms": round(max(lags or [0]) * 1000, 1),
+		"loop_lag_mean_ms": round(statistics.fmean(lags or [0]) * 1000, 1),
+	}
+
+
+async def run(args, db_path: str):
+	listing = [("GET", "/offers")] * args.requests
+	mixed = [
+		("PUT", f"/offers/offer_bench{i % args.offers:07d}/status") if i % 4 == 3 else ("GET", "/offers?destination=Destination 19")
+		for i in range(args.requests)
+	]
+	results = []
+	for scenario, requests, contended in (("list", listing, False), ("contended", mixed, True)):
+		for name, target in build_apps():
+			stop = threading.Event()
+			writer = threading.Thread(target=hold_write_lock, args=(db_path, stop), daemon=True)
+			if contended:
+				writer.start()
+			try:
+				results.append({"scenario": scenario, "variant": name, **await hammer(target, requests, args)})
+			finally:
+				stop.set()
+				if contended:
+					writer.join()
+	return results
+
+
+def main():
+	args = parse_args()
+	logging.getLogger("httpx").setLevel(logging.WARNING)
+	workdir = tempfile.mkdtemp(prefix="travelbot-bench-")
+	db_path = os.path.join(workdir, "bench.db")
+	os.environ["DB_URL"] = f"sqlite:///{db_path}"
+	from app.core.config import settings
+	settings.DB_URL = os.environ["DB_URL"]
+	settings.IMAGE_PREFETCH_ENABLED = False
+	settings.PLACEHOLDERS_ENABLED = False
+	from sqlmodel import SQLModel
+	from app.core.deps import get_engine
+	import app.main  # noqa: F401  registers every model
+	from bench_offers_list import seed
+	SQLModel.metadata.create_all(get_engine())
+	seed(get_engine(), args.offers)
+
+	results = asyncio.run(run(args, db_path))
+	if args.json:
+		print(json.dumps(results, indent=2))
+		return
+	print(f"{'scenario':<11}{'variant':<12}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'lag max ms':>12}{'lag mean ms':>13}")
+	for r in results:
+		print(
+			f"{r['scenario']:<11}{r['variant']:<12}{r['req_per_s']:>8}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+			f"{r['loop_lag_max_ms']:>12}{r['loop_lag_mean_ms']:>13}"
+		)
+
+
+if __name__ == "__main__":
+	main()
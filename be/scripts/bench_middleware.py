@@ -0,0 +1,175 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   bench_middleware.py
+# Functionality :   microbenchmark of per-request middleware overhead on a trivial endpoint
+#
+# Usage (from be/):
+#   PYTHONPATH=. python scripts/bench_middleware.py --requests 20000
+#   PYTHONPATH=. python scripts/bench_middleware.py --no-cookie
+#
+# Calls the asgi app directly (no server, no http client) so the numbers are the middleware cost alone.
+# "basehttp" is the previous BaseHTTPMiddleware implementation of the same three layers, "asgi" is the
+# current stack from app.core, "none" is the bare endpoint.
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from typing import Callable
+
+STACKS = ("none", "basehttp", "asgi")
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Per-request overhead of the session, rate limit and request id middleware")
+	parser.add_argument("--requests", type=int, default=10000, help="timed requests per stack")
+	parser.add_argument("--warmup", type=int, default=500, help="untimed requests per stack")
+	parser.add_argument("--no-cookie", action="store_true", help="send no session cookie, so every request starts a new session")
+	parser.add_argument("--json", action="store_true", help="print results as json")
+	return parser.parse_args()
+
+
+def legacy_middleware():
+	# the BaseHTTPMiddleware versions the asgi middleware replaced, kept here only for comparison
+	from fastapi import Request
+	from starlette.middleware.base import BaseHTTPMiddleware
+	from app.core.config import settings
+	from app.core.context import current_request_id, current_session_id
+
+	class SessionCookieMiddleware(BaseHTTPMiddleware):
+		async def dispatch(self, request: Request, call_next: Callable):
+			session_id = request.cookies.get("sessionId")
+			if not session_id:
+				session_id = str(uuid.uuid4())
+				request.state.session_id = session_id
+				current_session_id.set(session_id)
+				response = await call_next(request)
+				response.set_cookie(key="sessionId", value=session_id, httponly=True, secure=False, samesite="lax")
+				return response
+			request.state.session_id = session_id
+			current_session_id.set(session_id)
+			return await call_next(request)
+
+	class SimpleRateLimiter(BaseHTTPMiddleware):
+		def __init__(self, app, limit_per_minute: int):
+			super().__init__(app)
+			self.bucket: dict[str, list[float]] = {}
+
+		async def dispatch(self, request: Request, call_next: Callable):
+			path = request.url.path
+			if not (path.endswith("/suggest") or path.endswith("/explore") or path.endswith("/expand") or path.endswith("/customize")):
+				return await call_next(request)
+			now = time.time()
+			key = f"{request.cookies.get('sessionId') or 'anon'}:{path}"
+			entries = [ts for ts in self.bucket.get(key, []) if ts > now - 60]
+			entries.append(now)
+			self.bucket[key] = entries
+			return await call_next(request)
+
+	class RequestIdMiddleware(BaseHTTPMiddleware):
+		async def dispatch(self, request: Request, call_next: Callable):
+			req_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+			request.state.request_id = req_id
+			current_request_id.set(req_id)
+			response = await call_next(request)
+			response.headers["X-Request-ID"] = req_id
+			return response
+
+	return RequestIdMiddleware, SessionCookieMiddleware, SimpleRateLimiter, settings.RATE_LIMIT_PER_MINUTE
+
+
+def build_app(stack: str):
+	# trivial endpoint behind the given middleware, added in the same order as app.main
+	from fastapi import FastAPI
+	from app.core.config import settings
+
+	app = FastAPI()
+
+	@app.get("/health")
+	async def health():
+		return {"status": "ok"}
+
+	if stack == "basehttp":
+		request_id, session_cookie, rate_limiter, limit = legacy_middleware()
+	elif stack == "asgi":
+		from app.core.middleware import SessionCookieMiddleware as session_cookie, SimpleRateLimiter as rate_limiter
+		from app.core.request_id import RequestIdMiddleware as request_id
+		limit = settings.RATE_LIMIT_PER_MINUTE
+	else:
+		return app
+	app.add_middleware(request_id)
+	app.add_middleware(session_cookie)
+	app.add_middleware(rate_limiter, limit_per_minute=limit)
+	return app
+
+
+async def call(app, headers) -> int:
+	# one GET /health straight through the asgi interface
+	scope = {
+		"type": "http",
+		"asgi": {"version": "3.0"},
+		"http_version": "1.1",
+		"method": "GET",
+		"scheme": "http",
+		"path": "/health",
+		"raw_path": b"/health",
+		"root_path": "",
+		"query_string": b"",
+		"headers": list(headers),
+		"client": ("127.0.0.1", 50000),
+		"server": ("testserver", 80),
+	}
+	status = 0
+
+	async def receive():
+		return {"type": "http.request", "body": b"", "more_body": False}
+
+	async def send(message):
+		nonlocal status
+		if message["type"] == "http.response.start":
+			status = message["status"]
+
+	await app(scope, receive, send)
+	return status
+
+
+async def measure(stack: str, args) -> dict:
+	app = build_app(stack)
+	headers = [(b"host", b"testserver")]
+	if not args.no_cookie:
+		headers.append((b"cookie", b"sessionId=bench-session"))
+	for _ in range(args.warmup):
+		await call(app, headers)
+	samples = []
+	for _ in range(args.requests):
+		start = time.perf_counter()
+		status = await call(app, headers)
+		samples.append(time.perf_counter() - start)
+		if status != 200:
+			raise RuntimeError(f"{stack}: /health returned {status}")
+	samples.sort()
+	return {
+		"stack": stack,
+		"mean_us": round(statistics.fmean(samples) * 1e6, 1),
+		"p50_us": round(samples[len(samples) // 2] * 1e6, 1),
+		"p99_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6, 1),
+	}
+
+
+def main():
+	args = parse_args()
+	results = [asyncio.run(measure(stack, args)) for stack in STACKS]
+	bare = results[0]["mean_us"]
+	for r in results:
+		r["overhead_us"] = round(r["mean_us"] - bare, 1)
+	if args.json:
+		print(json.dumps(results, indent=2))
+		return
+	print(f"{'stack':<10}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'overhead us':>14}")
+	for r in results:
+		print(f"{r['stack']:<10}{r['mean_us']:>10}{r['p50_us']:>10}{r['p99_us']:>10}{r['overhead_us']:>14}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,179 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   bench_offers_list.py
+# Functionality :   benchmark of GET /agent/offers with a large offer table
+#
+# Usage (from be/):
+#   PYTHONPATH=. python scripts/bench_offers_list.py --offers 10000 --requests 20
+#
+# Seeds a temporary sqlite database and times the list endpoint through the asgi app. "legacy" is the
+# previous response path (orm instances, dicts from model_dump, jsonable_encoder, stdlib json), "app" is
+# the real endpoint. The encode-only rows split out the serialization share of the same rows, and the
+# load rows compare loading orm instances with OfferRow records, including peak traced memory.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="List endpoint latency with many offers")
+	parser.add_argument("--offers", type=int, default=10000, help="offers to seed")
+	parser.add_argument("--requests", type=int, default=20, help="timed requests per variant")
+	parser.add_argument("--json", action="store_true", help="print results as json")
+	return parser.parse_args()
+
+
+def seed(engine, count: int) -> None:
+	from sqlmodel import Session
+	from app.models.agency_offer import AgencyOffer
+	with Session(engine) as db:
+		for i in range(count):
+			start = date(2025, 1, 1) + timedelta(days=i % 300)
+			db.add(AgencyOffer(
+				id=f"offer_bench{i:07d}",
+				agent_session_id="agent",
+				destination_name=f"Destination {i}",
+				country="Spain",
+				city=f"City {i % 50}",
+				origin="Prague",
+				destination_where_to=f"Destination {i}",
+				capacity_available=10,
+				capacity_total=10,
+				date_from=start,
+				date_to=start + timedelta(days=7),
+				season="summer",
+				type_of_stay=json.dumps(["beach", "city"]),
+				price_housing=500 + i % 100,
+				price_food=200,
+				price_transport_mode="plane",
+				price_transport_amount=300,
+				short_description="A week by the sea with guided trips and local food",
+				extended_description="Longer description of the stay. " * 8,
+				image_url=f"https://images.unsplash.com/photo-{i}",
+				image_credit_source="unsplash",
+				image_credit_author="Photographer",
+				image_credit_link="https://unsplash.com",
+			))
+		db.commit()
+
+
+def summarize(name: str, samples, size: int, peak: int = 0) -> dict:
+	samples = sorted(samples)
+	return {
+		"variant": name,
+		"mean_ms": round(statistics.fmean(samples) * 1000, 1),
+		"p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+		"max_ms": round(samples[-1] * 1000, 1),
+		"bytes": size,
+		"peak_mb": round(peak / 2 ** 20, 1),
+	}
+
+
+def load(engine, loader, requests: int):
+	# times loading every offer in a fresh session, then traces peak memory of one more load
+	from sqlmodel import Session
+	samples = []
+	for _ in range(requests):
+		with Session(engine) as db:
+			start = time.perf_counter()
+			rows = loader(db)
+			samples.append(time.perf_counter() - start)
+	with Session(engine) as db:
+		tracemalloc.start()
+		rows = loader(db)
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+	return samples, len(rows), peak
+
+
+async def run(args):
+	import httpx
+	from fastapi import Depends, FastAPI
+	from fastapi.encoders import jsonable_encoder
+	from fastapi.responses import JSONResponse
+	from sqlmodel import Session
+	from app.core.deps import get_db, get_engine
+	from app.core.responses import dumps
+	from app.main import app
+	from app.repositories.agency_offer_repo import AgencyOfferRepository
+	from app.services.agency_offer_service import AgencyOfferService
+
+	engine = get_engine()
+	seed(engine, args.offers)
+
+	legacy = FastAPI(default_response_class=JSONResponse)
+
+	@legacy.get("/api/v1/agent/offers")
+	async def legacy_list(db: Session = Depends(get_db)):
+		offers = AgencyOfferRepository().list_filtered(db, "agent")
+		return {"data": [o.model_dump() for o in offers], "error": None}
+
+	results = []
+	cookies = {"sessionId": "agent"}
+	for name, target in (("legacy", legacy), ("app", app)):
+		async with httpx.AsyncClient(transport=httpx.ASGITransport(app=target), base_url="http://bench", cookies=cookies) as client:
+			await client.get("/api/v1/agent/offers")
+			samples, size = [], 0
+			for _ in range(args.requests):
+				start = time.perf_counter()
+				response = await client.get("/api/v1/agent/offers")
+				samples.append(time.perf_counter() - start)
+				size = len(response.content)
+				assert response.status_code == 200 and len(response.json()["data"]) == args.offers
+			results.append(summarize(name, samples, size))
+
+	# serialization alone, on rows already loaded
+	with Session(engine) as db:
+		instances = AgencyOfferRepository().list_filtered(db, "agent")
+		records = AgencyOfferService().list_filtered(db, "agent")
+		for name, encode in (
+			("legacy encode", lambda: json.dumps(jsonable_encoder({"data": [o.model_dump() for o in instances], "error": None}), ensure_ascii=False, separators=(",", ":")).encode("utf-8")),
+			("orjson encode", lambda: dumps({"data": records, "error": None})),
+		):
+			samples = []
+			for _ in range(args.requests):
+				start = time.perf_counter()
+				body = encode()
+				samples.append(time.perf_counter() - start)
+			results.append(summarize(name, samples, len(body)))
+
+	repo = AgencyOfferRepository()
+	for name, loader in (("orm load", lambda db: repo.list_filtered(db, "agent")), ("row load", lambda db: repo.list_filtered_rows(db, "agent"))):
+		samples, count, peak = load(engine, loader, args.requests)
+		assert count == args.offers
+		results.append(summarize(name, samples, 0, peak))
+	return results
+
+
+def main():
+	args = parse_args()
+	logging.getLogger("httpx").setLevel(logging.WARNING)
+	workdir = tempfile.mkdtemp(prefix="travelbot-bench-")
+	os.environ["DB_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+	from app.core.config import settings
+	settings.DB_URL = os.environ["DB_URL"]
+	settings.IMAGE_PREFETCH_ENABLED = False
+	settings.PLACEHOLDERS_ENABLED = False
+	from sqlmodel import SQLModel
+	from app.core.deps import get_engine
+	import app.main  # noqa: F401  registers every model
+	SQLModel.metadata.create_all(get_engine())
+
+	results = asyncio.run(run(args))
+	if args.json:
+		print(json.dumps(results, indent=2))
+		return
+	print(f"{'variant':<16}{'mean ms':>10}{'p50 ms':>10}{'max ms':>10}{'bytes':>12}{'peak MB':>10}")
+	for r in results:
+		print(f"{r['variant']:<16}{r['mean_ms']:>10}{r['p50_ms']:>10}{r['max_ms']:>10}{r['bytes'] or '':>12}{r['peak_mb'] or '':>10}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,171 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   bench_services.py
+# Functionality :   offline end-to-end latency benchmark for explore, suggest, expand and customize
+#
+# Usage (from be/):
+#   PYTHONPATH=. python scripts/bench_services.py --requests 40 --concurrency 8
+#   PYTHONPATH=. python scripts/bench_services.py --fixtures ./fixtures --llm-latency recorded
+#
+# Upstream calls are answered by the replay transport from fixture files. Without --fixtures a
+# temporary directory is seeded from the stub clients, so the benchmark runs with no network.
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+OPS = ("explore", "suggest", "expand", "customize")
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Offline end-to-end latency benchmark using replayed upstream fixtures")
+	parser.add_argument("--fixtures", help="fixture directory to replay (seeded from stubs if empty)")
+	parser.add_argument("--llm-latency", default="lognormal:1800,0.35", help="latency spec for llm calls")
+	parser.add_argument("--image-latency", default="lognormal:250,0.5", help="latency spec for image lookups")
+	parser.add_argument("--requests", type=int, default=20, help="requests per operation")
+	parser.add_argument("--concurrency", type=int, default=5, help="requests in flight at once")
+	parser.add_argument("--ops", default=",".join(OPS), help="comma-separated operations to run")
+	parser.add_argument("--json", action="store_true", help="print results as json")
+	return parser.parse_args()
+
+
+def seed_fixtures(root: str) -> None:
+	# records stub responses so replay has something to serve
+	from app.clients.images_client import ImagesClientStub
+	from app.clients.openai_client import OpenAIClientStub
+	from app.clients.replay import FixtureStore, RecordingClient
+	store = FixtureStore(root)
+	llm = RecordingClient(OpenAIClientStub(), store, "llm")
+	images = RecordingClient(ImagesClientStub(), store, "images")
+	llm.suggest_destinations({"regions": ["Europe"]})
+	base = {"title": "Lisbon", "country": "Portugal"}
+	llm.expand_destination(base, {"forceRefresh": True})
+	llm.customize_destination(base, "quiet places")
+	images.search_first("Lisbon Portugal travel")
+	images.find_first("Lisbon Portugal travel")
+
+
+def percentile(values, q):
+	if not values:
+		return None
+	ordered = sorted(values)
+	index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+	return ordered[index]
+
+
+async def run(args):
+	import logging
+	import httpx
+	from sqlmodel import SQLModel
+	from app.core.deps import get_engine
+	from app.main import app
+
+	logging.getLogger("httpx").setLevel(logging.WARNING)
+	SQLModel.metadata.create_all(get_engine())
+	transport = httpx.ASGITransport(app=app)
+	semaphore = asyncio.Semaphore(max(1, args.concurrency))
+
+	async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+		async def call(method, path, sid, body=None):
+			response = await client.request(method, path, json=body, headers={"Cookie": f"sessionId={sid}"})
+			payload = response.json()
+			ok = response.status_code == 200 and payload.get("error") is None
+			return ok, payload.get("data")
+
+		async def prepare_destination(sid):
+			# creates a saved destination for expand/customize through the legacy flow
+			ok, proposals = await call("POST", "/api/v1/suggest", sid, {"origin": f"prep-{sid}"})
+			if not ok or not proposals:
+				raise RuntimeError("could not prepare a destination for expand/customize")
+			ok, dest = await call("POST", f"/api/v1/proposals/{proposals[0]['id']}/accept", sid)
+			return dest["id"]
+
+		async def one(op, i, sid, dest_id):
+			# unique inputs per request keep the llm response cache out of the measurement
+			if op == "explore":
+				return await call("POST", "/api/v1/customer/explore", sid, {"origin": f"bench-{i}"})
+			if op == "suggest":
+				return await call("POST", "/api/v1/suggest", sid, {"origin": f"bench-{i}"})
+			if op == "expand":
+				return await call("POST", f"/api/v1/destinations/{dest_id}/expand", sid, {"forceRefresh": True})
+			return await call("POST", f"/api/v1/destinations/{dest_id}/customize", sid, {"prompt": f"bench prompt {i}"})
+
+		results = {}
+		ops = [op.strip() for op in args.ops.split(",") if op.strip()]
+		for op in ops:
+			if op not in OPS:
+				raise SystemExit(f"unknown operation: {op}")
+			sid = f"bench-{op}-{uuid.uuid4().hex[:8]}"
+			dest_id = await prepare_destination(sid) if op in ("expand", "customize") else None
+			latencies = []
+			errors = 0
+
+			async def timed(i):
+				nonlocal errors
+				async with semaphore:
+					started = time.perf_counter()
+					ok, _ = await one(op, i, sid, dest_id)
+					latencies.append(time.perf_counter() - started)
+					if not ok:
+						errors += 1
+
+			wall_started = time.perf_counter()
+			await asyncio.gather(*(timed(i) for i in range(args.requests)))
+			wall = time.perf_counter() - wall_started
+			results[op] = {
+				"requests": args.requests,
+				"errors": errors,
+				"concurrency": args.concurrency,
+				"wall_seconds": round(wall, 3),
+				"throughput_rps": round(args.requests / wall, 2) if wall else None,
+				"mean_ms": round(statistics.mean(latencies) * 1000, 1),
+				"p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+				"p90_ms": round(percentile(latencies, 0.90) * 1000, 1),
+				"p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+				"max_ms": round(max(latencies) * 1000, 1),
+			}
+	return results
+
+
+def main():
+	args = parse_args()
+	workdir = tempfile.mkdtemp(prefix="travelbot-bench-")
+	fixtures = args.fixtures or os.path.join(workdir, "fixtures")
+
+	# configure before the app is imported so the engine and services pick it up
+	os.environ["DB_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+	os.environ["OPENAI_API_KEY"] = ""
+	from app.core.config import settings
+	settings.DB_URL = os.environ["DB_URL"]
+	settings.FIXTURES_DIR = fixtures
+	settings.RATE_LIMIT_PER_MINUTE = 10 ** 9
+	settings.RATE_LIMIT_EXPLORE_PER_MINUTE = 10 ** 9
+	# keeps background image downloads out of the measurement
+	settings.PLACEHOLDERS_ENABLED = False
+	settings.IMAGE_PREFETCH_ENABLED = False
+
+	if not os.path.isdir(fixtures) or not os.listdir(fixtures):
+		seed_fixtures(fixtures)
+
+	settings.LLM_TRANSPORT = "replay"
+	settings.IMAGE_TRANSPORT = "replay"
+	settings.REPLAY_LATENCY_LLM = args.llm_latency
+	settings.REPLAY_LATENCY_IMAGES = args.image_latency
+
+	results = asyncio.run(run(args))
+	if args.json:
+		print(json.dumps(results, indent=2))
+		return
+	print(f"llm latency: {args.llm_latency}   image latency: {args.image_latency}   fixtures: {fixtures}")
+	print(f"{'op':<10} {'n':>4} {'err':>4} {'rps':>7} {'mean':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+	for op, r in results.items():
+		print(f"{op:<10} {r['requests']:>4} {r['errors']:>4} {r['throughput_rps']:>7} {r['mean_ms']:>8} {r['p50_ms']:>8} {r['p90_ms']:>8} {r['p99_ms']:>8} {r['max_ms']:>8}")
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,130 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   bench_startup.py
+# Functionality :   time from process start to the first healthy and the first warm requests, with and without warm-up
+#
+# Usage (from be/):
+#   PYTHONPATH=.:scripts python scripts/bench_startup.py --offers 2000 --runs 3
+#
+# Seeds a temporary sqlite database, then starts uvicorn as a fresh process per run, once with
+# WARMUP_ON_STARTUP=false and once with true. Measured from the moment the process is spawned:
+#   healthy   GET /health/live answers 200 (uvicorn accepts requests only after startup, warm-up included)
+#   warm      the first offer list, tag list and explore requests have all been answered
+# plus the latency of each of those first requests and of the same request sent again. The explore
+# request takes the live llm path against a closed local port, so it pays the openai import and then
+# answers from the stub catalog without network access.
+
+import argparse
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REQUESTS = (
+	("offers", "GET", "/api/v1/customer/offers", None),
+	("tags", "GET", "/api/v1/tags", None),
+	("explore", "POST", "/api/v1/customer/explore", {"regions": ["Europe"]}),
+)
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Startup time to the first healthy and warm requests")
+	parser.add_argument("--offers", type=int, default=2000, help="offers to seed")
+	parser.add_argument("--runs", type=int, default=3, help="process starts per variant, medians are reported")
+	parser.add_argument("--json", action="store_true", help="print results as json")
+	return parser.parse_args()
+
+
+def free_port() -> int:
+	with socket.socket() as s:
+		s.bind(("127.0.0.1", 0))
+		return s.getsockname()[1]
+
+
+def start_once(db_url: str, warmup: bool) -> dict:
+	import httpx
+	port = free_port()
+	env = dict(
+		os.environ,
+		DB_URL=db_url,
+		WARMUP_ON_STARTUP=str(warmup).lower(),
+		PLACEHOLDERS_ON_STARTUP="false",
+		ENRICHMENT_ON_STARTUP="false",
+		IMAGE_PREFETCH_ENABLED="false",
+		OPENAI_API_KEY="sk-bench",
+		OPENAI_BASE_URL="http://127.0.0.1:9/v1",
+		LLM_MAX_RETRIES="0",
+		LOG_REQUESTS="false",
+		LOG_LEVEL="WARNING",
+	)
+	started = time.perf_counter()
+	process = subprocess.Popen(
+		[sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+		env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+	)
+	result = {}
+	try:
+		with httpx.Client(base_url=f"http://127.0.0.1:{port}", cookies={"sessionId": "bench"}, timeout=30.0) as client:
+			while True:
+				try:
+					if client.get("/health/live").status_code == 200:
+						break
+				except httpx.TransportError:
+					pass
+				if process.poll() is not None or time.perf_counter() - started > 60:
+					raise RuntimeError("server did not become healthy")
+				time.sleep(0.01)
+			result["healthy_s"] = time.perf_counter() - started
+			for attempt in ("first", "second"):
+				for name, method, path, body in REQUESTS:
+					request_started = time.perf_counter()
+					response = client.request(method, path, json=body)
+					assert response.status_code == 200, response.text
+					result[f"{name}_{attempt}_ms"] = (time.perf_counter() - request_started) * 1000
+				if attempt == "first":
+					result["warm_s"] = time.perf_counter() - started
+	finally:
+		process.terminate()
+		process.wait()
+	return result
+
+
+def main():
+	args = parse_args()
+	logging.getLogger("httpx").setLevel(logging.WARNING)
+	workdir = tempfile.mkdtemp(prefix="travelbot-bench-")
+	db_url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+	os.environ["DB_URL"] = db_url
+	os.environ["WARMUP_ON_STARTUP"] = "false"
+	from app.core.config import settings
+	settings.DB_URL = db_url
+	from sqlmodel import SQLModel
+	from app.core.deps import get_engine
+	import app.main  # noqa: F401  registers every model
+	from bench_offers_list import seed
+	SQLModel.metadata.create_all(get_engine())
+	seed(get_engine(), args.offers)
+	get_engine().dispose()
+
+	results = []
+	for warmup in (False, True):
+		runs = [start_once(db_url, warmup) for _ in range(args.runs)]
+		summary = {"variant": "warm-up" if warmup else "no warm-up"}
+		for key in runs[0]:
+			summary[key] = round(statistics.median(r[key] for r in runs), 3 if key.endswith("_s") else 1)
+		results.append(summary)
+	if args.json:
+		print(json.dumps(results, indent=2))
+		return
+	print(f"{'variant':<12}{'healthy s':>11}{'warm s':>9}" + "".join(f"{name + ' 1st/2nd ms':>24}" for name, *_ in REQUESTS))
+	for r in results:
+		cells = "".join(f"{r[name + '_first_ms']:>15}/{r[name + '_second_ms']:<8}" for name, *_ in REQUESTS)
+		print(f"{r['variant']:<12}{r['healthy_s']:>11}{r['warm_s']:>9}{cells}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,115 @@
+# Author:             Patrik Kišeda ( xkised00 )
+# File:                   bench_workers.py
+# Functionality :   several worker processes reading and writing one sqlite file, per DB_PROFILE
+#
+# Usage (from be/):
+#   PYTHONPATH=.:scripts python scripts/bench_workers.py --workers 4 --seconds 5
+#
+# Each process stands in for a uvicorn worker: it runs migrate() like on startup, then loops over offer
+# list reads and customer response upserts (one write per --write-every operations) on its own engine
+# until the time is up. Reported per profile: operations per second over all processes, and the errors,
+# "database is locked" included, that a request would have turned into a 500.
+
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Concurrent worker processes on one sqlite database")
+	parser.add_argument("--workers", type=int, default=4, help="worker processes")
+	parser.add_argument("--seconds", type=float, default=5.0, help="run time per profile")
+	parser.add_argument("--offers", type=int, default=500, help="offers to seed")
+	parser.add_argument("--write-every", type=int, default=3, help="one write per this many operations")
+	parser.add_argument("--json", action="store_true", help="print results as json")
+	return parser.parse_args()
+
+
+def worker(url: str, profile: str, worker_id: int, args, barrier, queue) -> None:
+	from sqlmodel import Session
+	from app.core.deps import make_engine
+	from app.main import migrate
+	from app.repositories.agency_offer_repo import AgencyOfferRepository
+	from app.services.customer_offer_service import CustomerOfferService
+
+	engine = make_engine(url, profile)
+	migrate(engine)
+	repo, service = AgencyOfferRepository(), CustomerOfferService()
+	reads = writes = 0
+	errors = {}
+	barrier.wait()  # every process has imported the app and migrated
+	deadline = time.time() + args.seconds
+	i = 0
+	while time.time() < deadline:
+		i += 1
+		try:
+			with Session(engine) as db:
+				if i % args.write_every == 0:
+					offer_id = f"offer_bench{(worker_id * 7919 + i) % args.offers:07d}"
+					service.update_status(db, f"customer-{i % 50}", offer_id, "ACCEPTED" if i % 2 else "REJECTED")
+					writes += 1
+				else:
+					repo.list_filtered_rows(db, destination=f"Destination {i % 10}")
+					reads += 1
+		except Exception as e:
+			message = str(e).splitlines()[0][:80]
+			errors[message] = errors.get(message, 0) + 1
+	engine.dispose()
+	queue.put({"reads": reads, "writes": writes, "errors": errors})
+
+
+def run_profile(profile: str, args) -> dict:
+	from sqlmodel import SQLModel
+	from app.core.deps import make_engine
+	import app.main  # noqa: F401  registers every model
+	from bench_offers_list import seed
+
+	workdir = tempfile.mkdtemp(prefix="travelbot-bench-")
+	url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+	engine = make_engine(url, profile)
+	SQLModel.metadata.create_all(engine)
+	seed(engine, args.offers)
+	engine.dispose()
+
+	context = multiprocessing.get_context("spawn")
+	queue, barrier = context.Queue(), context.Barrier(args.workers)
+	processes = [context.Process(target=worker, args=(url, profile, n, args, barrier, queue)) for n in range(args.workers)]
+	for p in processes:
+		p.start()
+	results = [queue.get() for _ in processes]
+	for p in processes:
+		p.join()
+	errors = {}
+	for r in results:
+		for message, count in r["errors"].items():
+			errors[message] = errors.get(message, 0) + count
+	reads, writes = sum(r["reads"] for r in results), sum(r["writes"] for r in results)
+	return {
+		"profile": profile,
+		"ops_per_s": round((reads + writes) / args.seconds, 1),
+		"reads": reads,
+		"writes": writes,
+		"errors": sum(errors.values()),
+		"error_kinds": errors,
+	}
+
+
+def main():
+	args = parse_args()
+	os.environ.setdefault("IMAGE_PREFETCH_ENABLED", "false")
+	results = [run_profile(profile, args) for profile in ("default", "production")]
+	if args.json:
+		print(json.dumps(results, indent=2))
+		return
+	print(f"{'profile':<12}{'ops/s':>10}{'reads':>10}{'writes':>10}{'errors':>8}")
+	for r in results:
+		print(f"{r['profile']:<12}{r['ops_per_s']:>10}{r['reads']:>10}{r['writes']:>10}{r['errors']:>8}")
+		for message, count in r["error_kinds"].items():
+			print(f"    {count} x {message}")
+
+
+if __name__ == "__main__":
+	main()
@@ -5,7 +5,8 @@ from datetime import date
 from sqlmodel import SQLModel, Session, create_engine
 from fastapi.testclient import TestClient
 from app.main import app
-from app.core.deps import get_db, get_engine
+from app.core.deps import get_async_db, get_db, get_engine, make_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.services.agency_offer_service import AgencyOfferService
 from app.services.customer_offer_service import CustomerOfferService
 from app.services.customer_accepted_service import CustomerAcceptedService
@@ -38,7 +39,14 @@ def test_client(test_db):
 		finally:
 			session.close()
 	
+	async_engine = make_async_engine(test_db)
+
+	async def override_get_async_db():
+		async with AsyncSession(async_engine, expire_on_commit=False) as session:
+			yield session
+	
 	app.dependency_overrides[get_db] = override_get_db
+	app.dependency_overrides[get_async_db] = override_get_async_db
 	client = TestClient(app)
 	yield client
 	app.dependency_overrides.clear()
@@ -82,6 +90,39 @@ def create_test_offer(client, agent_session_id, offer_data):
 	return response.json()["data"]["id"]
 
 
+OPENAI_COMPLETIONS_URL = "https://api.openai.com/v1/chat/completions"
+
+
+def fake_openai(monkeypatch, parse):
+	"""Replace the OpenAI SDK client; parse(**kwargs) answers every structured completion call.
+
+	Returns the keyword arguments of every client built and of every with_options call."""
+	import openai
+	from types import SimpleNamespace
+	seen = SimpleNamespace(built=[], options=[])
+
+	class FakeOpenAI:
+		def __init__(self, **kwargs):
+			seen.built.append(kwargs)
+			self.beta = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(parse=parse)))
+
+		def with_options(self, **kwargs):
+			seen.options.append(kwargs)
+			return self
+
+	monkeypatch.setattr(openai, "OpenAI", FakeOpenAI)
+	return seen
+
+
+def fake_completion(parsed, prompt_tokens=0, completion_tokens=0):
+	"""A parsed completion response as the OpenAI SDK returns it."""
+	from types import SimpleNamespace
+	return SimpleNamespace(
+		choices=[SimpleNamespace(message=SimpleNamespace(parsed=parsed))],
+		usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+	)
+
+
 # Unit Tests
 def test_agency_offer_create(test_db):
 	session_id = "test-agent"
@@ -327,3 +368,1297 @@ def test_flow_cancel_order_restores_capacity(test_client, agent_session_id, cust
 	response = test_client.get(f"/api/v1/agent/offers/{offer_id}", cookies={"sessionId": agent_session_id})
 	offer = response.json()["data"]
 	assert offer["capacity_available"] == 10
+
+
+def test_enrichment_fills_missing_details(test_db, sample_offer_data):
+	from app.services.offer_enrichment_service import OfferEnrichmentService
+	from app.services.llm_service import LLMService
+	from app.clients.openai_client import OpenAIClientStub
+	from app.repositories.tag_repo import TagRepository
+	with Session(test_db) as db:
+		data = dict(sample_offer_data, date_from=date(2025, 6, 1), date_to=date(2025, 6, 8))
+		first = AgencyOfferService().create(db, "agent", data)
+		second = AgencyOfferService().create(db, "agent", dict(data, extended_description="Written by the agent"))
+		first_id, second_id = first.id, second.id
+
+	service = OfferEnrichmentService(engine=test_db, llm=LLMService(client=OpenAIClientStub()), concurrency=2, batch_size=1)
+	progress = service.run()
+	assert progress["state"] == "done"
+	assert progress["total"] == 2
+	assert progress["enriched"] == 2
+
+	with Session(test_db) as db:
+		first = AgencyOfferService().get_by_id(db, "agent", first_id)
+		second = AgencyOfferService().get_by_id(db, "agent", second_id)
+		assert first.extended_description.startswith("Explore Valencia")
+		assert second.extended_description == "Written by the agent"
+		types = {t.type for t in TagRepository().get_tags_for_offer(db, first_id)}
+		assert types == {"highlights", "why_visit", "things_to_consider"}
+
+	# a second run finds nothing left to do
+	progress = service.run()
+	assert progress["total"] == 0
+	assert progress["processed"] == 0
+
+
+def test_enrichment_disabled_without_key(test_db, sample_offer_data, monkeypatch):
+	from app.core.config import settings
+	from app.services.offer_enrichment_service import OfferEnrichmentService
+	monkeypatch.setattr(settings, "OPENAI_API_KEY", None)
+	monkeypatch.setattr(settings, "LLM_TRANSPORT", "record")
+	with Session(test_db) as db:
+		data = dict(sample_offer_data, date_from=date(2025, 6, 1), date_to=date(2025, 6, 8))
+		offer_id = AgencyOfferService().create(db, "agent", data).id
+
+	# the default client would be the stub, also behind a recording transport
+	service = OfferEnrichmentService(engine=test_db)
+	assert service.start() is False
+	assert service.status()["state"] == "disabled"
+	assert service.run()["state"] == "disabled"
+	with Session(test_db) as db:
+		assert AgencyOfferService().get_by_id(db, "agent", offer_id).extended_description is None
+
+
+def test_llm_metrics_record_tokens_and_cache(test_client, customer_session_id, monkeypatch):
+	from app.clients.openai_client import OpenAIClient
+	from app.core.metrics import llm_metrics
+	from app.services.llm_service import LLMService
+
+	calls = []
+
+	def parse(**kwargs):
+		calls.append(kwargs["response_format"]["json_schema"]["name"])
+		parsed = {"highlights": ["Old town"], "whyVisit": [], "thingsToConsider": [], "longDescription": "Nice"}
+		return fake_completion(parsed, prompt_tokens=120, completion_tokens=80)
+
+	fake_openai(monkeypatch, parse)
+	llm_metrics.reset()
+	service = LLMService(client=OpenAIClient(api_key="test", model="gpt-test"))
+	base = {"title": "Metrics Town", "country": "Nowhere"}
+	service.expand_destination(base, {})
+	service.expand_destination(base, {})
+	assert calls == ["expand_response"]
+
+	response = test_client.get("/api/v1/metrics/llm", cookies={"sessionId": "anon"})
+	assert response.status_code == 200
+	data = response.json()["data"]
+	call = data["calls"][0]
+	assert (call["schema"], call["model"]) == ("expand_response", "gpt-test")
+	assert call["prompt_tokens"] == 120
+	assert call["completion_tokens"] == 80
+	assert call["latency_seconds"]["count"] == 1
+	assert data["cache"]["expand"] == {"hits": 1, "misses": 1}
+	assert data["session"]["prompt_tokens"] == 120
+
+	# a session's totals are only readable with that session's cookie
+	own = test_client.get("/api/v1/metrics/llm/sessions/anon", cookies={"sessionId": "anon"}).json()
+	assert own["data"]["prompt_tokens"] == 120
+	other = test_client.get("/api/v1/metrics/llm/sessions/anon", cookies={"sessionId": "someone-else"}).json()
+	assert other["data"] is None
+	assert other["error"]["code"] == "NOT_FOUND"
+
+
+def test_circuit_breaker_opens_and_recovers():
+	from app.core.circuit_breaker import CircuitBreaker
+	breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0)
+	assert breaker.allow()
+	breaker.record_failure()
+	assert breaker.snapshot()["state"] == "closed"
+	breaker.record_failure()
+	assert breaker.snapshot()["state"] == "open"
+	# reset timeout elapsed: exactly one trial call goes through
+	assert breaker.allow()
+	assert not breaker.allow()
+	breaker.record_success()
+	assert breaker.snapshot()["state"] == "closed"
+
+
+def test_llm_auth_error_leaves_breaker(monkeypatch):
+	import httpx
+	import openai
+	from app.clients import openai_client
+	from app.clients.openai_client import OpenAIClient
+
+	def parse(**kwargs):
+		response = httpx.Response(401, request=httpx.Request("POST", OPENAI_COMPLETIONS_URL))
+		raise openai.AuthenticationError("bad key", response=response, body=None)
+
+	fake_openai(monkeypatch, parse)
+	client = OpenAIClient(api_key="test", model="gpt-test")
+	openai_client.breaker.reset()
+	try:
+		# an auth error neither clears earlier upstream failures nor counts as one
+		openai_client.breaker.record_failure()
+		with pytest.raises(openai_client.LLMUpstreamError):
+			client.suggest_destinations({"regions": ["auth-test"]})
+		assert openai_client.breaker.snapshot()["consecutive_failures"] == 1
+		assert openai_client.breaker.snapshot()["state"] == "closed"
+
+		# a half-open trial that ends in one does not leave the breaker stuck refusing every call
+		monkeypatch.setattr(openai_client.breaker, "reset_timeout", 0)
+		for _ in range(openai_client.breaker.failure_threshold):
+			openai_client.breaker.record_failure()
+		with pytest.raises(openai_client.LLMUpstreamError):
+			client.suggest_destinations({"regions": ["auth-test-trial"]})
+		assert openai_client.breaker.snapshot()["state"] == "half_open"
+		assert openai_client.breaker.allow()
+	finally:
+		openai_client.breaker.reset()
+
+
+def test_llm_timeout_falls_back_to_stub(monkeypatch):
+	import httpx
+	import openai
+	from app.clients import openai_client
+	from app.clients.openai_client import OpenAIClient
+	from app.core.config import settings
+	from app.services.llm_service import LLMService
+
+	calls = []
+
+	def parse(**kwargs):
+		calls.append(kwargs)
+		raise openai.APITimeoutError(request=httpx.Request("POST", OPENAI_COMPLETIONS_URL))
+
+	seen = fake_openai(monkeypatch, parse)
+	monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 1)
+	monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY_SECONDS", 0.0)
+	openai_client.breaker.reset()
+	try:
+		service = LLMService(client=OpenAIClient(api_key="test", model="gpt-test"))
+		suggestions = service.suggest_destinations({"regions": ["timeout-test"]})
+		assert len(suggestions) == 5
+		assert len(calls) == 2
+		# one client without sdk retries, each attempt gets what is left of the budget
+		assert [kwargs["max_retries"] for kwargs in seen.built] == [0]
+		assert len(seen.options) == 2
+		assert all(0 < kwargs["timeout"] <= settings.LLM_TIMEOUT_SUGGEST_SECONDS for kwargs in seen.options)
+		assert openai_client.breaker.snapshot()["consecutive_failures"] == 1
+
+		strict = LLMService(client=OpenAIClient(api_key="test", model="gpt-test"), allow_fallback=False)
+		with pytest.raises(openai_client.LLMTimeoutError):
+			strict.suggest_destinations({"regions": ["timeout-test-strict"]})
+	finally:
+		openai_client.breaker.reset()
+
+
+def test_llm_suggest_cache_only_fallback():
+	from app.clients.openai_client import LLMUpstreamError
+	from app.services.llm_service import LLMService
+
+	class CountingClient:
+		calls = 0
+		failing = False
+
+		def suggest_destinations(self, filters):
+			if self.failing:
+				raise LLMUpstreamError("down")
+			self.calls += 1
+			return [{"title": f"Place {self.calls}-{i}"} for i in range(5)]
+
+	client = CountingClient()
+	service = LLMService(client=client)
+	filters = {"regions": ["fresh-suggest-test"]}
+	first = service.suggest_destinations(filters)
+	second = service.suggest_destinations(filters)
+	assert client.calls == 2
+	assert first != second
+	# with upstream down, the last answer for the same filters is served
+	client.failing = True
+	assert service.suggest_destinations(filters) == second
+
+
+def test_replay_transport_serves_fixtures(tmp_path):
+	from app.clients.openai_client import OpenAIClientStub
+	from app.clients.replay import FixtureStore, LatencyModel, RecordingClient, ReplayClient
+	store = FixtureStore(str(tmp_path))
+	recorder = RecordingClient(OpenAIClientStub(), store, "llm")
+	recorded = recorder.expand_destination({"title": "Lisbon", "country": "Portugal"}, {})
+
+	sleeps = []
+	replay = ReplayClient(store, "llm", LatencyModel("fixed:250"), sleep=sleeps.append)
+	assert replay.expand_destination({"title": "Lisbon", "country": "Portugal"}, {}) == recorded
+	assert sleeps == [0.25]
+	# unknown requests reuse a recorded fixture unless strict
+	assert replay.expand_destination({"title": "Porto", "country": "Portugal"}, {}) == recorded
+	strict = ReplayClient(store, "llm", LatencyModel("none"), strict=True)
+	with pytest.raises(LookupError):
+		strict.expand_destination({"title": "Porto", "country": "Portugal"}, {})
+
+
+def test_llm_scheduler_priority_order():
+	import threading
+	import time
+	from app.core.llm_scheduler import LLMScheduler, SchedulerRejectedError
+	scheduler = LLMScheduler(max_in_flight=1, max_wait=5.0, initial_service_time=0.01)
+	order = []
+	release = threading.Event()
+
+	def hold():
+		with scheduler.slot("customize", "holder"):
+			release.wait(5)
+
+	def call(operation, session_id, label):
+		with scheduler.slot(operation, session_id):
+			order.append(label)
+
+	holder = threading.Thread(target=hold)
+	holder.start()
+	while scheduler.snapshot()["in_flight"] == 0:
+		time.sleep(0.001)
+	queued = [("customize", "a", "customize-a1"), ("customize", "a", "customize-a2"), ("customize", "b", "customize-b1"), ("suggest", "c", "suggest-c1")]
+	threads = []
+	for i, args in enumerate(queued):
+		threads.append(threading.Thread(target=call, args=args))
+		threads[-1].start()
+		while scheduler.snapshot()["queued"] < i + 1:
+			time.sleep(0.001)
+	assert scheduler.snapshot()["queue_depth"]["customize"] == 3
+	release.set()
+	for t in [holder] + threads:
+		t.join(5)
+	# suggest jumps the queue, then sessions a and b alternate
+	assert order == ["suggest-c1", "customize-a1", "customize-b1", "customize-a2"]
+	snapshot = scheduler.snapshot()
+	assert snapshot["in_flight"] == 0 and snapshot["queued"] == 0
+	assert snapshot["queue_wait_seconds"]["count"] == 5
+
+	# predicted wait beyond the deadline is rejected without queueing
+	slow = LLMScheduler(max_in_flight=1, max_wait=1.0, initial_service_time=30.0)
+	with slow.slot("suggest", "x"):
+		with pytest.raises(SchedulerRejectedError) as rejected:
+			with slow.slot("suggest", "y"):
+				pass
+	assert rejected.value.reason == "predicted"
+	assert slow.snapshot()["rejected"] == {"suggest:predicted": 1}
+
+
+def test_explore_images_under_deadline(monkeypatch):
+	import asyncio
+	import time
+	from app.clients.openai_client import OpenAIClientStub
+	from app.core.config import settings
+	from app.services.exploration_service import ExplorationService
+	from app.services.image_service import ImageService
+	from app.services.llm_service import LLMService
+
+	class SlowImages:
+		async def find_first_async(self, query):
+			await asyncio.sleep(5 if query.startswith("Sicily") else 0.2)
+			return {"url": f"https://img.test/{query}", "source": "test", "author": "a", "link": "l"}
+
+	images = ImageService()
+	images.client = SlowImages()
+	service = ExplorationService(llm=LLMService(client=OpenAIClientStub()), images=images)
+	monkeypatch.setattr(settings, "IMAGE_LOOKUP_DEADLINE_SECONDS", 0.5)
+	started = time.perf_counter()
+	suggestions = asyncio.run(service.generate_suggestions({"regions": ["image-deadline-test"]}))
+	elapsed = time.perf_counter() - started
+	# four lookups of 0.2s in parallel, the slow one cut off at the deadline
+	assert elapsed < 1.5
+	by_title = {s["title"]: s for s in suggestions}
+	assert by_title["Lisbon"]["image_url"] == "https://img.test/Lisbon Portugal travel"
+	assert by_title["Sicily"]["image_credit_source"] == "stub"
+
+
+def test_image_cache_negative_and_eviction(test_db, monkeypatch):
+	import asyncio
+	from app.core.config import settings
+	from app.services.image_service import ImageService
+
+	calls = []
+
+	class FakeProvider:
+		def find_first(self, query):
+			calls.append(query)
+			if query == "broken":
+				raise RuntimeError("provider down")
+			if query == "nothing":
+				return None
+			return {"url": f"https://img.test/{query}", "source": "unsplash", "author": "a", "link": "l"}
+
+		async def find_first_async(self, query):
+			return self.find_first(query)
+
+	monkeypatch.setattr(settings, "IMAGE_CACHE_MAX_ENTRIES", 3)
+	service = ImageService(engine=test_db)
+	service.client = FakeProvider()
+	service.provider = "unsplash"
+
+	assert service.pick_image("Lisbon Portugal")["url"] == "https://img.test/Lisbon Portugal"
+	# normalized query hits the cache
+	assert service.pick_image("  lisbon   PORTUGAL ")["url"] == "https://img.test/Lisbon Portugal"
+	assert service.pick_image("nothing")["source"] == "stub"
+	assert service.pick_image("nothing")["source"] == "stub"
+	assert service.pick_image("broken")["source"] == "stub"
+	assert service.pick_image("broken")["source"] == "stub"
+	assert calls == ["Lisbon Portugal", "nothing", "broken", "broken"]
+
+	# explore's batch path shares the cache, and reaches it from a worker thread, not the event loop
+	cache_on_loop = []
+	get_many = service.cache.get_many
+
+	def recording_get_many(*args):
+		try:
+			asyncio.get_running_loop()
+			cache_on_loop.append(True)
+		except RuntimeError:
+			cache_on_loop.append(False)
+		return get_many(*args)
+
+	monkeypatch.setattr(service.cache, "get_many", recording_get_many)
+	images = asyncio.run(service.pick_images(["Lisbon Portugal", "Split Croatia"]))
+	assert cache_on_loop == [False]
+	assert [i["url"] for i in images] == ["https://img.test/Lisbon Portugal", "https://img.test/Split Croatia"]
+	assert calls[-1] == "Split Croatia" and calls.count("Lisbon Portugal") == 1
+
+	# a fourth entry evicts the least recently used one
+	service.pick_image("Madeira Portugal")
+	with Session(test_db) as db:
+		from app.models.image_cache import ImageCacheEntry
+		from sqlmodel import select
+		keys = {e.key for e in db.exec(select(ImageCacheEntry))}
+	assert len(keys) == 3
+	assert "unsplash:madeira portugal" in keys
+
+
+def test_image_search_distinct_images(test_client, test_db, monkeypatch):
+	import httpx
+	from app.clients import images_client
+	from app.core.config import settings
+	from app.services import image_service
+	from app.services.image_service import ImageService
+
+	requests = []
+
+	def handler(request):
+		requests.append(request)
+		if request.method == "HEAD":
+			content_type = "text/html" if request.url.path.endswith("/3") else "image/jpeg"
+			return httpx.Response(200, headers={"content-type": content_type})
+		results = [
+			{"urls": {"regular": f"https://images.test/{i}"}, "user": {"name": f"author {i}"}, "links": {"html": f"https://unsplash.test/{i}"}}
+			for i in range(int(request.url.params["per_page"]))
+		]
+		return httpx.Response(200, json={"results": results})
+
+	pooled = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+	monkeypatch.setattr(images_client, "get_async_client", lambda: pooled)
+	monkeypatch.setattr(settings, "IMAGE_PROVIDER", "unsplash")
+	monkeypatch.setattr(settings, "UNSPLASH_KEY", "test-key")
+	monkeypatch.setattr(image_service, "get_engine", lambda: test_db)
+	ImageService.clear_search_cache()
+	images_client.UnsplashClient.clear_verify_cache()
+
+	response = test_client.get("/api/v1/images/search", params={"q": "Lisbon", "limit": 4})
+	rows = response.json()["data"]
+	# one search with per_page=4, four concurrent checks, the non-image url dropped
+	assert [r["url"] for r in rows] == ["https://images.test/0", "https://images.test/1", "https://images.test/2"]
+	assert [r.method for r in requests].count("GET") == 1
+	assert requests[0].url.params["per_page"] == "4"
+	assert len(requests) == 5
+
+	test_client.get("/api/v1/images/search", params={"q": "lisbon", "limit": 4})
+	assert len(requests) == 5
+	# a restarted or other worker, with an empty in-process cache, reads the list from the image cache table
+	ImageService.clear_search_cache()
+	again = test_client.get("/api/v1/images/search", params={"q": "LISBON", "limit": 4}).json()["data"]
+	assert again == rows
+	assert len(requests) == 5
+
+	# another query returning the same cdn urls needs no new content-type checks
+	rows = test_client.get("/api/v1/images/search", params={"q": "Porto", "limit": 4}).json()["data"]
+	assert len(rows) == 3
+	assert [r.method for r in requests[5:]] == ["GET"]
+	assert images_client.UnsplashClient.verify_cache_stats()["size"] == 4
+	ImageService.clear_search_cache()
+	images_client.UnsplashClient.clear_verify_cache()
+
+
+def test_image_proxy_resized_ranges(test_client, tmp_path, monkeypatch):
+	import io
+	import httpx
+	Image = pytest.importorskip("PIL.Image")
+	from app.core.config import settings
+	from app.services import image_proxy_service
+
+	buffer = io.BytesIO()
+	Image.new("RGB", (1000, 500), (200, 120, 40)).save(buffer, format="JPEG")
+	fetches = []
+
+	def handler(request):
+		fetches.append(str(request.url))
+		return httpx.Response(200, content=buffer.getvalue(), headers={"content-type": "image/jpeg"})
+
+	pooled = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+	monkeypatch.setattr(image_proxy_service, "get_async_client", lambda: pooled)
+	monkeypatch.setattr(settings, "IMAGE_STORE_DIR", str(tmp_path))
+	params = {"url": "https://images.unsplash.com/photo-1", "w": 300}
+
+	first = test_client.get("/api/v1/images/proxy", params=params)
+	assert first.status_code == 200
+	assert first.headers["content-type"] == "image/jpeg"
+	assert first.headers["cache-control"].startswith("public, max-age=")
+	# 300 snaps up to the 320 variant
+	assert Image.open(io.BytesIO(first.content)).size == (320, 160)
+	etag = first.headers["etag"]
+
+	again = test_client.get("/api/v1/images/proxy", params=params, headers={"If-None-Match": etag})
+	assert again.status_code == 304
+	partial = test_client.get("/api/v1/images/proxy", params=params, headers={"Range": "bytes=0-9"})
+	assert partial.status_code == 206
+	assert partial.content == first.content[:10]
+	assert partial.headers["content-range"] == f"bytes 0-9/{len(first.content)}"
+	unsatisfiable = test_client.get("/api/v1/images/proxy", params=params, headers={"Range": "bytes=999999-"})
+	assert unsatisfiable.status_code == 416
+
+	original = test_client.get("/api/v1/images/proxy", params={"url": params["url"]})
+	assert original.content == buffer.getvalue()
+	assert fetches == ["https://images.unsplash.com/photo-1"]
+
+	# hosts outside the allow list are neither fetched server-side nor redirected to
+	other = test_client.get("/api/v1/images/proxy", params={"url": "https://example.com/a.jpg"}, follow_redirects=False)
+	assert other.status_code == 400
+	assert "location" not in other.headers
+	assert other.json()["error"]["code"] == "VALIDATION_ERROR"
+
+
+def test_image_proxy_shared_downloads(tmp_path, monkeypatch):
+	import asyncio
+	import io
+	import httpx
+	Image = pytest.importorskip("PIL.Image")
+	from app.services import image_proxy_service
+	from app.services.image_proxy_service import ImageProxyService
+
+	buffer = io.BytesIO()
+	Image.new("RGB", (400, 200), (90, 10, 10)).save(buffer, format="JPEG")
+	fetches = []
+	writes = []
+
+	async def handler(request):
+		fetches.append(str(request.url))
+		await asyncio.sleep(0.05)
+		return httpx.Response(200, content=buffer.getvalue(), headers={"content-type": "image/jpeg"})
+
+	write_atomic = ImageProxyService._write_atomic
+
+	def recording_write(self, path, data):
+		try:
+			asyncio.get_running_loop()
+			writes.append("loop")
+		except RuntimeError:
+			writes.append("thread")
+		write_atomic(self, path, data)
+
+	pooled = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+	monkeypatch.setattr(image_proxy_service, "get_async_client", lambda: pooled)
+	monkeypatch.setattr(ImageProxyService, "_write_atomic", recording_write)
+	service = ImageProxyService(root=str(tmp_path))
+
+	async def requests():
+		first = [asyncio.create_task(service.get("https://images.unsplash.com/shared")) for _ in range(2)]
+		await asyncio.sleep(0.01)
+		# a request arriving while the download runs joins it instead of starting another
+		late = asyncio.create_task(service.get("https://images.unsplash.com/shared"))
+		return await asyncio.gather(*first, late)
+
+	images = asyncio.run(requests())
+	assert fetches == ["https://images.unsplash.com/shared"]
+	assert len({image.path for image in images}) == 1
+	assert writes == ["thread", "thread"]
+	assert ImageProxyService._downloads == {}
+
+
+def test_image_race_first_valid_wins():
+	import asyncio
+	import time
+	from app.clients.images_client import RacingImagesClient
+	from app.core.metrics import image_metrics
+
+	class Provider:
+		def __init__(self, name, delay, result):
+			self.name, self.delay, self.result = name, delay, result
+
+		def find_first(self, query):
+			time.sleep(self.delay)
+			if isinstance(self.result, Exception):
+				raise self.result
+			return self.result
+
+		async def find_first_async(self, query):
+			await asyncio.sleep(self.delay)
+			if isinstance(self.result, Exception):
+				raise self.result
+			return self.result
+
+	photo = {"url": "https://img.test/fast", "source": "fast", "author": "a", "link": "l"}
+	image_metrics.reset()
+	race = RacingImagesClient({
+		"slow": Provider("slow", 2, {"url": "https://img.test/slow"}),
+		"empty": Provider("empty", 0.01, None),
+		"fast": Provider("fast", 0.05, photo),
+	})
+	started = time.perf_counter()
+	assert asyncio.run(race.find_first_async("Lisbon")) == photo
+	assert time.perf_counter() - started < 1
+	assert race.find_first("Lisbon") == photo
+
+	snapshot = image_metrics.snapshot()
+	assert snapshot["races"] == 2
+	assert snapshot["providers"]["fast"]["outcomes"] == {"win": 2}
+	assert snapshot["providers"]["fast"]["win_rate"] == 1.0
+	assert snapshot["providers"]["empty"]["outcomes"] == {"empty": 2}
+	assert snapshot["providers"]["slow"]["outcomes"] == {"cancelled": 1}
+
+	# only when every provider fails does the race raise
+	failing = RacingImagesClient({"a": Provider("a", 0, RuntimeError("down")), "b": Provider("b", 0, None)})
+	assert asyncio.run(failing.find_first_async("x")) is None
+	broken = RacingImagesClient({"a": Provider("a", 0, RuntimeError("down"))})
+	with pytest.raises(RuntimeError):
+		asyncio.run(broken.find_first_async("x"))
+	image_metrics.reset()
+
+
+def test_placeholder_job_skips_unchanged(test_db, sample_offer_data, monkeypatch):
+	import io
+	import httpx
+	Image = pytest.importorskip("PIL.Image")
+	from app.core.config import settings
+	from app.services import image_placeholder_service
+	from app.services.image_placeholder_service import ImagePlaceholderService
+
+	buffer = io.BytesIO()
+	Image.new("RGB", (800, 600), (30, 90, 160)).save(buffer, format="JPEG")
+	fetches = []
+
+	def handler(request):
+		fetches.append(str(request.url))
+		if request.url.path == "/missing":
+			return httpx.Response(404)
+		return httpx.Response(200, content=buffer.getvalue(), headers={"content-type": "image/jpeg"})
+
+	monkeypatch.setattr(image_placeholder_service, "get_client", lambda: httpx.Client(transport=httpx.MockTransport(handler)))
+	# the request path only schedules the job, the test runs it directly
+	monkeypatch.setattr(settings, "PLACEHOLDERS_ENABLED", False)
+	with Session(test_db) as db:
+		data = dict(sample_offer_data, date_from=date(2025, 6, 1), date_to=date(2025, 6, 8))
+		offer = AgencyOfferService().create(db, "agent", dict(data, image_url="https://images.unsplash.com/photo-1"))
+		broken = AgencyOfferService().create(db, "agent", dict(data, image_url="https://images.unsplash.com/missing"))
+		outside = AgencyOfferService().create(db, "agent", dict(data, image_url="https://example.com/a.jpg"))
+		offer_id, broken_id, outside_id = offer.id, broken.id, outside.id
+
+	service = ImagePlaceholderService(engine=test_db, concurrency=2, batch_size=1)
+	progress = service.run()
+	assert progress["state"] == "done"
+	assert progress["computed"] == 1
+	assert progress["failed"] == 2
+	# hosts outside the allow list are never fetched
+	assert sorted(fetches) == ["https://images.unsplash.com/missing", "https://images.unsplash.com/photo-1"]
+
+	with Session(test_db) as db:
+		offer = AgencyOfferService().get_by_id(db, "agent", offer_id)
+		assert offer.image_placeholder.startswith("data:image/jpeg;base64,")
+		assert len(offer.image_placeholder) < 1000
+		assert offer.image_placeholder_url == offer.image_url
+		# permanent failures are recorded so they are not retried for the same image
+		assert AgencyOfferService().get_by_id(db, "agent", broken_id).image_placeholder is None
+		assert AgencyOfferService().get_by_id(db, "agent", outside_id).image_placeholder_url == "https://example.com/a.jpg"
+
+	fetches.clear()
+	assert service.run()["computed"] == 0
+	assert fetches == []
+
+	# a changed image is picked up again
+	with Session(test_db) as db:
+		AgencyOfferService().update(db, "agent", offer_id, {"image_url": "https://images.pexels.com/photo-2"})
+	assert service.run()["computed"] == 1
+	with Session(test_db) as db:
+		assert AgencyOfferService().get_by_id(db, "agent", offer_id).image_placeholder_url == "https://images.pexels.com/photo-2"
+
+
+def test_placeholder_fetch_redirect_hops(test_db, monkeypatch):
+	import io
+	import httpx
+	Image = pytest.importorskip("PIL.Image")
+	from app.services import image_placeholder_service
+	from app.services.image_placeholder_service import ImagePlaceholderService
+
+	buffer = io.BytesIO()
+	Image.new("RGB", (64, 64), (200, 40, 40)).save(buffer, format="JPEG")
+	fetches = []
+
+	def handler(request):
+		fetches.append(str(request.url))
+		if request.url.path == "/open-redirect":
+			return httpx.Response(302, headers={"location": "http://169.254.169.254/latest/meta-data"})
+		if request.url.path == "/moved":
+			return httpx.Response(301, headers={"location": "/photo-3"})
+		return httpx.Response(200, content=buffer.getvalue(), headers={"content-type": "image/jpeg"})
+
+	monkeypatch.setattr(image_placeholder_service, "get_client", lambda: httpx.Client(transport=httpx.MockTransport(handler)))
+	service = ImagePlaceholderService(engine=test_db)
+
+	# a redirect off the allow list is a permanent failure and the target is never requested
+	row_id, url, placeholder, store = service._compute("o1", "https://images.unsplash.com/open-redirect")
+	assert placeholder is None and store is True
+	assert fetches == ["https://images.unsplash.com/open-redirect"]
+
+	fetches.clear()
+	assert service._compute("o2", "https://images.unsplash.com/moved")[2].startswith("data:image/jpeg;base64,")
+	assert fetches == ["https://images.unsplash.com/moved", "https://images.unsplash.com/photo-3"]
+
+
+def test_image_prefetch_after_create(test_client, test_db, agent_session_id, sample_offer_data, monkeypatch):
+	import threading
+	from app.core.config import settings
+	from app.services import image_prefetch_service
+	from app.services.image_prefetch_service import get_prefetch_service
+
+	release = threading.Event()
+	queries = []
+
+	class FakeImageService:
+		provider = "fake"
+
+		def __init__(self, engine=None):
+			pass
+
+		def find_image(self, query):
+			queries.append(query)
+			release.wait(5)
+			return {"url": "https://images.unsplash.com/photo-9", "source": "unsplash", "author": "A. Author", "link": "https://unsplash.com/photos/9"}
+
+	monkeypatch.setattr(image_prefetch_service, "ImageService", FakeImageService)
+	monkeypatch.setattr(settings, "PLACEHOLDERS_ENABLED", False)
+
+	# the create response does not wait for the provider
+	response = test_client.post("/api/v1/agent/offers", json=sample_offer_data, cookies={"sessionId": agent_session_id})
+	created = response.json()["data"]
+	assert created["image_url"] is None
+	assert created["image_status"] == "pending"
+
+	release.set()
+	get_prefetch_service(test_db).join(5)
+	assert queries == ["Valencia Spain"]
+	offer = test_client.get(f"/api/v1/agent/offers/{created['id']}", cookies={"sessionId": agent_session_id}).json()["data"]
+	assert offer["image_url"] == "https://images.unsplash.com/photo-9"
+	assert offer["image_credit_author"] == "A. Author"
+	assert offer["image_status"] == "ready"
+	assert get_prefetch_service(test_db).status()["filled"] == 1
+
+	# a lookup that finishes before the response is built shows up in it
+	prefetch = get_prefetch_service(test_db)
+	queue = prefetch.queue
+	monkeypatch.setattr(prefetch, "queue", lambda *args: queue(*args) and (prefetch.join(5) or True))
+	created = test_client.post("/api/v1/agent/offers", json=sample_offer_data, cookies={"sessionId": agent_session_id}).json()["data"]
+	assert created["image_status"] == "ready"
+	assert created["image_url"] == "https://images.unsplash.com/photo-9"
+	monkeypatch.setattr(prefetch, "queue", queue)
+	queries.clear()
+
+	# an image set by the agent is kept
+	response = test_client.post("/api/v1/agent/offers", json=dict(sample_offer_data, image_url="https://example.com/own.jpg"), cookies={"sessionId": agent_session_id})
+	assert response.json()["data"]["image_status"] == "ready"
+	assert queries == []
+
+
+def test_middleware_session_and_rate_limit(test_client, monkeypatch):
+	from app.core.config import settings
+
+	fresh = TestClient(app)
+	response = fresh.get("/health")
+	assert response.status_code == 200
+	assert response.headers["set-cookie"].startswith("sessionId=")
+	assert "HttpOnly" in response.headers["set-cookie"]
+	assert response.headers["x-request-id"]
+	# known sessions get no new cookie and a supplied request id is echoed
+	response = test_client.get("/health", cookies={"sessionId": "mw-session"}, headers={"X-Request-ID": "req-1"})
+	assert "set-cookie" not in response.headers
+	assert response.headers["x-request-id"] == "req-1"
+
+	monkeypatch.setattr(settings, "RATE_LIMIT_PER_MINUTE", 1)
+	first = test_client.post("/api/v1/destinations/missing/customize", json={"prompt": "x"}, cookies={"sessionId": "mw-limited"})
+	assert first.status_code != 429
+	second = test_client.post("/api/v1/destinations/missing/customize", json={"prompt": "x"}, cookies={"sessionId": "mw-limited"})
+	assert second.status_code == 429
+	assert second.json()["error"]["code"] == "RATE_LIMIT"
+
+
+def test_rate_limit_backends(tmp_path):
+	from app.core.rate_limit import MemoryRateLimitBackend, SqliteRateLimitBackend
+
+	memory = MemoryRateLimitBackend(max_keys=3)
+	# 3 per 60s window, starting at the beginning of a window
+	assert [memory.hit("a", 3, 60, 600.0 + i) for i in range(4)] == [True, True, True, False]
+	# halfway through the next window half of the previous window (1.5 requests) still counts
+	assert [memory.hit("a", 3, 60, 690.0 + i) for i in range(3)] == [True, True, False]
+	# the cap drops the least recently used key, idle keys go once their windows pass
+	for key in ("b", "c", "d"):
+		memory.hit(key, 3, 60, 693.0)
+	assert memory.size() == 3
+	assert memory.hit("a", 3, 60, 694.0)
+	memory.hit("e", 3, 60, 900.0)
+	assert memory.size() == 1
+
+	# two backends on one file behave like two workers sharing the limit
+	path = str(tmp_path / "rate_limit.db")
+	first, second = SqliteRateLimitBackend(path, max_keys=2), SqliteRateLimitBackend(path, max_keys=2)
+	assert first.hit("s", 2, 60, 600.0)
+	assert second.hit("s", 2, 60, 601.0)
+	assert not first.hit("s", 2, 60, 602.0)
+	assert not second.hit("s", 2, 60, 603.0)
+	second.PURGE_EVERY = 1
+	for key in ("t", "u", "v"):
+		second.hit(key, 2, 60, 604.0)
+	assert first.size() == 2
+	first.hit("w", 2, 60, 900.0)
+	assert first.size() == 1
+
+
+def test_startup_lease_one_worker(tmp_path):
+	import os
+	import subprocess
+	import sys
+	from sqlmodel import create_engine
+	from app.core.startup_lease import claim_startup_jobs
+
+	engine = create_engine(f"sqlite:///{tmp_path / 'lease.db'}")
+	assert claim_startup_jobs(engine, pid=os.getpid())
+	# the holder claims again, a second worker of the same instance is turned away while the holder lives
+	assert claim_startup_jobs(engine, pid=os.getpid())
+	assert not claim_startup_jobs(engine, pid=os.getpid() + 100000)
+	# the holder exited (a restart): the next worker takes over
+	exited = subprocess.Popen([sys.executable, "-c", "pass"])
+	exited.wait()
+	with engine.begin() as connection:
+		connection.exec_driver_sql("UPDATE startup_lease SET pid = ?", (exited.pid,))
+	assert claim_startup_jobs(engine, pid=os.getpid())
+	assert not claim_startup_jobs(engine, pid=exited.pid)
+	# the recorded pid was reused by a process that started after the holder: the lease is stale
+	if os.path.exists(f"/proc/{os.getpid()}/stat"):
+		with engine.begin() as connection:
+			connection.exec_driver_sql("UPDATE startup_lease SET token = 'previous-boot:1'")
+		assert claim_startup_jobs(engine, pid=exited.pid)
+	engine.dispose()
+
+
+def test_rate_limit_sqlite_fails_open(tmp_path):
+	import asyncio
+	import sqlite3
+	import time as time_module
+	from app.core.middleware import SimpleRateLimiter
+	from app.core.rate_limit import SqliteRateLimitBackend
+
+	path = str(tmp_path / "rate_limit.db")
+	backend = SqliteRateLimitBackend(path, timeout_ms=20)
+	holder = sqlite3.connect(path, isolation_level=None)
+	holder.execute("BEGIN IMMEDIATE")
+	started = time_module.monotonic()
+	# another worker holds the write lock: the hit is let through after the short busy wait
+	assert backend.hit("s", 1, 60, 600.0)
+	assert backend.hit("s", 1, 60, 601.0)
+	assert time_module.monotonic() - started < 1.0
+	assert backend.failed_open == 2
+	holder.execute("ROLLBACK")
+	assert backend.hit("s", 1, 60, 602.0)
+	assert not backend.hit("s", 1, 60, 603.0)
+	holder.close()
+
+	calls = []
+
+	class RecordingBackend(SqliteRateLimitBackend):
+		def hit(self, key, limit, window, now):
+			try:
+				asyncio.get_running_loop()
+				calls.append("loop")
+			except RuntimeError:
+				calls.append("thread")
+			return True
+
+	async def endpoint(scope, receive, send):
+		calls.append("app")
+
+	limiter = SimpleRateLimiter(endpoint, 10, backend=RecordingBackend(str(tmp_path / "recording.db")))
+	scope = {"type": "http", "path": "/api/v1/destinations/d1/customize", "headers": [], "state": {}}
+	asyncio.run(limiter(scope, None, None))
+	assert calls == ["thread", "app"]
+
+
+def test_envelope_matches_jsonable_encoder(test_client, agent_session_id, sample_offer_data):
+	import json
+	from fastapi.encoders import jsonable_encoder
+	from app.core.responses import dumps
+	from app.schemas.envelope import ResponseEnvelope
+
+	create_test_offer(test_client, agent_session_id, sample_offer_data)
+	response = test_client.get("/api/v1/agent/offers", cookies={"sessionId": agent_session_id})
+	offers = response.json()["data"]
+	assert len(offers) == 1
+	assert offers[0]["date_from"] == sample_offer_data["date_from"]
+
+	# rows and nested models are encoded by orjson exactly as jsonable_encoder + json.dumps did
+	from app.models.tag import Tag
+	payload = {"rows": [Tag(id=1, tag_name="Beach", type="highlights")], "when": date(2025, 6, 1), "ids": {3}}
+	legacy = json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+	assert dumps(payload) == legacy
+	assert ResponseEnvelope.err("NOT_FOUND", "x").body == b'{"data":null,"error":{"code":"NOT_FOUND","message":"x"}}'
+
+
+def test_offer_rows_match_models(test_client, test_db, agent_session_id, customer_session_id, sample_offer_data):
+	from app.models.offer_row import OfferRow
+	from app.repositories.agency_offer_repo import AgencyOfferRepository
+
+	first = create_test_offer(test_client, agent_session_id, sample_offer_data)
+	second = create_test_offer(test_client, agent_session_id, dict(sample_offer_data, destination_name="Bilbao", price_housing=900))
+	with Session(test_db) as db:
+		models = {o.id: o.model_dump() for o in AgencyOfferRepository().list_filtered(db)}
+		rows = AgencyOfferRepository().list_filtered_rows(db, price_max=1200)
+	assert [type(r) for r in rows] == [OfferRow]
+	assert rows[0].id == first
+	assert {f: getattr(rows[0], f) for f in OfferRow.__slots__} == models[first]
+	# the placeholder job's bookkeeping column is neither selected nor returned
+	assert "image_placeholder_url" not in OfferRow.__slots__
+	single = test_client.get(f"/api/v1/agent/offers/{first}", cookies={"sessionId": agent_session_id}).json()["data"]
+	assert "image_placeholder_url" not in single
+	assert "image_placeholder" in single
+
+	cookies = {"sessionId": customer_session_id}
+	test_client.post(f"/api/v1/customer/offers/{second}/accept", json={}, cookies=cookies)
+	test_client.post(f"/api/v1/customer/accepted/{second}/note", json={"note_text": "Pack a jacket"}, cookies=cookies)
+	listing = test_client.get("/api/v1/customer/offers/all", cookies=cookies).json()["data"]
+	# accepted offers sort first, every row keeps the full offer fields
+	assert [(o["id"], o["status"], o["note"]) for o in listing] == [(second, "ACCEPTED", "Pack a jacket"), (first, None, None)]
+	assert set(listing[1]) == set(models[first]) | {"status", "note"}
+
+
+def test_list_endpoints_conditional_304(test_client, test_db, agent_session_id, customer_session_id, sample_offer_data):
+	from app.repositories.agency_offer_repo import AgencyOfferRepository
+
+	def get(path, session_id, etag=None):
+		headers = {"If-None-Match": etag} if etag else {}
+		return test_client.get(path, cookies={"sessionId": session_id}, headers=headers)
+
+	offer_id = create_test_offer(test_client, agent_session_id, sample_offer_data)
+	first = get("/api/v1/agent/offers", agent_session_id)
+	etag = first.headers["etag"]
+	assert first.headers["cache-control"] == "private, no-cache"
+	cached = get("/api/v1/agent/offers", agent_session_id, etag)
+	assert cached.status_code == 304
+	assert cached.content == b""
+	# the etag covers the query string
+	assert get("/api/v1/agent/offers?season=winter", agent_session_id, etag).status_code == 200
+
+	# bulk updates outside the orm change the catalog version too
+	with Session(test_db) as db:
+		AgencyOfferRepository().apply_placeholders(db, {offer_id: (None, None)})
+		AgencyOfferRepository().apply_image(db, offer_id, {"url": "https://images.unsplash.com/photo-5"})
+	changed = get("/api/v1/agent/offers", agent_session_id, etag)
+	assert changed.status_code == 200
+	assert changed.json()["data"][0]["image_url"] == "https://images.unsplash.com/photo-5"
+
+	# customer views also depend on the customer's own responses and notes
+	customer = get("/api/v1/customer/offers/all", customer_session_id)
+	customer_etag = customer.headers["etag"]
+	assert get("/api/v1/customer/offers/all", "someone-else", customer_etag).status_code == 200
+	test_client.post(f"/api/v1/customer/offers/{offer_id}/accept", json={}, cookies={"sessionId": customer_session_id})
+	assert get("/api/v1/customer/offers/all", customer_session_id, customer_etag).status_code == 200
+	accepted = get("/api/v1/customer/accepted", customer_session_id)
+	assert get("/api/v1/customer/accepted", customer_session_id, accepted.headers["etag"]).status_code == 304
+	test_client.post(f"/api/v1/customer/accepted/{offer_id}/note", json={"note_text": "Window seat"}, cookies={"sessionId": customer_session_id})
+	assert get("/api/v1/customer/accepted", customer_session_id, accepted.headers["etag"]).status_code == 200
+	# another customer's activity does not touch the agent catalog
+	assert get("/api/v1/agent/offers", agent_session_id, changed.headers["etag"]).status_code == 304
+
+	tags = get("/api/v1/tags", customer_session_id)
+	assert get("/api/v1/tags", customer_session_id, tags.headers["etag"]).status_code == 304
+	test_client.post("/api/v1/tags", json={"tag_name": "Quiet", "type": "highlights"})
+	assert get("/api/v1/tags", customer_session_id, tags.headers["etag"]).status_code == 200
+
+
+def test_async_routes_match_sync(test_client, test_db, agent_session_id, customer_session_id, sample_offer_data):
+	import asyncio
+	import httpx
+	from app.repositories.agency_offer_repo import AgencyOfferRepository
+
+	first = create_test_offer(test_client, agent_session_id, sample_offer_data)
+	second = create_test_offer(test_client, agent_session_id, {**sample_offer_data, "destination_name": "Porto", "season": "winter"})
+	cookies = {"sessionId": customer_session_id}
+	assert test_client.post(f"/api/v1/customer/offers/{first}/accept", json={}, cookies=cookies).json()["data"]["response_status"] == "ACCEPTED"
+	test_client.put(f"/api/v1/customer/offers/{second}/status", json={"status": "UNDECIDED"}, cookies=cookies)
+
+	# responses written on the async session are what the sync services read
+	with Session(test_db) as db:
+		statuses = {r.offer_id: r.response_status for r in CustomerOfferService().response_repo.list_all(db, customer_session_id)}
+		assert statuses == {first: "ACCEPTED", second: "UNDECIDED"}
+		sync_rows = AgencyOfferRepository().list_filtered_rows(db, season="winter")
+
+	async def run():
+		transport = httpx.ASGITransport(app=app)
+		async with httpx.AsyncClient(transport=transport, base_url="http://test", cookies=cookies) as client:
+			return await asyncio.gather(*(
+				client.get(path) for path in ["/api/v1/customer/offers", "/api/v1/customer/offers/all", "/api/v1/customer/orders", "/api/v1/tags"] * 5
+			))
+
+	responses = asyncio.run(run())
+	assert all(r.status_code == 200 for r in responses)
+	available, listing, orders, tags = (r.json()["data"] for r in responses[:4])
+	assert [o["id"] for o in available] == [second]
+	assert [(o["id"], o["status"]) for o in listing] == [(first, "ACCEPTED"), (second, "UNDECIDED")]
+	assert orders == [] and tags == []
+	assert [r.json() for r in responses[4:8]] == [r.json() for r in responses[:4]]
+
+	winter = test_client.get("/api/v1/agent/offers?season=winter", cookies={"sessionId": agent_session_id}).json()["data"]
+	assert [o["id"] for o in winter] == [r.id for r in sync_rows] == [second]
+
+
+def test_production_profile_pragmas(tmp_path):
+	import asyncio
+	import sqlite3
+	import threading
+	from app.core.deps import make_engine, sqlite_pragmas
+	from app.main import migrate
+
+	path = tmp_path / "workers.db"
+	# a database from before the gift columns existed
+	conn = sqlite3.connect(path)
+	conn.execute("CREATE TABLE customer_order (id TEXT PRIMARY KEY)")
+	conn.commit()
+	conn.close()
+
+	errors = []
+
+	def start_worker():
+		try:
+			migrate(make_engine(f"sqlite:///{path}", "production"))
+		except Exception as e:
+			errors.append(e)
+
+	workers = [threading.Thread(target=start_worker) for _ in range(4)]
+	for w in workers:
+		w.start()
+	for w in workers:
+		w.join()
+	assert errors == []
+
+	engine = make_engine(f"sqlite:///{path}", "production")
+	with engine.connect() as connection:
+		assert [str(connection.exec_driver_sql(f"PRAGMA {name}").scalar()).lower() for name, _ in sqlite_pragmas("production")] == ["15000", "wal", "1", str(256 * 1024 * 1024), "-65536"]
+		columns = {row[1] for row in connection.exec_driver_sql("PRAGMA table_info(customer_order)")}
+		assert {"is_gift", "gift_subject"} <= columns
+	assert engine.pool.size() == 10
+
+	async def async_pragmas():
+		async_engine = make_async_engine(engine, "production")
+		async with async_engine.connect() as connection:
+			values = [str((await connection.exec_driver_sql(f"PRAGMA {name}")).scalar()).lower() for name, _ in sqlite_pragmas("production")]
+		await async_engine.dispose()
+		return values
+
+	assert asyncio.run(async_pragmas())[:3] == ["15000", "wal", "1"]
+	# the default profile leaves sqlite's own settings alone
+	assert sqlite_pragmas("default") == []
+	with make_engine(f"sqlite:///{tmp_path / 'plain.db'}", "default").connect() as connection:
+		assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+
+
+def test_request_metrics_per_route(test_client, agent_session_id, sample_offer_data, monkeypatch):
+	from app.core.config import settings
+	from app.core.metrics import request_metrics
+
+	offer_id = create_test_offer(test_client, agent_session_id, sample_offer_data)
+	request_metrics.reset()
+	monkeypatch.setattr(settings, "METRICS_SLOW_REQUEST_SECONDS", 0.0)
+	cookies = {"sessionId": agent_session_id}
+	# sync session route and async session route
+	first = test_client.get(f"/api/v1/agent/offers/{offer_id}", cookies=cookies, headers={"X-Request-ID": "req-offer"})
+	test_client.get("/api/v1/agent/offers", cookies=cookies)
+	test_client.get("/api/v1/agent/offers/missing", cookies=cookies)
+	test_client.get("/no/such/path")
+
+	snapshot = request_metrics.snapshot()
+	routes = {(r["route"], r["status"]): r for r in snapshot["routes"]}
+	detail = routes[("/api/v1/agent/offers/{offer_id}", 200)]
+	assert detail["latency_seconds"]["count"] == 2  # found and missing offers share the template
+	assert detail["db_queries"]["sum"] >= 2
+	listing = routes[("/api/v1/agent/offers", 200)]
+	assert listing["db_queries"]["sum"] == 2  # version lookup and the row query on the async session
+	assert routes[("unmatched", 404)]["db_queries"]["sum"] == 0
+	assert snapshot["in_flight"] == 0
+	assert snapshot["db_queries_total"] >= 4
+	assert first.headers["X-Request-ID"] == "req-offer"
+	assert snapshot["slow_requests"][0]["request_id"] == "req-offer"
+	assert snapshot["slow_requests"][0]["route"] == "/api/v1/agent/offers/{offer_id}"
+
+	text = test_client.get("/api/v1/metrics")
+	assert text.headers["content-type"].startswith("text/plain; version=0.0.4")
+	lines = text.text.splitlines()
+	assert "# TYPE travelbot_http_request_duration_seconds histogram" in lines
+	assert 'travelbot_http_request_duration_seconds_count{method="GET",route="/api/v1/agent/offers",status="200"} 1' in lines
+	assert 'travelbot_http_request_db_queries_bucket{method="GET",route="/api/v1/agent/offers",le="2"} 1' in lines
+	assert 'travelbot_http_request_db_queries_bucket{method="GET",route="/api/v1/agent/offers",le="1"} 0' in lines
+	assert "travelbot_http_requests_in_flight 1" in lines  # the metrics request itself
+
+
+def test_query_budget_repeated_statements(test_client, test_db, agent_session_id, customer_session_id, sample_offer_data, monkeypatch, caplog):
+	from app.core.config import settings
+	from app.core.query_metrics import QueryBudgetExceeded, query_budget, statement_shape, track_queries
+	from app.models.destination import Destination
+	from app.models.list import ListItem, ListModel
+	from app.repositories.agency_offer_repo import AgencyOfferRepository
+
+	assert statement_shape("SELECT a FROM t WHERE id IN (?, ?, ?) AND n = 3") == statement_shape("SELECT a  FROM t WHERE id IN (?) AND n = 12")
+	customer = {"sessionId": customer_session_id}
+	offer_ids = [create_test_offer(test_client, agent_session_id, sample_offer_data) for _ in range(8)]
+	for offer_id in offer_ids:
+		test_client.post(f"/api/v1/customer/offers/{offer_id}/accept", json={}, cookies=customer)
+	with Session(test_db) as db:
+		for i in range(6):
+			db.add(Destination(id=f"dest-{i}", session_id=customer_session_id, title=f"Place {i}", country="Spain", short_description="Sea", approx_price_eur=100 * (i + 1)))
+			db.add(ListModel(id=f"list-{i}", session_id=customer_session_id, name=f"List {i}"))
+		db.commit()
+		for i in range(6):
+			for j in range(i + 1):
+				db.add(ListItem(list_id=f"list-{i}", destination_id=f"dest-{j}"))
+		db.commit()
+
+	# accepted offers and list stats no longer cost a query per row
+	with query_budget(4) as requests:
+		assert len(test_client.get("/api/v1/customer/accepted", cookies=customer).json()["data"]) == 8
+		lists = test_client.get("/api/v1/lists", cookies=customer).json()["data"]
+	assert [label for label, _ in requests] == ["GET /api/v1/customer/accepted", "GET /api/v1/lists"]
+	assert [row["stats"] for row in lists][:3] == [
+		{"count": 1, "avgApproxPriceEUR": 100},
+		{"count": 2, "avgApproxPriceEUR": 150},
+		{"count": 3, "avgApproxPriceEUR": 200},
+	]
+
+	# a per-row lookup is what the budget fails on
+	repo = AgencyOfferRepository()
+	with pytest.raises(QueryBudgetExceeded, match="direct ran 8 x SELECT"):
+		with query_budget(20), Session(test_db) as db:
+			for offer_id in offer_ids:
+				repo.get_by_id(db, None, offer_id)
+
+	# the enrichment batch loads offers, links and tags up front
+	details = {offer_id: {"extended_description": "Long", "tags": [("beach", "activity"), ("sun", "climate")]} for offer_id in offer_ids}
+	with track_queries() as stats, Session(test_db) as db:
+		assert repo.apply_details_batch(db, details) == 8
+	assert stats.repeated(2) == []
+
+	# with detection on, a request repeating a shape is logged with its request id
+	monkeypatch.setattr(settings, "DB_QUERY_SHAPES_ENABLED", True)
+	monkeypatch.setattr(settings, "DB_QUERY_REPEAT_THRESHOLD", 0)
+	with caplog.at_level("WARNING", logger="app.core.query_metrics"):
+		test_client.get("/api/v1/customer/accepted", cookies=customer, headers={"X-Request-ID": "req-repeat"})
+	assert any("GET /api/v1/customer/accepted request_id=req-repeat" in r.getMessage() for r in caplog.records)
+
+
+def test_queue_logging_json_records(test_client, customer_session_id, monkeypatch):
+	import io
+	import json
+	import logging
+	import queue
+	from logging.handlers import QueueListener
+	from app.core.context import current_request_id, current_session_id
+	from app.core.logging import JsonFormatter, QueueLogHandler
+
+	stream = io.StringIO()
+	output = logging.StreamHandler(stream)
+	output.setFormatter(JsonFormatter())
+	records = queue.Queue(5)
+	handler = QueueLogHandler(records, traceback_interval=60.0)
+	logger = logging.getLogger("test.queue_logging")
+	monkeypatch.setattr(logger, "handlers", [handler])
+	monkeypatch.setattr(logger, "propagate", False)
+
+	token = current_request_id.set("req-log")
+	session_token = current_session_id.set("secret-session-cookie")
+	for _ in range(3):
+		try:
+			1 / 0
+		except ZeroDivisionError:
+			logger.exception("order %s failed", "order_1")
+	logger.info("done", extra={"route": "/api/v1/customer/orders", "duration_ms": 1.5})
+	current_session_id.reset(session_token)
+	current_request_id.reset(token)
+	# nothing is written on the logging thread, and a full queue drops instead of waiting
+	logger.info("over capacity")
+	logger.info("over capacity")
+	assert stream.getvalue() == "" and handler.dropped == 1
+
+	listener = QueueListener(records, output)
+	listener.start()
+	listener.stop()
+	lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+	assert [line["message"] for line in lines] == ["order order_1 failed"] * 3 + ["done", "over capacity"]
+	assert lines[0]["request_id"] == "req-log" and "ZeroDivisionError: division by zero" in lines[0]["exc"]
+	assert "exc" not in lines[1] and lines[1]["exc_type"] == "ZeroDivisionError" and lines[2]["tracebacks_suppressed"] == 2
+	assert lines[3]["route"] == "/api/v1/customer/orders" and lines[3]["duration_ms"] == 1.5
+	assert "request_id" not in lines[4]
+	# the session cookie is a credential and stays out of the logs
+	assert "secret-session-cookie" not in stream.getvalue()
+
+	# each request leaves one access record with its route template, duration and request id
+	access_records = queue.Queue()
+	access = logging.getLogger("app.access")
+	monkeypatch.setattr(access, "handlers", [QueueLogHandler(access_records, traceback_interval=60.0)])
+	test_client.get("/api/v1/customer/orders", cookies={"sessionId": customer_session_id}, headers={"X-Request-ID": "req-access"})
+	entry = json.loads(JsonFormatter().format(access_records.get_nowait()))
+	assert entry["request_id"] == "req-access" and entry["route"] == "/api/v1/customer/orders"
+	assert entry["status"] == 200 and entry["duration_ms"] > 0 and entry["message"] == "GET /api/v1/customer/orders 200"
+
+
+def test_readiness_thresholds(test_client, tmp_path, monkeypatch):
+	from app.core.config import settings
+	from app.core.deps import make_engine
+	from app.core.health import pool_stats
+
+	assert test_client.get("/health/live").json()["data"] == {"status": "ok"}
+	ready = test_client.get("/health/ready")
+	assert ready.status_code == 200
+	report = ready.json()["data"]
+	assert report["status"] == "ok" and report["failing"] == []
+	assert report["database"]["ok"] and report["database"]["latency_ms"] >= 0
+	assert set(report["caches"]) == {"llm_responses", "image_search", "image_verify"}
+	assert "hit_rate" in report["caches"]["llm_responses"]
+	assert report["circuit_breaker"]["state"] == "closed"
+	assert set(report["queues"]) == {"llm", "image_prefetch", "enrichment", "placeholders", "log"}
+
+	# checked out and overflow connections of a queue pool
+	engine = make_engine(f"sqlite:///{tmp_path / 'pool.db'}", "production")
+	connections = [engine.connect() for _ in range(12)]
+	stats = pool_stats(engine)
+	assert (stats["pool"], stats["checked_out"], stats["overflow"], stats["capacity"]) == ("QueuePool", 12, 2, 30)
+	for connection in connections:
+		connection.close()
+	engine.dispose()
+
+	monkeypatch.setattr(settings, "HEALTH_DB_LATENCY_MAX_MS", -1.0)
+	monkeypatch.setattr(settings, "HEALTH_LLM_QUEUE_MAX", -1)
+	degraded = test_client.get("/health/ready")
+	assert degraded.status_code == 503
+	body = degraded.json()
+	assert body["data"]["status"] == "degraded" and len(body["data"]["failing"]) == 2
+	assert body["error"]["code"] == "NOT_READY" and "database latency" in body["error"]["message"]
+
+
+def test_warm_up_steps(test_db, agent_session_id, sample_offer_data, test_client, monkeypatch):
+	import asyncio
+	import sys
+	from app.core.config import settings
+	from app.core.query_metrics import track_queries
+	from app.core.warmup import warm_up
+
+	create_test_offer(test_client, agent_session_id, sample_offer_data)
+	monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+	async_engine = make_async_engine(test_db)
+
+	async def run():
+		try:
+			with track_queries() as stats:
+				timings = await warm_up(test_db, async_engine)
+			return timings, stats
+		finally:
+			await async_engine.dispose()
+
+	timings, stats = asyncio.run(run())
+	assert list(timings) == ["imports", "clients", "sync_queries", "async_queries"]
+	assert "openai" in sys.modules and "app.core.health" in sys.modules
+	# version, offer and tag queries on each session
+	assert stats.queries == 6
+	assert any(shape.startswith("SELECT agency_offer.id") for shape in stats.shapes)
+
+	# a failing step is logged and skipped, startup goes on
+	monkeypatch.setattr("app.core.warmup._LAZY_MODULES", ("app.no_such_module",))
+	assert set(asyncio.run(warm_up(test_db, make_async_engine(test_db)))) == set(timings)
+
+
+def test_llm_routes_run_off_the_event_loop(test_client, monkeypatch):
+	import asyncio
+	from app.clients.openai_client import OpenAIClientStub
+	from app.services.llm_service import LLMService
+
+	on_loop = []
+
+	def suggest(self, filters):
+		# a call queued in the scheduler blocks its thread, which must not be the event loop's
+		try:
+			asyncio.get_running_loop()
+			on_loop.append(True)
+		except RuntimeError:
+			on_loop.append(False)
+		return OpenAIClientStub().suggest_destinations(filters)
+
+	monkeypatch.setattr(LLMService, "suggest_destinations", suggest)
+	response = test_client.post("/api/v1/suggest", json={"regions": ["Alps"]}, cookies={"sessionId": "off-loop"})
+	assert response.status_code == 200 and len(response.json()["data"]) == 5
+	assert on_loop == [False]
+
+
+def test_image_proxy_redirects_bombs_prune(test_client, tmp_path, monkeypatch):
+	import asyncio
+	import io
+	import os
+	import httpx
+	Image = pytest.importorskip("PIL.Image")
+	from app.core.config import settings
+	from app.services import image_proxy_service
+	from app.services.image_proxy_service import ImageFetchError, ImageProxyService
+
+	buffer = io.BytesIO()
+	Image.new("RGB", (1000, 500), (10, 20, 30)).save(buffer, format="JPEG")
+	fetches = []
+
+	def handler(request):
+		fetches.append(str(request.url))
+		if request.url.path == "/open-redirect":
+			return httpx.Response(302, headers={"location": "http://169.254.169.254/latest/meta-data"})
+		if request.url.path == "/moved":
+			return httpx.Response(301, headers={"location": "/photo-2"})
+		if request.url.path == "/loop":
+			return httpx.Response(302, headers={"location": "/loop"})
+		if request.url.path.startswith("/distinct-"):
+			distinct = io.BytesIO()
+			Image.new("RGB", (1000, 500), (int(request.url.path[-1]) * 40, 0, 0)).save(distinct, format="JPEG")
+			return httpx.Response(200, content=distinct.getvalue(), headers={"content-type": "image/jpeg"})
+		return httpx.Response(200, content=buffer.getvalue(), headers={"content-type": "image/jpeg"})
+
+	pooled = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+	monkeypatch.setattr(image_proxy_service, "get_async_client", lambda: pooled)
+	monkeypatch.setattr(settings, "IMAGE_STORE_DIR", str(tmp_path))
+
+	# a redirect off the allow list is refused before the target is requested
+	blocked = test_client.get("/api/v1/images/proxy", params={"url": "https://images.unsplash.com/open-redirect"}, follow_redirects=False)
+	assert blocked.status_code == 307
+	assert fetches == ["https://images.unsplash.com/open-redirect"]
+	# redirects inside the allow list are followed hop by hop, up to the limit
+	moved = test_client.get("/api/v1/images/proxy", params={"url": "https://images.unsplash.com/moved"})
+	assert moved.status_code == 200 and moved.content == buffer.getvalue()
+	assert fetches[-1] == "https://images.unsplash.com/photo-2"
+	service = ImageProxyService()
+	with pytest.raises(ImageFetchError, match="redirect limit"):
+		asyncio.run(service.fetch("https://images.unsplash.com/loop"))
+
+	# an image over the pixel limit is served as fetched instead of decoded
+	monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+	bomb = test_client.get("/api/v1/images/proxy", params={"url": "https://images.unsplash.com/bomb", "w": 320})
+	assert bomb.status_code == 200 and bomb.content == buffer.getvalue()
+
+	# the least recently served files go once the store is over its size cap
+	def stored():
+		return sum(os.path.getsize(os.path.join(d, n)) for d, _, names in os.walk(tmp_path) for n in names)
+
+	for i in range(2):
+		test_client.get("/api/v1/images/proxy", params={"url": f"https://images.unsplash.com/distinct-{i}"})
+	cap = stored() + len(buffer.getvalue())
+	monkeypatch.setattr(settings, "IMAGE_STORE_MAX_BYTES", cap)
+	ImageProxyService._usage.clear()
+	for i in range(2, 6):
+		test_client.get("/api/v1/images/proxy", params={"url": f"https://images.unsplash.com/distinct-{i}"})
+	assert stored() <= cap
+	served = test_client.get("/api/v1/images/proxy", params={"url": "https://images.unsplash.com/distinct-5"})
+	assert served.status_code == 200
+	assert sum(url.endswith("/distinct-5") for url in fetches) == 1  # the newest one is still stored
+	test_client.get("/api/v1/images/proxy", params={"url": "https://images.unsplash.com/distinct-0"})
+	assert sum(url.endswith("/distinct-0") for url in fetches) == 2  # the oldest one was pruned and fetched again
@@ -1,6 +1,7 @@
 // Created by Shaposhnik Bogdan (xshapo04)
 import React from 'react'
 import { useAdminOfferCard } from '../controllers/AdminOfferCardController.js'
+import { imageProxyUrl, imagePlaceholderStyle } from '../services/api'
 import EditableField from './EditableField'
 import TagSearchSelector from './TagSearchSelector'
 import { useModal } from '../controllers/ModalController.js'
@@ -53,7 +54,7 @@ function AdminOfferCard({ offer, setOnDelete, isExpanded, onToggleExpand, onOffe
                     <div className="card-image-container">
                         <div className="card-image">
                             {localOffer.image_url ? (
-                                <img src={localOffer.image_url} alt={localOffer.destination_name} />
+                                <img src={imageProxyUrl(localOffer.image_url)} alt={localOffer.destination_name} style={imagePlaceholderStyle(localOffer.image_placeholder)} />
                             ) : (
                                 <div className="image-placeholder">No Image</div>
                             )}
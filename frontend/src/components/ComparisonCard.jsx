@@ -4,7 +4,7 @@
 
 import React, { useState } from 'react'
 import { useNavigate } from 'react-router-dom'
-import { fetchExpandedOffer, confirmTravel, updateNote } from '../services/api'
+import { fetchExpandedOffer, confirmTravel, updateNote, imageProxyUrl, imagePlaceholderStyle } from '../services/api'
 import InlineNote from './InlineNote'
 import './ComparisonCard.css'
 
@@ -150,7 +150,7 @@ function ComparisonCard({ offer, onStatusChange, onSkip, comparisonOffers, curre
       <div className="comparison-content">
         <div className="comparison-image">
           {offer.image_url ? (
-            <img src={offer.image_url} alt={offer.destination_name} />
+            <img src={imageProxyUrl(offer.image_url)} alt={offer.destination_name} style={imagePlaceholderStyle(offer.image_placeholder)} />
           ) : (
             <div className="image-placeholder">No Image</div>
           )}
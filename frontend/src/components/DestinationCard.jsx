@@ -4,7 +4,7 @@
 
 import React, { useState, useEffect } from 'react'
 import { useNavigate } from 'react-router-dom'
-import { fetchExpandedOffer, confirmTravel, addNote, getNote } from '../services/api'
+import { fetchExpandedOffer, confirmTravel, addNote, getNote, imageProxyUrl, imagePlaceholderStyle } from '../services/api'
 import './DestinationCard.css'
 
 function DestinationCard({ offer, onDelete }) {
@@ -118,7 +118,7 @@ function DestinationCard({ offer, onDelete }) {
       <div className="card-content">
         <div className="card-image">
           {offer.image_url ? (
-            <img src={offer.image_url} alt={offer.destination_name} />
+            <img src={imageProxyUrl(offer.image_url)} alt={offer.destination_name} style={imagePlaceholderStyle(offer.image_placeholder)} />
           ) : (
             <div className="image-placeholder">No Image</div>
           )}
@@ -5,7 +5,7 @@
 import React, { useState } from 'react'
 import { useNavigate } from 'react-router-dom'
 import { useSwipeable } from 'react-swipeable'
-import { fetchExpandedOffer, confirmTravel, updateNote } from '../services/api'
+import { fetchExpandedOffer, confirmTravel, updateNote, imageProxyUrl, imagePlaceholderStyle } from '../services/api'
 import InlineNote from './InlineNote'
 import './ExploreOfferCard.css'
 
@@ -178,7 +178,7 @@ function ExploreOfferCard({ offer, onStatusChange, onCompareToggle, isComparing
       <div className="card-content">
         <div className="card-image">
           {offer.image_url ? (
-            <img src={offer.image_url} alt={offer.destination_name} />
+            <img src={imageProxyUrl(offer.image_url)} alt={offer.destination_name} style={imagePlaceholderStyle(offer.image_placeholder)} />
           ) : (
             <div className="image-placeholder">No Image</div>
           )}
@@ -273,5 +273,31 @@ export async function updateOrderNote(orderId, note) {
   })
 }
 
+// Hosts the backend proxy fetches, keep in sync with IMAGE_PROXY_ALLOWED_HOSTS; it refuses any other host.
+const PROXIED_IMAGE_HOSTS = ['images.unsplash.com', 'images.pexels.com', 'picsum.photos', 'fastly.picsum.photos']
 
+function isProxiedImageHost(url) {
+  try {
+    const host = new URL(url).hostname.toLowerCase()
+    return PROXIED_IMAGE_HOSTS.some((h) => host === h || host.endsWith(`.${h}`))
+  } catch {
+    return false
+  }
+}
+
+// Routes provider images through the backend proxy, which caches them and serves a resized variant.
+// Other urls (data:, relative, images on other hosts) are returned unchanged.
+export function imageProxyUrl(url, width = 640) {
+  if (!url || !/^https?:\/\//.test(url) || !isProxiedImageHost(url)) {
+    return url
+  }
+  return `${API_BASE_URL}/images/proxy?url=${encodeURIComponent(url)}&w=${width}`
+}
 
+// Blurred inline placeholder shown behind an image until it loads; the backend precomputes it per image.
+export function imagePlaceholderStyle(placeholder) {
+  if (!placeholder) {
+    return undefined
+  }
+  return { backgroundImage: `url("${placeholder}")`, backgroundSize: 'cover', backgroundPosition: 'center' }
+}